@@ -6,27 +6,12 @@ Service
 
 """
 
-from ._access_service import *
 from ._errors import *
-from ._request import *
-from ._filewriterequest import *
 
-try:
-    if __IPYTHON__:
-        def _set_printer(C):
-            """Function to tell ipython to use __str__ if available"""
-            get_ipython().display_formatter.formatters['text/plain'].for_type(
-                C,
-                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
-                )
+# All other submodules are only imported when they are first used
+from Acquire._lazy import lazy_loader as _lazy_loader
 
-        import sys as _sys
-        import inspect as _inspect
-
-        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
-                                          _inspect.isclass)
-
-        for _clsmember in _clsmembers:
-            _set_printer(_clsmember[1])
-except:
-    pass
+(__getattr__, __dir__, _lazy_names) = _lazy_loader(__name__, {
+    "_access_service": ["AccessService"],
+    "_request": ["Request"],
+    "_filewriterequest": ["FileWriteRequest"]})
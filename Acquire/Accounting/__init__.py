@@ -5,37 +5,25 @@ This module implements everything necessary to build an
 Acquire Accounting Service
 """
 
-from ._account import *
-from ._accounts import *
 from ._errors import *
-from ._transaction import *
-from ._transactionrecord import *
-from ._accounting_service import *
-from ._creditnote import *
-from ._debitnote import *
-from ._lineitem import *
-from ._receipt import *
-from ._decimal import *
-from ._transactioninfo import *
-from ._ledger import *
-from ._refund import *
 
-try:
-    if __IPYTHON__:
-        def _set_printer(C):
-            """Function to tell ipython to use __str__ if available"""
-            get_ipython().display_formatter.formatters['text/plain'].for_type(
-                C,
-                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
-                )
+# All other submodules are only imported when they are first used
+from Acquire._lazy import lazy_loader as _lazy_loader
 
-        import sys as _sys
-        import inspect as _inspect
-
-        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
-                                          _inspect.isclass)
-
-        for _clsmember in _clsmembers:
-            _set_printer(_clsmember[1])
-except:
-    pass
+(__getattr__, __dir__, _lazy_names) = _lazy_loader(__name__, {
+    "_account": ["Account"],
+    "_accounts": ["Accounts"],
+    "_accountsindex": ["AccountsIndex"],
+    "_transaction": ["Transaction"],
+    "_transactionrecord": ["TransactionRecord", "TransactionState"],
+    "_accounting_service": ["AccountingService"],
+    "_creditnote": ["CreditNote"],
+    "_debitnote": ["DebitNote"],
+    "_lineitem": ["LineItem"],
+    "_receipt": ["Receipt"],
+    "_decimal": ["create_decimal", "get_decimal_context"],
+    "_transactioninfo": ["TransactionInfo", "TransactionCode"],
+    "_ledger": ["Ledger"],
+    "_ledgerauditor": ["LedgerAuditor"],
+    "_refund": ["Refund"],
+    "_statement": ["Statement"]})
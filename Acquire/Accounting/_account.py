@@ -4,6 +4,9 @@ from copy import copy as _copy
 import datetime as _datetime
 import time as _time
 import re as _re
+import threading as _threading
+
+from cachetools import TTLCache as _TTLCache
 
 from Acquire.Service import login_to_service_account \
                         as _login_to_service_account
@@ -25,6 +28,48 @@ from ._errors import AccountError, InsufficientFundsError
 
 __all__ = ["Account"]
 
+# In-process cache of the account data loaded from the object store,
+# keyed by bucket and account UID. This holds a maximum of 500 accounts,
+# and entries expire after 60 seconds so that changes made by other
+# functions are picked up quickly. Entries are invalidated whenever the
+# account is saved from this process. The limits of the account are
+# always re-read from the object store before the account is debited,
+# so a stale limit is only ever used for display
+_account_cache = _TTLCache(maxsize=500, ttl=60)
+_account_cache_lock = _threading.RLock()
+
+
+def _cache_key(bucket, uid):
+    """Return the key used to cache the account with UID 'uid'
+       from 'bucket'
+    """
+    try:
+        bucket = "%s/%s" % (bucket["namespace"], bucket["bucket_name"])
+    except:
+        bucket = str(bucket)
+
+    return (bucket, uid)
+
+
+def _get_cached_account_data(bucket, uid):
+    """Return the cached data for the account with UID 'uid', or None
+       if this account is not in the cache
+    """
+    with _account_cache_lock:
+        return _account_cache.get(_cache_key(bucket, uid), None)
+
+
+def _set_cached_account_data(bucket, uid, data):
+    """Cache the passed (json-decoded) data for the account with UID 'uid'"""
+    with _account_cache_lock:
+        _account_cache[_cache_key(bucket, uid)] = data
+
+
+def _invalidate_cached_account(bucket, uid):
+    """Remove the account with UID 'uid' from the in-process cache"""
+    with _account_cache_lock:
+        _account_cache.pop(_cache_key(bucket, uid), None)
+
 
 def _account_root():
     return "accounts"
@@ -527,14 +572,44 @@ class Account:
         if bucket is None:
             bucket = _login_to_service_account()
 
-        data = _ObjectStore.get_object_from_json(bucket, self._key())
+        data = _get_cached_account_data(bucket, self._uid)
+
+        if data is None:
+            data = _ObjectStore.get_object_from_json(bucket, self._key())
+
+            if data:
+                _set_cached_account_data(bucket, self._uid, data)
+
         self.__dict__ = _copy(Account.from_data(data).__dict__)
 
+    def _reload_limits(self, bucket=None):
+        """Re-read the overdraft and daily limits of this account from
+           the object store, bypassing the in-process cache. This is
+           called before the account is debited, so that the debit is
+           checked against the current limits
+        """
+        if self.is_null():
+            return
+
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        data = _ObjectStore.get_object_from_json(bucket, self._key())
+
+        if data:
+            _set_cached_account_data(bucket, self._uid, data)
+            account = Account.from_data(data)
+            self._overdraft_limit = account._overdraft_limit
+            self._maximum_daily_limit = account._maximum_daily_limit
+
     def _save_account(self, bucket=None):
-        """Save this account back to the object store"""
+        """Save this account back to the object store. This invalidates
+           any copy of this account held in the in-process cache
+        """
         if bucket is None:
             bucket = _login_to_service_account()
         _ObjectStore.set_object_from_json(bucket, self._key(), self.to_data())
+        _invalidate_cached_account(bucket, self._uid)
 
     def to_data(self):
         """Return a dictionary that can be encoded to json from this object"""
@@ -874,6 +949,10 @@ class Account:
         if bucket is None:
             bucket = _login_to_service_account()
 
+        # the limits may have been changed by another function since
+        # this account was loaded
+        self._reload_limits(bucket)
+
         if self.available_balance(bucket) < transaction.value():
             raise InsufficientFundsError(
                 "You cannot debit '%s' from account %s as there "
@@ -1,5 +1,8 @@
 
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from ._account import Account as _Account
+from ._accountsindex import AccountsIndex as _AccountsIndex
 
 from Acquire.ObjectStore import ObjectStore as _ObjectStore
 from Acquire.ObjectStore import Mutex as _Mutex
@@ -47,19 +50,71 @@ class Accounts:
         """Return the name of the group that this set of accounts refers to"""
         return self._group
 
-    def list_accounts(self, bucket=None):
-        """Return the names of all of the accounts in this group"""
-        if bucket is None:
-            bucket = _login_to_service_account()
+    def _index(self):
+        """Return the name to UID index for this group"""
+        return _AccountsIndex(self._group)
+
+    def _migrate_index(self, bucket):
+        """Internal function used to make sure that the index holds all
+           of the accounts in this group, including those that were
+           created before accounts were indexed. This must be called
+           before the index is first read or written. The legacy
+           accounts are only listed once for each group
+        """
+        index = self._index()
 
+        if index.is_migrated(bucket=bucket):
+            return
+
+        self._rebuild_index(bucket)
+        index.set_migrated(bucket=bucket)
+
+    def _rebuild_index(self, bucket):
+        """Internal function used to build the index for a group that
+           was created before accounts were indexed. This lists all of
+           the accounts under the group's root key and adds them to
+           the index (merging them with any existing entries). This
+           returns the names of the accounts
+        """
         keys = _ObjectStore.get_all_object_names(bucket, self._root())
 
-        accounts = []
+        accounts = {}
 
         for key in keys:
-            accounts.append(_encoded_to_string(key))
+            name = _encoded_to_string(key)
+
+            try:
+                account_uid = _ObjectStore.get_string_object(
+                                    bucket, self._account_key(name))
+            except:
+                account_uid = None
+
+            if account_uid is None or account_uid == "under_construction":
+                continue
+
+            accounts[name] = account_uid
+
+        if len(accounts) > 0:
+            self._index().add_all(accounts, bucket=bucket)
+
+        return list(accounts.keys())
+
+    def list_accounts(self, bucket=None, prefix=None, start_after=None,
+                      max_count=None):
+        """Return the names of all of the accounts in this group. The
+           names are read from the group's index, so are returned in
+           sorted order. If 'prefix' is passed then only names starting
+           with 'prefix' are returned. Pass 'max_count' and
+           'start_after' (the last name of the previous page) to page
+           through the names
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        self._migrate_index(bucket)
 
-        return accounts
+        return self._index().names(prefix=prefix, start_after=start_after,
+                                   max_count=max_count, bucket=bucket)
 
     def get_account(self, name, bucket=None):
         """Return the account called 'name' from this group"""
@@ -83,6 +138,36 @@ class Accounts:
 
         return _Account(uid=account_uid, bucket=bucket)
 
+    def get_accounts(self, names=None, bucket=None, max_workers=16):
+        """Return the accounts called 'names' from this group, in the
+           same order as 'names'. The account records are fetched
+           concurrently using up to 'max_workers' threads. If 'names'
+           is None then all of the accounts in this group are returned
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        if names is None:
+            names = self.list_accounts(bucket=bucket)
+        elif isinstance(names, str):
+            names = [names]
+        else:
+            names = list(names)
+
+        if len(names) == 0:
+            return []
+        elif len(names) == 1:
+            return [self.get_account(names[0], bucket=bucket)]
+
+        max_workers = max(1, min(int(max_workers), len(names)))
+
+        with _ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(self.get_account, name, bucket)
+                       for name in names]
+
+            # this will raise the first error encountered
+            return [future.result() for future in futures]
+
     def contains(self, account, bucket=None):
         """Return whether or not this group contains the passed account"""
         if not isinstance(account, _Account):
@@ -158,10 +243,16 @@ class Accounts:
         m.unlock()
 
         # ok - we are the only function creating this account. Let's try
-        # to create it properly
+        # to create it properly, and then add it to the group's index
         try:
             account = _Account(name=name, description=description,
                                bucket=bucket)
+
+            if overdraft_limit is not None:
+                account.set_overdraft_limit(overdraft_limit, bucket=bucket)
+
+            self._migrate_index(bucket)
+            self._index().add(name, account.uid(), bucket=bucket)
         except:
             try:
                 _ObjectStore.delete_object(bucket, account_key)
@@ -170,9 +261,17 @@ class Accounts:
 
             raise
 
-        if overdraft_limit is not None:
-            account.set_overdraft_limit(overdraft_limit, bucket=bucket)
+        try:
+            _ObjectStore.set_string_object(bucket, account_key,
+                                           account.uid())
+        except:
+            # make sure that the index does not refer to an account
+            # that cannot be found
+            try:
+                self._index().remove(name, bucket=bucket)
+            except:
+                pass
 
-        _ObjectStore.set_string_object(bucket, account_key, account.uid())
+            raise
 
         return account
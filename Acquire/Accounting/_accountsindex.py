@@ -0,0 +1,231 @@
+
+import hashlib as _hashlib
+
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+from Acquire.ObjectStore import Mutex as _Mutex
+from Acquire.ObjectStore import string_to_encoded as _string_to_encoded
+
+from Acquire.Service import login_to_service_account as \
+                            _login_to_service_account
+
+__all__ = ["AccountsIndex"]
+
+
+class AccountsIndex:
+    """This class provides a compact index that maps the names of all
+       of the accounts in a group to their UIDs. The index is split
+       into a fixed number of shards (chosen by hashing the account
+       name), with each shard held as a single json object in the
+       object store. This means that the full list of names for
+       a group can be read using a small, fixed number of GETs,
+       rather than by listing (and decoding) every object under
+       the group's root key
+    """
+    _num_shards = 16
+
+    def __init__(self, group=None):
+        """Construct the index for the group of accounts called 'group'.
+           If the group is not specified, then it will default to 'default'
+        """
+        if group is None:
+            group = "default"
+
+        self._group = str(group)
+
+    def __str__(self):
+        return "AccountsIndex(group=%s)" % self._group
+
+    def group(self):
+        """Return the name of the group indexed by this object"""
+        return self._group
+
+    def _root(self):
+        """Return the root key for this index in the object store"""
+        return "account_group_index/%s" % _string_to_encoded(self._group)
+
+    def _shard(self, name):
+        """Return the shard that holds the account called 'name'"""
+        digest = _hashlib.md5(str(name).encode("utf-8")).hexdigest()
+        return "%02d" % (int(digest, 16) % AccountsIndex._num_shards)
+
+    def _shards(self):
+        """Return the names of all of the shards of this index"""
+        return ["%02d" % i for i in range(0, AccountsIndex._num_shards)]
+
+    def _shard_key(self, shard):
+        """Return the object store key for the passed shard"""
+        return "%s/%s" % (self._root(), shard)
+
+    def _load_shard(self, shard, bucket):
+        """Load and return the dictionary of name to UID held in the
+           passed shard. This returns None if the shard does not exist
+        """
+        try:
+            return _ObjectStore.get_object_from_json(bucket,
+                                                     self._shard_key(shard))
+        except:
+            return None
+
+    def _load_shards(self, bucket):
+        """Load all of the shards concurrently, returning them as a list
+           (with None for any shard that does not yet exist)
+        """
+        shards = self._shards()
+
+        with _ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            return list(pool.map(lambda shard: self._load_shard(shard,
+                                                                bucket),
+                                 shards))
+
+    def _update_shard(self, shard, added, removed, bucket):
+        """Internal function that adds the name to UID mapping in 'added'
+           to, and removes the names in 'removed' from, the passed shard.
+           This holds the mutex for the shard while it is updated so that
+           concurrent updates are not lost
+        """
+        key = self._shard_key(shard)
+        m = _Mutex(key, timeout=600, lease_time=600, bucket=bucket)
+
+        try:
+            entries = self._load_shard(shard, bucket)
+
+            if entries is None:
+                entries = {}
+
+            for (name, uid) in added.items():
+                entries[name] = uid
+
+            for name in removed:
+                entries.pop(name, None)
+
+            _ObjectStore.set_object_from_json(bucket, key, entries)
+        finally:
+            m.unlock()
+
+    def _migrated_key(self):
+        """Return the key used to record that the accounts created
+           before this index existed have been added to the index
+        """
+        return "%s/migrated" % self._root()
+
+    def is_migrated(self, bucket=None):
+        """Return whether or not the accounts created before this index
+           existed have been added to the index. This needs a single GET
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        try:
+            _ObjectStore.get_string_object(bucket, self._migrated_key())
+            return True
+        except:
+            return False
+
+    def set_migrated(self, bucket=None):
+        """Record that the accounts created before this index existed
+           have been added to the index
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        _ObjectStore.set_string_object(bucket, self._migrated_key(),
+                                       "migrated")
+
+    def add(self, name, uid, bucket=None):
+        """Record that the account called 'name' in this group has
+           UID 'uid'
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        name = str(name)
+        self._update_shard(self._shard(name), {name: str(uid)}, [], bucket)
+
+    def remove(self, name, bucket=None):
+        """Remove the account called 'name' from this index"""
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        name = str(name)
+        self._update_shard(self._shard(name), {}, [name], bucket)
+
+    def add_all(self, accounts, bucket=None):
+        """Add all of the passed name to UID mappings in the dictionary
+           'accounts' to this index, merging them with any existing entries
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        shards = {}
+
+        for (name, uid) in accounts.items():
+            name = str(name)
+            shard = self._shard(name)
+
+            if shard not in shards:
+                shards[shard] = {}
+
+            shards[shard][name] = str(uid)
+
+        for (shard, added) in shards.items():
+            self._update_shard(shard, added, [], bucket)
+
+    def get(self, name, bucket=None):
+        """Return the UID of the account called 'name', or None if there
+           is no such account in the index. This needs a single GET
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        name = str(name)
+        entries = self._load_shard(self._shard(name), bucket)
+
+        if entries is None:
+            return None
+
+        return entries.get(name, None)
+
+    def items(self, prefix=None, start_after=None, max_count=None,
+              bucket=None):
+        """Return a list of (name, UID) pairs for the accounts in this
+           index, sorted by name. If 'prefix' is passed then only
+           names starting with 'prefix' are returned. To page through
+           the results pass 'max_count' for the size of the page,
+           and the last name of the previous page as 'start_after'
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        items = []
+
+        for entries in self._load_shards(bucket):
+            if entries is None:
+                continue
+
+            for (name, uid) in entries.items():
+                if prefix is not None and not name.startswith(prefix):
+                    continue
+
+                if start_after is not None and name <= start_after:
+                    continue
+
+                items.append((name, uid))
+
+        items.sort()
+
+        if max_count is not None:
+            items = items[0:max(0, int(max_count))]
+
+        return items
+
+    def names(self, prefix=None, start_after=None, max_count=None,
+              bucket=None):
+        """Return the (sorted) names of the accounts in this index. The
+           arguments are as for 'items'
+        """
+        return [item[0] for item in self.items(prefix=prefix,
+                                               start_after=start_after,
+                                               max_count=max_count,
+                                               bucket=bucket)]
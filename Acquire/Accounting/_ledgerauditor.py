@@ -0,0 +1,369 @@
+
+import datetime as _datetime
+import multiprocessing as _multiprocessing
+import os as _os
+
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from concurrent.futures import wait as _wait
+from concurrent.futures import FIRST_COMPLETED as _FIRST_COMPLETED
+
+from Acquire.Service import login_to_service_account \
+                    as _login_to_service_account
+
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+from Acquire.ObjectStore import encoded_to_string as _encoded_to_string
+
+from ._account import Account as _Account
+from ._account import _sum_transactions, _get_day_from_key
+from ._accounts import Accounts as _Accounts
+from ._accountsindex import AccountsIndex as _AccountsIndex
+from ._decimal import create_decimal as _create_decimal
+from ._lineitem import LineItem as _LineItem
+from ._transactioninfo import TransactionInfo as _TransactionInfo
+from ._transactioninfo import TransactionCode as _TransactionCode
+
+__all__ = ["LedgerAuditor"]
+
+# the codes of line items that record the debit side of a transaction
+_debit_codes = [_TransactionCode.DEBIT, _TransactionCode.CURRENT_LIABILITY,
+                _TransactionCode.RECEIVED_RECEIPT,
+                _TransactionCode.SENT_REFUND]
+
+# the bucket used by the worker processes. This is set in each worker
+# when the process pool is started (the pool uses the 'fork' context
+# so that the bucket and object store backend are inherited)
+_worker_bucket = None
+
+
+def _set_worker_bucket(bucket):
+    """Set the bucket used by this worker process"""
+    global _worker_bucket
+    _worker_bucket = bucket
+
+
+def _audit_account_in_worker(account_uid):
+    """Function called in a worker process to audit an account"""
+    return (account_uid, LedgerAuditor.audit_account(account_uid,
+                                                     bucket=_worker_bucket))
+
+
+def _discrepancy(account_uid, check, key, message):
+    """Return a discrepancy found in the account with UID 'account_uid'"""
+    return {"account_uid": account_uid, "check": check,
+            "key": key, "message": message}
+
+
+class LedgerAuditor:
+    """This class audits the consistency of the ledger. It works
+       through every account, checking that every line item in the
+       account is matched to a transaction record in the ledger, that the
+       paired debit and credit notes in that record exist in both accounts
+       with matching values, and that the recorded daily balances are equal
+       to the sum of the line items. Accounts are audited in parallel
+       across a pool of processes, one account at a time (and one day of
+       an account at a time) so that memory use is bounded.
+
+       Discrepancies are reported as they are found, and are written
+       to the object store together with a checkpoint for every account
+       that has been audited. This means that an audit with the same
+       name can be resumed, skipping the accounts already audited
+    """
+    def __init__(self, name=None):
+        """Construct the auditor for the audit called 'name'. If the name
+           is not specified then it defaults to 'default'
+        """
+        if name is None:
+            name = "default"
+
+        self._name = str(name)
+
+    def __str__(self):
+        return "LedgerAuditor(name=%s)" % self._name
+
+    def name(self):
+        """Return the name of this audit"""
+        return self._name
+
+    def _root(self):
+        """Return the root key for this audit in the object store"""
+        return "ledger_audits/%s" % self._name
+
+    def _checkpoint_key(self, account_uid):
+        """Return the key used to checkpoint the audit of 'account_uid'"""
+        return "%s/checkpoint/%s" % (self._root(), account_uid)
+
+    def _discrepancies_key(self, account_uid):
+        """Return the key holding the discrepancies found in 'account_uid'"""
+        return "%s/discrepancies/%s" % (self._root(), account_uid)
+
+    @staticmethod
+    def all_account_uids(bucket=None):
+        """Generator that yields the UIDs of all of the accounts in all
+           of the groups of accounts. Only one group of accounts is
+           held in memory at a time
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        # only list the groups, not the accounts in every group
+        groups = _ObjectStore.get_all_prefixes(bucket, "account_groups")
+
+        seen = set()
+
+        for group in sorted(groups):
+            group = _encoded_to_string(group)
+
+            # make sure that the index exists for legacy groups
+            _Accounts(group).list_accounts(bucket=bucket, max_count=1)
+
+            for (_, account_uid) in _AccountsIndex(group).items(
+                                                            bucket=bucket):
+                # an account can belong to more than one group
+                if account_uid not in seen:
+                    seen.add(account_uid)
+                    yield account_uid
+
+    def completed_accounts(self, bucket=None):
+        """Return the set of UIDs of the accounts that have already
+           been audited
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        return set(_ObjectStore.get_all_object_names(
+                        bucket, "%s/checkpoint" % self._root()))
+
+    def discrepancies(self, bucket=None):
+        """Return the list of all discrepancies found so far in this audit"""
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        root = "%s/discrepancies" % self._root()
+        discrepancies = []
+
+        for account_uid in sorted(_ObjectStore.get_all_object_names(bucket,
+                                                                    root)):
+            discrepancies += _ObjectStore.get_object_from_json(
+                                bucket, "%s/%s" % (root, account_uid))
+
+        return discrepancies
+
+    def reset(self, bucket=None):
+        """Remove all checkpoints and discrepancies of this audit, so
+           that the next run will start from scratch
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        _ObjectStore.delete_all_objects(bucket, self._root())
+
+    def _record(self, account_uid, discrepancies, bucket):
+        """Record the result of auditing 'account_uid'"""
+        if len(discrepancies) > 0:
+            _ObjectStore.set_object_from_json(
+                bucket, self._discrepancies_key(account_uid), discrepancies)
+
+        _ObjectStore.set_object_from_json(
+            bucket, self._checkpoint_key(account_uid),
+            {"num_discrepancies": len(discrepancies)})
+
+    def run(self, account_uids=None, num_workers=None, callback=None,
+            bucket=None):
+        """Run the audit over the accounts whose UIDs are in 'account_uids'
+           (or over all accounts if this is None), skipping any that
+           were audited in a previous run. The accounts are audited in
+           parallel using 'num_workers' processes (defaults to the number
+           of CPUs). If 'callback' is passed then it is called with
+           each discrepancy as soon as it is found. This returns the
+           number of discrepancies found in this run
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        if account_uids is None:
+            account_uids = LedgerAuditor.all_account_uids(bucket)
+
+        if num_workers is None:
+            num_workers = _os.cpu_count()
+
+        num_workers = max(1, int(num_workers))
+
+        completed = self.completed_accounts(bucket)
+        todo = (uid for uid in account_uids if uid not in completed)
+
+        num_discrepancies = 0
+
+        def _process(account_uid, discrepancies):
+            self._record(account_uid, discrepancies, bucket)
+
+            if callback is not None:
+                for discrepancy in discrepancies:
+                    callback(discrepancy)
+
+            return len(discrepancies)
+
+        if num_workers == 1:
+            for account_uid in todo:
+                num_discrepancies += _process(
+                    account_uid,
+                    LedgerAuditor.audit_account(account_uid, bucket=bucket))
+
+            return num_discrepancies
+
+        context = _multiprocessing.get_context("fork")
+
+        with _ProcessPoolExecutor(max_workers=num_workers,
+                                  mp_context=context,
+                                  initializer=_set_worker_bucket,
+                                  initargs=(bucket,)) as pool:
+            # only keep a bounded number of accounts in flight, so that
+            # we never need to hold the full list of accounts in memory
+            running = set()
+
+            for account_uid in todo:
+                running.add(pool.submit(_audit_account_in_worker,
+                                        account_uid))
+
+                if len(running) >= 2 * num_workers:
+                    (done, running) = _wait(running,
+                                            return_when=_FIRST_COMPLETED)
+
+                    for future in done:
+                        num_discrepancies += _process(*future.result())
+
+            for future in _wait(running)[0]:
+                num_discrepancies += _process(*future.result())
+
+        return num_discrepancies
+
+    @staticmethod
+    def audit_account(account_uid, bucket=None):
+        """Audit the account with UID 'account_uid', returning the list
+           of discrepancies found
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        try:
+            account = _Account(uid=account_uid, bucket=bucket)
+        except Exception as e:
+            return [_discrepancy(account_uid, "account", None,
+                                 "Unable to load the account: %s" % str(e))]
+
+        discrepancies = []
+
+        # the days with a recorded balance, in order
+        balance_root = "%s/balance" % account._key()
+        balance_days = [_get_day_from_key(key).toordinal() for key in
+                        _ObjectStore.get_all_object_names(bucket,
+                                                          balance_root)]
+        balance_days.sort()
+
+        if len(balance_days) == 0:
+            return [_discrepancy(account_uid, "balance", balance_root,
+                                 "There are no daily balances recorded "
+                                 "for this account")]
+
+        last_balance = None
+        today = _datetime.datetime.now().toordinal()
+
+        for day in range(balance_days[0], today+1):
+            day_start = _datetime.datetime.fromordinal(day)
+            day_end = _datetime.datetime.fromordinal(day+1) - \
+                _datetime.timedelta(microseconds=1)
+
+            balance_key = account._get_balance_key(day_start)
+            data = _ObjectStore.get_object_from_json(bucket, balance_key)
+
+            if data is not None:
+                balance = (_create_decimal(data["balance"]),
+                           _create_decimal(data["liability"]),
+                           _create_decimal(data["receivable"]))
+
+                if last_balance is not None and last_balance != balance:
+                    discrepancies.append(_discrepancy(
+                        account_uid, "balance", balance_key,
+                        "The daily balance %s does not equal the "
+                        "previous balance plus the day's line items %s" %
+                        (str(balance), str(last_balance))))
+
+                last_balance = balance
+            else:
+                last_balance = None
+
+            keys = account._get_transaction_keys_between(day_start, day_end,
+                                                         bucket=bucket)
+
+            for key in keys:
+                discrepancies += LedgerAuditor._audit_line_item(account_uid,
+                                                                key, bucket)
+
+            if last_balance is not None:
+                total = _sum_transactions(keys)
+                last_balance = (last_balance[0] + total[0],
+                                last_balance[1] + total[1],
+                                last_balance[2] + total[2])
+
+        return discrepancies
+
+    @staticmethod
+    def _audit_line_item(account_uid, key, bucket):
+        """Audit the line item at 'key' in the account with UID
+           'account_uid', returning the list of discrepancies found
+        """
+        from ._ledger import Ledger as _Ledger
+
+        def _error(message):
+            return [_discrepancy(account_uid, "line_item", key, message)]
+
+        try:
+            info = _TransactionInfo(key)
+            line_item = _LineItem.from_data(
+                            _ObjectStore.get_object_from_json(bucket, key))
+        except Exception as e:
+            return _error("Unable to read the line item: %s" % str(e))
+
+        # the uid of this line item within the account
+        item_uid = "/".join(key.split("/")[2:5])
+
+        try:
+            record = _Ledger.load_transaction(line_item.uid(), bucket=bucket)
+        except Exception as e:
+            return _error("There is no transaction record for this "
+                          "line item: %s" % str(e))
+
+        debit_note = record.debit_note()
+        credit_note = record.credit_note()
+
+        if debit_note.value() != credit_note.value():
+            return _error("The values of the debit note (%s) and credit "
+                          "note (%s) do not match" %
+                          (debit_note.value(), credit_note.value()))
+
+        if info.code() in _debit_codes:
+            (note, other) = (debit_note, credit_note)
+        else:
+            (note, other) = (credit_note, debit_note)
+
+        if note.account_uid() != account_uid:
+            return _error("The transaction record says that this note "
+                          "belongs to account %s" % note.account_uid())
+
+        if note.uid() != item_uid:
+            return _error("The transaction record has note UID %s" %
+                          note.uid())
+
+        if note.value() not in [info.value(), info.receipted_value()]:
+            return _error("The value of the line item (%s) does not match "
+                          "the value of the note (%s)" %
+                          (info.value(), note.value()))
+
+        # finally, make sure that the paired note exists in the other account
+        other_key = "%s/%s/%s" % ("accounts", other.account_uid(),
+                                  other.uid())
+
+        if len(_ObjectStore.get_all_object_names(bucket, other_key)) == 0:
+            return _error("The paired note is missing from account %s "
+                          "(%s)" % (other.account_uid(), other_key))
+
+        return []
@@ -0,0 +1,453 @@
+
+import csv as _csv
+import datetime as _datetime
+import io as _io
+import json as _json
+
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+from Acquire.Service import login_to_service_account \
+                    as _login_to_service_account
+
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+from ._account import Account as _Account
+from ._account import _sum_transactions
+from ._lineitem import LineItem as _LineItem
+from ._transactioninfo import TransactionInfo as _TransactionInfo
+from ._transactionrecord import TransactionState as _TransactionState
+from ._decimal import create_decimal as _create_decimal
+
+from ._errors import AccountError
+
+__all__ = ["Statement"]
+
+_entry_fields = ["timestamp", "line_item_uid", "transaction_uid", "code",
+                 "value", "receipted_value", "description",
+                 "debit_account_uid", "credit_account_uid", "state"]
+
+
+# The states of transactions that can no longer change. The states of
+# all other transactions are re-read when a cached statement is loaded
+_final_states = [_TransactionState.RECEIPTED.value,
+                 _TransactionState.REFUNDED.value]
+
+
+def _statement_root():
+    return "statements"
+
+
+def _start_of_day(datetime):
+    """Return the datetime of the start of the day containing 'datetime'"""
+    return _datetime.datetime.fromordinal(datetime.toordinal())
+
+
+def _end_of_day(datetime):
+    """Return the datetime of the last moment of the day
+       containing 'datetime'
+    """
+    return _datetime.datetime.fromordinal(datetime.toordinal() + 1) - \
+        _datetime.timedelta(microseconds=1)
+
+
+class Statement:
+    """This class holds a statement for an account over a period of time.
+       The statement contains the opening and closing balances, together
+       with one entry for every line item recorded in the account during
+       that period, in the order in which they were recorded. Each entry
+       is joined to the TransactionRecord in the ledger, so that it has
+       the description and the accounts involved in the transaction.
+
+       Statements for periods that have closed (i.e. ended before the
+       start of today) are cached in the object store. Only the state
+       of each transaction can still change (e.g. it is receipted or
+       refunded), so requesting the statement for a closed period again
+       only needs a single read of the object store plus a read of the
+       transaction records that are not yet in a final state
+    """
+    def __init__(self, account=None, start_time=None, end_time=None,
+                 bucket=None, batch_size=50):
+        """Generate the statement for 'account' for the period from
+           'start_time' to 'end_time' (inclusive). The line items are
+           joined to their transaction records in batches of 'batch_size'
+        """
+        self._account_uid = None
+        self._start_time = None
+        self._end_time = None
+        self._opening_balance = None
+        self._closing_balance = None
+        self._entries = []
+
+        if account is None:
+            return
+
+        if not isinstance(account, _Account):
+            raise TypeError("The passed account must be of type Account")
+
+        if start_time is None or end_time is None:
+            raise ValueError("You must pass the start and end times "
+                             "of the statement")
+
+        if end_time < start_time:
+            raise ValueError("The end time of the statement (%s) must be "
+                             "after the start time (%s)" %
+                             (end_time, start_time))
+
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        self._account_uid = account.uid()
+        self._start_time = start_time
+        self._end_time = end_time
+
+        if self.is_closed():
+            data = _ObjectStore.get_object_from_json(bucket, self._key())
+
+            if data:
+                self.__dict__ = Statement.from_data(data).__dict__
+                Statement._refresh_states(self._entries, bucket, batch_size)
+                return
+
+        self._generate(account, bucket, batch_size)
+
+        if self.is_closed():
+            _ObjectStore.set_object_from_json(bucket, self._key(),
+                                              self.to_data())
+
+    def __str__(self):
+        if self.is_null():
+            return "Statement::null"
+        else:
+            return "Statement(account=%s, %s to %s, entries=%d)" % \
+                (self._account_uid, self._start_time.isoformat(),
+                 self._end_time.isoformat(), len(self._entries))
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.to_data() == other.to_data()
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    @staticmethod
+    def daily(account, date=None, bucket=None):
+        """Return the statement for the passed account for the day
+           containing 'date' (defaults to today)
+        """
+        if date is None:
+            date = _datetime.datetime.now()
+
+        return Statement(account, _start_of_day(date), _end_of_day(date),
+                         bucket=bucket)
+
+    @staticmethod
+    def monthly(account, year=None, month=None, bucket=None):
+        """Return the statement for the passed account for the passed
+           month of the passed year (defaults to this month)
+        """
+        now = _datetime.datetime.now()
+
+        if year is None:
+            year = now.year
+
+        if month is None:
+            month = now.month
+
+        start_time = _datetime.datetime(year=int(year), month=int(month),
+                                        day=1)
+
+        if start_time.month == 12:
+            next_month = start_time.replace(year=start_time.year+1, month=1)
+        else:
+            next_month = start_time.replace(month=start_time.month+1)
+
+        end_time = next_month - _datetime.timedelta(microseconds=1)
+
+        return Statement(account, start_time, end_time, bucket=bucket)
+
+    @staticmethod
+    def stream_entries(account, start_time, end_time, bucket=None,
+                       batch_size=50):
+        """Generator that yields the statement entries (as dictionaries)
+           for all line items in 'account' from 'start_time' to 'end_time'
+           (inclusive), in the order they were recorded. Only one day of
+           keys, and one batch of 'batch_size' line items and transaction
+           records, is held in memory at a time
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        batch_size = max(1, int(batch_size))
+
+        for day in range(start_time.toordinal(), end_time.toordinal()+1):
+            day_start = max(start_time, _datetime.datetime.fromordinal(day))
+            day_end = min(end_time, _end_of_day(day_start))
+
+            keys = account._get_transaction_keys_between(day_start, day_end,
+                                                         bucket=bucket)
+
+            keys.sort(key=Statement._timestamp_from_key)
+
+            for i in range(0, len(keys), batch_size):
+                for entry in Statement._join_batch(keys[i:i+batch_size],
+                                                   bucket):
+                    yield entry
+
+    @staticmethod
+    def _timestamp_from_key(key):
+        """Return the timestamp encoded into the line item key 'key'
+           (accounts/uid/YYYY-MM-DD/timestamp/random/value)
+        """
+        try:
+            return (float(key.split("/")[3]), key)
+        except:
+            return (0, key)
+
+    @staticmethod
+    def _join_batch(keys, bucket):
+        """Internal function that loads the line items for the passed
+           keys, and joins them to their transaction records. The
+           objects are read concurrently. This returns the list
+           of statement entries
+        """
+        from ._ledger import Ledger as _Ledger
+
+        def _load_line_item(key):
+            return _LineItem.from_data(
+                        _ObjectStore.get_object_from_json(bucket, key))
+
+        def _load_record(uid):
+            try:
+                return _Ledger.load_transaction(uid, bucket=bucket)
+            except:
+                return None
+
+        with _ThreadPoolExecutor(max_workers=len(keys)) as pool:
+            line_items = list(pool.map(_load_line_item, keys))
+
+            uids = []
+            for line_item in line_items:
+                uid = line_item.uid()
+                if uid is not None and uid not in uids:
+                    uids.append(uid)
+
+            records = dict(zip(uids, pool.map(_load_record, uids)))
+
+        entries = []
+
+        for (key, line_item) in zip(keys, line_items):
+            info = _TransactionInfo(key)
+            parts = key.split("/")
+
+            entry = {"timestamp": Statement._timestamp_from_key(key)[0],
+                     "line_item_uid": "/".join(parts[2:5]),
+                     "transaction_uid": line_item.uid(),
+                     "code": info.code().value,
+                     "value": str(info.value()),
+                     "receipted_value": str(info.receipted_value()),
+                     "description": None,
+                     "debit_account_uid": None,
+                     "credit_account_uid": None,
+                     "state": None}
+
+            record = records.get(line_item.uid(), None)
+
+            if record is not None and not record.is_null():
+                entry["description"] = record.description()
+                entry["debit_account_uid"] = record.debit_account_uid()
+                entry["credit_account_uid"] = record.credit_account_uid()
+                entry["state"] = record.transaction_state().value
+
+            entry["_key"] = key
+            entries.append(entry)
+
+        return entries
+
+    @staticmethod
+    def _refresh_states(entries, bucket, batch_size=50):
+        """Internal function that re-reads the state of the transaction
+           of each of the passed (cached) entries whose state could
+           still have changed. The records are read concurrently, in
+           batches of 'batch_size'
+        """
+        from ._ledger import Ledger as _Ledger
+
+        def _load_state(uid):
+            try:
+                return _Ledger.load_transaction(
+                            uid, bucket=bucket).transaction_state().value
+            except:
+                return None
+
+        stale = [entry for entry in entries
+                 if entry["transaction_uid"] is not None and
+                 entry["state"] not in _final_states]
+
+        batch_size = max(1, int(batch_size))
+
+        for i in range(0, len(stale), batch_size):
+            batch = stale[i:i+batch_size]
+
+            with _ThreadPoolExecutor(max_workers=len(batch)) as pool:
+                states = list(pool.map(
+                    lambda entry: _load_state(entry["transaction_uid"]),
+                    batch))
+
+            for (entry, state) in zip(batch, states):
+                if state is not None:
+                    entry["state"] = state
+
+    def _generate(self, account, bucket, batch_size):
+        """Internal function used to generate this statement"""
+        start_of_day = _start_of_day(self._start_time)
+
+        try:
+            (balance, liability, receivable) = account._get_daily_balance(
+                                                    bucket, start_of_day)
+        except AccountError:
+            # the account did not exist at the start of this period
+            (balance, liability, receivable) = (_create_decimal(0),
+                                                _create_decimal(0),
+                                                _create_decimal(0))
+
+        if self._start_time > start_of_day:
+            # add on everything between the start of the day and the
+            # start of the statement
+            keys = account._get_transaction_keys_between(
+                        start_of_day,
+                        self._start_time - _datetime.timedelta(
+                                                    microseconds=1),
+                        bucket=bucket)
+            total = _sum_transactions(keys)
+            balance += total[0]
+            liability += total[1]
+            receivable += total[2]
+
+        self._opening_balance = (balance, liability, receivable)
+
+        entries = []
+
+        for entry in Statement.stream_entries(account, self._start_time,
+                                              self._end_time, bucket=bucket,
+                                              batch_size=batch_size):
+            total = _sum_transactions([entry.pop("_key")])
+            balance += total[0]
+            liability += total[1]
+            receivable += total[2]
+            entries.append(entry)
+
+        self._closing_balance = (balance, liability, receivable)
+        self._entries = entries
+
+    def _key(self):
+        """Return the key used to cache this statement in the object store"""
+        return "%s/%s/%s_%s" % (_statement_root(), self._account_uid,
+                                self._start_time.timestamp(),
+                                self._end_time.timestamp())
+
+    def is_null(self):
+        """Return whether or not this is a null statement"""
+        return self._account_uid is None
+
+    def is_closed(self):
+        """Return whether or not the period covered by this statement
+           has closed, i.e. it ended before the start of today. The
+           statement for a closed period can no longer change
+        """
+        if self.is_null():
+            return False
+
+        return self._end_time < _start_of_day(_datetime.datetime.now())
+
+    def account_uid(self):
+        """Return the UID of the account for this statement"""
+        return self._account_uid
+
+    def start_time(self):
+        """Return the start time of the period covered by this statement"""
+        return self._start_time
+
+    def end_time(self):
+        """Return the end time of the period covered by this statement"""
+        return self._end_time
+
+    def opening_balance(self):
+        """Return the (balance, liability, receivable) of the account
+           at the start of the statement
+        """
+        return self._opening_balance
+
+    def closing_balance(self):
+        """Return the (balance, liability, receivable) of the account
+           at the end of the statement
+        """
+        return self._closing_balance
+
+    def entries(self):
+        """Return the entries in this statement"""
+        return self._entries
+
+    def to_csv(self):
+        """Return this statement's entries as a CSV-formatted string"""
+        output = _io.StringIO()
+        self.write_csv(output)
+        return output.getvalue()
+
+    def write_csv(self, stream):
+        """Write this statement's entries in CSV format to 'stream'"""
+        writer = _csv.DictWriter(stream, fieldnames=_entry_fields)
+        writer.writeheader()
+
+        for entry in self._entries:
+            writer.writerow(entry)
+
+    def to_jsonl(self):
+        """Return this statement's entries as a JSON-lines string"""
+        output = _io.StringIO()
+        self.write_jsonl(output)
+        return output.getvalue()
+
+    def write_jsonl(self, stream):
+        """Write this statement's entries in JSON-lines format
+           to 'stream'
+        """
+        for entry in self._entries:
+            stream.write(_json.dumps(entry))
+            stream.write("\n")
+
+    def to_data(self):
+        """Return a dictionary that can be encoded to json from this object"""
+        data = {}
+
+        if not self.is_null():
+            data["account_uid"] = self._account_uid
+            data["start_time"] = self._start_time.timestamp()
+            data["end_time"] = self._end_time.timestamp()
+            data["opening_balance"] = [str(x) for x in self._opening_balance]
+            data["closing_balance"] = [str(x) for x in self._closing_balance]
+            data["entries"] = self._entries
+
+        return data
+
+    @staticmethod
+    def from_data(data):
+        """Construct and return a Statement from the passed dictionary
+           that has been decoded from json
+        """
+        statement = Statement()
+
+        if (data and len(data) > 0):
+            statement._account_uid = data["account_uid"]
+            statement._start_time = _datetime.datetime.fromtimestamp(
+                                                        data["start_time"])
+            statement._end_time = _datetime.datetime.fromtimestamp(
+                                                        data["end_time"])
+            statement._opening_balance = tuple(
+                [_create_decimal(x) for x in data["opening_balance"]])
+            statement._closing_balance = tuple(
+                [_create_decimal(x) for x in data["closing_balance"]])
+            statement._entries = data["entries"]
+
+        return statement
@@ -109,6 +109,10 @@ class TransactionInfo:
         else:
             return "%2s%013.6fT%013.6f" % (code.value, value, receipted_value)
 
+    def code(self):
+        """Return the TransactionCode of the transaction"""
+        return self._code
+
     def value(self):
         """Return the value of the transaction"""
         return self._value
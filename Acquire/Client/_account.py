@@ -1,9 +1,12 @@
 
 import datetime as _datetime
 
-from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.Crypto import get_private_key as _get_private_key
 
 from Acquire.Service import call_function as _call_function
+from Acquire.Service import gather_calls as _gather_calls
+from Acquire.Service import call_batch_function as _call_batch_function
+from Acquire.Service import BatchNotSupportedError as _BatchNotSupportedError
 from Acquire.Service import Service as _Service
 
 from Acquire.Identity import Authorisation as _Authorisation
@@ -27,7 +30,7 @@ def _get_accounting_service(accounting_url=None):
     if accounting_url is None:
         accounting_url = _get_accounting_url()
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
     response = _call_function(accounting_url, response_key=privkey)
 
     try:
@@ -72,12 +75,13 @@ def _get_account_uid(user, account_name, accounting_service=None,
         auth = _Authorisation(user=user)
         args["authorisation"] = auth.to_data()
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
 
     result = _call_function(
             accounting_service.service_url(), "get_account_uids",
             args=args,
             args_key=accounting_service.public_key(),
+            use_session_key=True,
             response_key=privkey,
             public_cert=accounting_service.public_certificate())
 
@@ -110,21 +114,25 @@ def _get_account_uids(user, accounting_service=None, accounting_url=None):
     auth = _Authorisation(user=user)
     args = {"authorisation": auth.to_data()}
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
 
     result = _call_function(
             accounting_service.service_url(), "get_account_uids",
             args=args,
             args_key=accounting_service.public_key(),
+            use_session_key=True,
             response_key=privkey,
             public_cert=accounting_service.public_certificate())
 
     return result["account_uids"]
 
 
-def get_accounts(user, accounting_service=None, accounting_url=None):
+def get_accounts(user, accounting_service=None, accounting_url=None,
+                 refresh=False):
     """Return all of the accounts of the passed user. Note that the
-    user must be authenticated to call this function
+    user must be authenticated to call this function. If 'refresh'
+    is True then the latest data (balance etc.) for all of the
+    accounts is fetched, with the calls made concurrently
     """
     if accounting_service is None:
         accounting_service = _get_accounting_service(accounting_url)
@@ -145,6 +153,26 @@ def get_accounts(user, accounting_service=None, accounting_url=None):
 
         accounts.append(account)
 
+    if refresh and len(accounts) > 0:
+        # fetch the data for all accounts in a single batch call, falling
+        # back to concurrent individual calls if the service cannot batch
+        try:
+            privkey = _get_private_key()
+            results = _call_batch_function(
+                accounting_service.service_url(),
+                [("get_info", account._get_info_args())
+                 for account in accounts],
+                args_key=accounting_service.public_key(),
+                use_session_key=True,
+                response_key=privkey,
+                public_cert=accounting_service.public_certificate())
+        except _BatchNotSupportedError:
+            results = _gather_calls([account._get_info_call()
+                                     for account in accounts])
+
+        for (account, result) in zip(accounts, results):
+            account._set_info(result)
+
     return accounts
 
 
@@ -179,12 +207,13 @@ def create_account(user, account_name, description=None,
     else:
         args["description"] = str(description)
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
 
     result = _call_function(
                 accounting_service.service_url(), "create_account",
                 args=args,
                 args_key=accounting_service.public_key(),
+                use_session_key=True,
                 response_key=privkey,
                 public_cert=accounting_service.public_certificate())
 
@@ -220,12 +249,13 @@ def deposit(user, value, description=None,
     else:
         args["transaction"] = _Transaction(value, description).to_data()
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
 
     result = _call_function(
                     accounting_service.service_url(), "deposit",
                     args=args,
                     args_key=accounting_service.public_key(),
+                    use_session_key=True,
                     response_key=privkey,
                     public_cert=accounting_service.public_certificate())
 
@@ -356,6 +386,13 @@ class Account:
         if not should_refresh:
             return
 
+        self._set_info(_call_function(**self._get_info_call()))
+
+    def _get_info_args(self):
+        """Return the arguments for the get_info function on the
+           accounting service, used to fetch the latest data for
+           this account
+        """
         if not self.is_logged_in():
             raise PermissionError(
                 "You cannot get information about this account "
@@ -363,18 +400,27 @@ class Account:
 
         auth = _Authorisation(resource=self._account_uid, user=self._user)
 
-        args = {"authorisation": auth.to_data(),
+        return {"authorisation": auth.to_data(),
                 "account_name": self.name()}
 
-        privkey = _PrivateKey()
-
-        result = _call_function(
-                    self._accounting_service.service_url(), "get_info",
-                    args=args,
-                    args_key=self._accounting_service.public_key(),
-                    response_key=privkey,
-                    public_cert=self._accounting_service.public_certificate())
-
+    def _get_info_call(self):
+        """Return the arguments to call_function needed to fetch the
+           latest data for this account from the accounting service
+        """
+        privkey = _get_private_key()
+
+        return {"service_url": self._accounting_service.service_url(),
+                "function": "get_info",
+                "args": self._get_info_args(),
+                "args_key": self._accounting_service.public_key(),
+                "use_session_key": True,
+                "response_key": privkey,
+                "public_cert": self._accounting_service.public_certificate()}
+
+    def _set_info(self, result):
+        """Set the data for this account from the result of calling
+           get_info on the accounting service
+        """
         self._overdraft_limit = _create_decimal(result["overdraft_limit"])
         self._balance = _create_decimal(result["balance"])
         self._liability = _create_decimal(result["liability"])
@@ -464,12 +510,13 @@ class Account:
                 "is_provisional": is_provisional,
                 "authorisation": auth.to_data()}
 
-        privkey = _PrivateKey()
+        privkey = _get_private_key()
 
         result = _call_function(
                     self._accounting_service.service_url(), "perform",
                     args=args,
                     args_key=self._accounting_service.public_key(),
+                    use_session_key=True,
                     response_key=privkey,
                     public_cert=self._accounting_service.public_certificate())
 
@@ -497,12 +544,13 @@ class Account:
         if receipted_value is not None:
             args["receipted_value"] = str(_create_decimal(receipted_value))
 
-        privkey = _PrivateKey()
+        privkey = _get_private_key()
 
         result = _call_function(
                     self._accounting_service.service_url(), "receipt",
                     args=args,
                     args_key=self._accounting_service.public_key(),
+                    use_session_key=True,
                     response_key=privkey,
                     public_cert=self._accounting_service.public_certificate())
 
@@ -527,12 +575,13 @@ class Account:
         args = {"credit_note": credit_note.to_data(),
                 "authorisation": auth.to_data()}
 
-        privkey = _PrivateKey()
+        privkey = _get_private_key()
 
         result = _call_function(
                     self._accounting_service.service_url(), "refund",
                     args=args,
                     args_key=self._accounting_service.public_key(),
+                    use_session_key=True,
                     response_key=privkey,
                     public_cert=self._accounting_service.public_certificate())
 
@@ -1,5 +1,5 @@
 
-from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.Crypto import get_private_key as _get_private_key
 
 from Acquire.Service import call_function as _call_function
 from Acquire.Service import Service as _Service
@@ -22,7 +22,7 @@ def _get_access_service(access_url=None):
     if access_url is None:
         access_url = _get_access_url()
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
     response = _call_function(access_url, response_key=privkey)
 
     try:
@@ -123,13 +123,14 @@ class CloudDrive:
 
         args = {"request": request.to_data()}
 
-        privkey = _PrivateKey()
+        privkey = _get_private_key()
 
         result = _call_function(
                     self._access_service.service_url(), "request",
                     args=args,
                     args_key=self._access_service.public_key(),
                     response_key=privkey,
-                    public_cert=self._access_service.public_certificate())
+                    public_cert=self._access_service.public_certificate(),
+                    binary=True)
 
         return result
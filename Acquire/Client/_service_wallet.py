@@ -17,6 +17,7 @@ from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
 from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
 
 from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.Crypto import get_private_key as _get_private_key
 from Acquire.Crypto import OTP as _OTP
 
 from ._errors import LoginError
@@ -281,7 +282,7 @@ class ServiceWallet:
             pass
 
         try:
-            key = _PrivateKey()
+            key = _get_private_key()
             response = _call_function(service_url, response_key=key)
             service = _Service.from_data(response["service_info"])
         except Exception as e:
@@ -359,7 +360,7 @@ class ServiceWallet:
         _sys.stdout.flush()
 
         try:
-            key = _PrivateKey()
+            key = _get_private_key()
             response = _call_function(service_url, function,
                                       args_key=service_key, response_key=key,
                                       public_cert=service_cert,
@@ -13,6 +13,7 @@ from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
 from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
 
 from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.Crypto import get_private_key as _get_private_key
 from Acquire.Crypto import PublicKey as _PublicKey
 
 from ._qrcode import create_qrcode as _create_qrcode
@@ -29,6 +30,14 @@ except:
 
 __all__ = ["User", "username_to_uid", "uid_to_username", "get_session_keys"]
 
+# The identity services that do not support wait_for_status, and so
+# must be polled using get_status
+_polling_only_services = set()
+
+# The maximum number of seconds that a single call to wait_for_status
+# will wait for the login status to change
+_max_status_wait = 10
+
 
 class _LoginStatus(_Enum):
     EMPTY = 0
@@ -48,7 +57,7 @@ def _get_identity_service(identity_url=None):
     if identity_url is None:
         identity_url = _get_identity_url()
 
-    privkey = _PrivateKey()
+    privkey = _get_private_key()
     response = _call_function(identity_url, response_key=privkey)
 
     try:
@@ -132,6 +141,7 @@ class User:
         """Construct a null user"""
         self._username = username
         self._status = _LoginStatus.EMPTY
+        self._session_status = None
         self._identity_service = None
 
         if identity_url:
@@ -157,6 +167,7 @@ class User:
     def _set_status(self, status):
         """Internal function used to set the status from the
            string obtained from the LoginSession"""
+        self._session_status = status
 
         if status == "approved":
             self._status = _LoginStatus.LOGGED_IN
@@ -322,7 +333,7 @@ class User:
         if identity_url is None:
             identity_url = _get_identity_url()
 
-        privkey = _PrivateKey()
+        privkey = _get_private_key()
 
         result = _call_function(
                     identity_url, "register",
@@ -447,6 +458,7 @@ class User:
         self._signing_key = signing_key
         self._session_uid = session_uid
         self._status = _LoginStatus.LOGGING_IN
+        self._session_status = "unapproved"
         self._user_uid = result["user_uid"]
 
         qrcode = None
@@ -494,12 +506,59 @@ class User:
         status = result["session_status"]
         self._set_status(status)
 
+    def _wait_for_session_status(self, timeout):
+        """Function used to ask the identity service to wait for up to
+           'timeout' seconds for the status of this session to change
+           from the last status that was seen.
+           This returns False if the identity service does not support
+           this, in which case the status must be polled instead
+        """
+        identity_url = self.identity_service_url()
+
+        if identity_url is None:
+            return True
+
+        if identity_url in _polling_only_services:
+            return False
+
+        result = _call_function(identity_url, "wait_for_status",
+                                username=self._username,
+                                session_uid=self._session_uid,
+                                session_status=self._session_status,
+                                timeout=timeout)
+
+        try:
+            status = int(result["status"])
+        except:
+            status = -1
+
+        try:
+            message = result["message"]
+        except:
+            message = str(result)
+
+        if status != 0:
+            if message.startswith("Unknown function"):
+                # this is an older identity service
+                _polling_only_services.add(identity_url)
+                return False
+
+            error = "Failed to query identity service. Error = %d. " \
+                    "Message = %s" % (status, message)
+            self._set_error_state(error)
+            raise LoginError(error)
+
+        self._set_status(result["session_status"])
+
+        return True
+
     def wait_for_login(self, timeout=None, polling_delta=5):
         """Block until the user has logged in. If 'timeout' is set
            then we will wait for a maximum of that number of seconds
 
-           This will check whether we have logged in by polling
-           the identity service every 'polling_delta' seconds.
+           This will ask the identity service to tell us as soon as
+           the user has logged in. If the identity service cannot do
+           this, then we will poll it every 'polling_delta' seconds.
         """
 
         self._check_for_error()
@@ -513,35 +572,36 @@ class User:
         elif polling_delta < 1:
             polling_delta = 1
 
-        if timeout is None:
-            # block forever....
-            while True:
-                self._poll_session_status()
-
-                if self.is_logged_in():
-                    return True
-
-                elif not self.is_logging_in():
-                    return False
-
-                _time.sleep(polling_delta)
-        else:
+        if timeout is not None:
             # only block until the timeout has been reached
             timeout = int(timeout)
             if timeout < 1:
                 timeout = 1
 
-            start_time = _datetime.now()
+        start_time = _datetime.now()
+
+        while True:
+            if timeout is None:
+                # block forever....
+                wait = _max_status_wait
+            else:
+                wait = timeout - (_datetime.now() - start_time).seconds
+
+                if wait <= 0:
+                    return False
 
-            while (_datetime.now() - start_time).seconds < timeout:
+                wait = min(wait, _max_status_wait)
+
+            waited = self._wait_for_session_status(wait)
+
+            if not waited:
                 self._poll_session_status()
 
-                if self.is_logged_in():
-                    return True
+            if self.is_logged_in():
+                return True
 
-                elif not self.is_logging_in():
-                    return False
+            elif not self.is_logging_in():
+                return False
 
+            if not waited:
                 _time.sleep(polling_delta)
-
-            return False
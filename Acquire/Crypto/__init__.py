@@ -6,26 +6,14 @@ libraries. The aim is to provide a simple interface that ensures that
 all cryptography in Acquire uses best practice
 """
 
-from ._keys import *
-from ._otp import *
 from ._errors import *
 
-try:
-    if __IPYTHON__:
-        def _set_printer(C):
-            """Function to tell ipython to use __str__ if available"""
-            get_ipython().display_formatter.formatters['text/plain'].for_type(
-                C,
-                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
-                )
+# All other submodules are only imported when they are first used
+from Acquire._lazy import lazy_loader as _lazy_loader
 
-        import sys as _sys
-        import inspect as _inspect
-
-        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
-                                          _inspect.isclass)
-
-        for _clsmember in _clsmembers:
-            _set_printer(_clsmember[1])
-except:
-    pass
+(__getattr__, __dir__, _lazy_names) = _lazy_loader(__name__, {
+    "_keys": ["PrivateKey", "PublicKey"],
+    "_symmetrickey": ["SymmetricKey"],
+    "_keypool": ["get_private_key", "set_private_key_pool_options",
+                 "clear_private_key_pool"],
+    "_otp": ["OTP"]})
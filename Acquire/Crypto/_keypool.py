@@ -0,0 +1,156 @@
+
+import threading as _threading
+import time as _time
+
+from ._keys import PrivateKey as _PrivateKey
+
+__all__ = ["get_private_key", "set_private_key_pool_options",
+           "clear_private_key_pool"]
+
+# Generating an RSA key takes tens to hundreds of milliseconds, which is
+# too long to spend on every call just to receive an encrypted response.
+# Instead, response keys are drawn from a small pool of keys that are
+# generated in a background thread. The current key is reused until it
+# is more than '_key_lifetime' seconds old, or has been used more than
+# '_max_key_uses' times, at which point the next key from the pool
+# is used instead
+_pool = []
+_pool_size = 2
+_key_lifetime = 300
+_max_key_uses = 100
+
+_current_key = None
+_current_key_created = 0
+_current_key_uses = 0
+
+_lock = _threading.Lock()
+_refill_thread = None
+
+
+def set_private_key_pool_options(pool_size=None, lifetime=None,
+                                 max_uses=None):
+    """Set the number of keys to pre-generate ('pool_size'), the
+       maximum age in seconds of a key before it is rotated ('lifetime')
+       and the maximum number of times a key is used before it is
+       rotated ('max_uses'). Pass None to leave a value unchanged.
+       Setting 'max_uses' to 1 will return a new key for every call
+    """
+    global _pool_size, _key_lifetime, _max_key_uses
+
+    with _lock:
+        if pool_size is not None:
+            pool_size = int(pool_size)
+
+            if pool_size < 0:
+                raise ValueError("The key pool size cannot be negative")
+
+            _pool_size = pool_size
+
+            while len(_pool) > _pool_size:
+                _pool.pop()
+
+        if lifetime is not None:
+            lifetime = float(lifetime)
+
+            if lifetime <= 0:
+                raise ValueError("The key lifetime must be positive")
+
+            _key_lifetime = lifetime
+
+        if max_uses is not None:
+            max_uses = int(max_uses)
+
+            if max_uses < 1:
+                raise ValueError("A key must be usable at least once")
+
+            _max_key_uses = max_uses
+
+
+def clear_private_key_pool():
+    """Discard the current key and all of the pre-generated keys, so that
+       the next call to get_private_key returns a new key
+    """
+    global _current_key, _current_key_created, _current_key_uses
+
+    with _lock:
+        _pool.clear()
+        _current_key = None
+        _current_key_created = 0
+        _current_key_uses = 0
+
+
+def _refill_pool():
+    """Generate keys until the pool is full. This is run in the
+       background thread
+    """
+    global _refill_thread
+
+    while True:
+        with _lock:
+            if len(_pool) >= _pool_size:
+                _refill_thread = None
+                return
+
+        key = _PrivateKey()
+
+        with _lock:
+            if len(_pool) < _pool_size:
+                _pool.append(key)
+
+
+def _start_refill():
+    """Start the background thread that refills the pool, if it is not
+       already running. This must be called while holding _lock
+    """
+    global _refill_thread
+
+    if _refill_thread is not None or len(_pool) >= _pool_size:
+        return
+
+    _refill_thread = _threading.Thread(target=_refill_pool,
+                                       name="acquire_keypool",
+                                       daemon=True)
+    _refill_thread.start()
+
+
+def get_private_key():
+    """Return a private key that can be used as the response key for
+       a call to a service. The same key is shared by up to
+       '_max_key_uses' calls made within '_key_lifetime' seconds, and
+       new keys are generated in a background thread, so that this does
+       not normally need to wait for a key to be generated. Do not use
+       this for keys that must be unique (e.g. session or signing keys)
+    """
+    global _current_key, _current_key_created, _current_key_uses
+
+    with _lock:
+        now = _time.monotonic()
+
+        if _current_key is None or _current_key_uses >= _max_key_uses or \
+                now - _current_key_created > _key_lifetime:
+            if len(_pool) > 0:
+                _current_key = _pool.pop(0)
+            else:
+                _current_key = None
+
+            _current_key_created = now
+            _current_key_uses = 0
+
+        key = _current_key
+
+    if key is None:
+        # the pool was empty, so generate the key now (outside the lock
+        # so that other threads are not blocked while this happens)
+        key = _PrivateKey()
+
+        with _lock:
+            if _current_key is None:
+                _current_key = key
+            else:
+                key = _current_key
+
+    with _lock:
+        _current_key_uses += 1
+        _start_refill()
+
+    return key
@@ -0,0 +1,155 @@
+
+import base64 as _base64
+import datetime as _datetime
+import os as _os
+import uuid as _uuid
+
+import lazy_import as _lazy_import
+
+from ._errors import DecryptionError, KeyManipulationError
+
+_aead = _lazy_import.lazy_module(
+            "cryptography.hazmat.primitives.ciphers.aead")
+
+__all__ = ["SymmetricKey"]
+
+
+def _bytes_to_string(b):
+    """Return the passed binary bytes safely encoded to
+       a base64 utf-8 string"""
+    if b is None:
+        return None
+    else:
+        return _base64.b64encode(b).decode("utf-8")
+
+
+def _string_to_bytes(s):
+    """Return the passed base64 utf-8 encoded binary data
+       back converted from a string back to bytes"""
+    if s is None:
+        return None
+    else:
+        return _base64.b64decode(s.encode("utf-8"))
+
+
+class SymmetricKey:
+    """This is a holder for an in-memory AES-GCM symmetric key. This
+       is used as a session key that is shared between a client and
+       a service, so that messages can be encrypted and authenticated
+       without needing any (expensive) asymmetric operations. Each
+       key has a UID, which identifies the key to the service, and
+       an expiry time, after which the key should not be used
+    """
+    def __init__(self, key=None, uid=None, expiry=None, lifetime=3600):
+        """Construct the key either from the passed key bytes, uid and
+           expiry time, or by generating a new key that will expire
+           after 'lifetime' seconds
+        """
+        if key is None:
+            self._key = _aead.AESGCM.generate_key(bit_length=256)
+            self._uid = str(_uuid.uuid4())
+            self._expiry = _datetime.datetime.now() + \
+                _datetime.timedelta(seconds=lifetime)
+        else:
+            if uid is None or expiry is None:
+                raise KeyManipulationError(
+                    "You must supply the UID and expiry time of an "
+                    "existing symmetric key")
+
+            self._key = key
+            self._uid = str(uid)
+            self._expiry = expiry
+
+    def __str__(self):
+        return "SymmetricKey(uid=%s, expiry=%s)" % \
+            (self._uid, self._expiry.isoformat())
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self._uid == other._uid and self._key == other._key
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def uid(self):
+        """Return the UID of this key"""
+        return self._uid
+
+    def expiry(self):
+        """Return the datetime when this key expires"""
+        return self._expiry
+
+    def is_expired(self, margin=0):
+        """Return whether or not this key has expired, or will expire
+           within the next 'margin' seconds
+        """
+        return _datetime.datetime.now() + \
+            _datetime.timedelta(seconds=margin) >= self._expiry
+
+    def _associated_data(self, associated_data):
+        """Return the data that is authenticated with each message. This
+           is the key UID, plus any passed 'associated_data'
+        """
+        if associated_data is None:
+            return self._uid.encode("utf-8")
+
+        if isinstance(associated_data, str):
+            associated_data = associated_data.encode("utf-8")
+
+        return self._uid.encode("utf-8") + b"\x00" + bytes(associated_data)
+
+    def encrypt(self, message, associated_data=None):
+        """Encrypt and return the passed message. The returned bytes
+           hold the random 12-byte nonce followed by the ciphertext
+           (which includes the authentication tag). The key UID, and
+           any passed 'associated_data', are authenticated with the
+           message, so it can only be decrypted by passing the same
+           'associated_data'
+        """
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+
+        nonce = _os.urandom(12)
+        return nonce + _aead.AESGCM(self._key).encrypt(
+                            nonce, message,
+                            self._associated_data(associated_data))
+
+    def decrypt(self, message, associated_data=None):
+        """Decrypt and return the passed message. This raises a
+           DecryptionError if the message was not encrypted with
+           this key (and 'associated_data'), or has been tampered with
+        """
+        if self.is_expired():
+            raise DecryptionError("Cannot decrypt using the expired "
+                                  "symmetric key %s" % self._uid)
+
+        try:
+            return _aead.AESGCM(self._key).decrypt(
+                        message[0:12], message[12:],
+                        self._associated_data(associated_data))
+        except Exception as e:
+            raise DecryptionError("Cannot decrypt the message using the "
+                                  "symmetric key %s: %s" %
+                                  (self._uid, str(e)))
+
+    def to_data(self):
+        """Return this key as a json-serialisable dictionary. Note that
+           this contains the secret key, so must only ever be sent or
+           stored in encrypted form
+        """
+        return {"key": _bytes_to_string(self._key),
+                "uid": self._uid,
+                "expiry": self._expiry.timestamp()}
+
+    @staticmethod
+    def from_data(data):
+        """Construct from the passed json-deserialised dictionary"""
+        if data is None or len(data) == 0:
+            return None
+
+        return SymmetricKey(
+                    key=_string_to_bytes(data["key"]),
+                    uid=data["uid"],
+                    expiry=_datetime.datetime.fromtimestamp(data["expiry"]))
@@ -6,28 +6,16 @@ an Acquire Identity Service. The Identity Service is responsible for
 identifying and authenticating users.
 """
 
-from ._identity_service import *
-from ._loginsession import *
-from ._authorisation import *
-from ._useraccount import *
 from ._errors import *
 
-try:
-    if __IPYTHON__:
-        def _set_printer(C):
-            """Function to tell ipython to use __str__ if available"""
-            get_ipython().display_formatter.formatters['text/plain'].for_type(
-                C,
-                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
-                )
+# All other submodules are only imported when they are first used
+from Acquire._lazy import lazy_loader as _lazy_loader
 
-        import sys as _sys
-        import inspect as _inspect
-
-        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
-                                          _inspect.isclass)
-
-        for _clsmember in _clsmembers:
-            _set_printer(_clsmember[1])
-except:
-    pass
+(__getattr__, __dir__, _lazy_names) = _lazy_loader(__name__, {
+    "_identity_service": ["IdentityService"],
+    "_loginsession": ["LoginSession"],
+    "_authorisation": ["Authorisation"],
+    "_useraccount": ["UserAccount"],
+    "_otpindex": ["OTPIndex"],
+    "_sessionindex": ["SessionIndex"],
+    "_deviceindex": ["DeviceIndex"]})
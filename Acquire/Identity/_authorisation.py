@@ -1,11 +1,121 @@
 
 import datetime as _datetime
+import threading as _threading
+
+from functools import partial as _partial
+
+from cachetools import TTLCache as _TTLCache
 
 from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
 from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
 
 __all__ = ["Authorisation"]
 
+# The login sessions that have been looked up by this process, keyed by
+# (identity_url, user_uid, session_uid). Each entry holds the public
+# certificate of the session, the time the user logged out of it (or
+# None) and the time at which it was looked up. A session that has been
+# logged out cannot change, so is used for any authorisation. A session
+# that was open is only used for authorisations that were signed before
+# it was looked up (as these must have been signed before any logout).
+# Authorisations signed later cause the session to be looked up again,
+# so a logout is seen straight away by every service. Entries are held
+# for at most 60 seconds
+_session_cache = _TTLCache(maxsize=1000, ttl=60)
+_session_cache_lock = _threading.Lock()
+
+
+def _is_usable(session, signed_at):
+    """Return whether or not the cached 'session' can be used to verify
+       an authorisation that was signed at timestamp 'signed_at'
+    """
+    (_public_cert, logout_timestamp, checked_at) = session
+
+    return logout_timestamp is not None or \
+        (signed_at is not None and signed_at < checked_at)
+
+
+def _lookup_session(identity_url, user_uid, session_uid):
+    """Internal function that asks the identity service at 'identity_url'
+       for the public certificate and logout timestamp of the login
+       session 'session_uid' of the user 'user_uid'
+    """
+    from Acquire.Service import get_trusted_service_info as \
+        _get_trusted_service_info
+
+    identity_service = _get_trusted_service_info(identity_url)
+
+    if not identity_service.is_identity_service():
+        raise PermissionError(
+            "Cannot verify an Authorisation that does not use a valid "
+            "identity service")
+
+    response = identity_service.whois(user_uid=user_uid,
+                                      session_uid=session_uid)
+
+    try:
+        logout_timestamp = response["logout_timestamp"]
+    except:
+        logout_timestamp = None
+
+    return (response["public_cert"], logout_timestamp)
+
+
+def _lookup_sessions(identity_url, sessions):
+    """Internal function that looks up all of the passed (user_uid,
+       session_uid) login sessions with the identity service at
+       'identity_url' using a single call per 100 sessions, and adds
+       those that are found to the cache
+    """
+    from Acquire.Service import get_trusted_service_info as \
+        _get_trusted_service_info
+
+    identity_service = _get_trusted_service_info(identity_url)
+
+    if not identity_service.is_identity_service():
+        raise PermissionError(
+            "Cannot verify an Authorisation that does not use a valid "
+            "identity service")
+
+    for i in range(0, len(sessions), 100):
+        chunk = sessions[i:i+100]
+        checked_at = _datetime.datetime.now().timestamp()
+        results = identity_service.whois_many(chunk)
+
+        with _session_cache_lock:
+            for ((user_uid, session_uid), result) in zip(chunk, results):
+                if "error" in result or "public_cert" not in result:
+                    continue
+
+                _session_cache[(identity_url, user_uid, session_uid)] = \
+                    (result["public_cert"],
+                     result.get("logout_timestamp", None), checked_at)
+
+
+def _get_session(identity_url, user_uid, session_uid, signed_at=None,
+                 force=False):
+    """Internal function that returns the (public_cert, logout_timestamp)
+       for the passed login session, for verifying an authorisation
+       signed at timestamp 'signed_at'. This uses the cached value if
+       it can be used for this authorisation, unless 'force' is True
+    """
+    key = (identity_url, user_uid, session_uid)
+
+    if not force:
+        with _session_cache_lock:
+            session = _session_cache.get(key, None)
+
+        if session is not None and _is_usable(session, signed_at):
+            return session[0:2]
+
+    checked_at = _datetime.datetime.now().timestamp()
+    session = _lookup_session(identity_url, user_uid, session_uid)
+
+    with _session_cache_lock:
+        _session_cache[key] = (session[0], session[1], checked_at)
+
+    return session
+
 
 class Authorisation:
     """This class holds the information needed to show that a user
@@ -261,24 +371,12 @@ class Authorisation:
 
         try:
             # we need to get the public signing key for this session
-            from Acquire.Service import get_trusted_service_info as \
-                _get_trusted_service_info
-
-            identity_service = _get_trusted_service_info(self._identity_url)
-
-            if not identity_service.is_identity_service():
-                raise PermissionError(
-                    "Cannot verify an Authorisation that does not use a valid "
-                    "identity service")
-
-            response = identity_service.whois(
-                                    user_uid=self._user_uid,
-                                    session_uid=self._session_uid)
-
-            try:
-                logout_timestamp = response["logout_timestamp"]
-            except:
-                logout_timestamp = None
+            (public_cert, logout_timestamp) = _get_session(
+                                                self._identity_url,
+                                                self._user_uid,
+                                                self._session_uid,
+                                                signed_at=self._auth_timestamp,
+                                                force=force)
 
             if logout_timestamp:
                 # the user has logged out from this session - ensure that
@@ -294,7 +392,7 @@ class Authorisation:
 
             message = self._get_message(resource)
 
-            response["public_cert"].verify(self._signature, message)
+            public_cert.verify(self._signature, message)
 
             self._last_validated_time = _datetime.datetime.now()
             self._last_verified_resource = resource
@@ -318,6 +416,95 @@ class Authorisation:
             else:
                 raise PermissionError("Cannot verify the authorisation")
 
+    @staticmethod
+    def verify_many(authorisations, resources=None, refresh_time=3600,
+                    stale_time=7200, force=False, return_exceptions=False):
+        """Verify all of the passed authorisations. 'resources' is either
+           the list of resources for each authorisation, or a single
+           resource for all of them. The login sessions that are not
+           already cached are looked up together (one call per identity
+           service), and the signatures are then verified concurrently.
+
+           This raises a PermissionError for the first authorisation that
+           is not valid, unless 'return_exceptions' is True, in which case
+           this returns a list holding None for each valid authorisation,
+           and the PermissionError for each invalid authorisation
+        """
+        authorisations = list(authorisations)
+
+        if isinstance(resources, list) or isinstance(resources, tuple):
+            resources = list(resources)
+
+            if len(resources) != len(authorisations):
+                raise ValueError(
+                    "The number of resources (%d) does not match the "
+                    "number of authorisations (%d)" %
+                    (len(resources), len(authorisations)))
+        else:
+            resources = [resources] * len(authorisations)
+
+        # find all of the sessions that need to be looked up
+        missing = {}
+
+        for (auth, resource) in zip(authorisations, resources):
+            if auth.is_null():
+                continue
+
+            if force:
+                auth._last_validated_time = None
+            elif auth.is_verified(refresh_time=refresh_time,
+                                  stale_time=stale_time,
+                                  resource=resource):
+                continue
+
+            key = (auth._identity_url, auth._user_uid, auth._session_uid)
+
+            with _session_cache_lock:
+                session = _session_cache.get(key, None)
+
+            if not force and session is not None and \
+                    _is_usable(session, auth._auth_timestamp):
+                continue
+
+            sessions = missing.setdefault(auth._identity_url, [])
+
+            if (key[1], key[2]) not in sessions:
+                sessions.append((key[1], key[2]))
+
+        for (identity_url, sessions) in missing.items():
+            try:
+                _lookup_sessions(identity_url, sessions)
+            except:
+                # each authorisation will look up its session when
+                # it is verified, and will report the error
+                pass
+
+        from Acquire.Service import gather_calls as _gather_calls
+
+        return _gather_calls(
+                    [_partial(auth.verify, resource=resource,
+                              refresh_time=refresh_time,
+                              stale_time=stale_time)
+                     for (auth, resource) in zip(authorisations, resources)],
+                    return_exceptions=return_exceptions)
+
+    @staticmethod
+    def invalidate_session(user_uid=None, session_uid=None,
+                           identity_url=None):
+        """Remove the matching login sessions from this process's cache
+           of verified sessions. Other processes see a logout without
+           this, as an open session is only used from the cache for
+           authorisations signed before it was looked up.
+           Any argument that is None matches all values, so calling
+           this with no arguments clears the whole cache
+        """
+        with _session_cache_lock:
+            for key in list(_session_cache.keys()):
+                if (identity_url is None or key[0] == identity_url) and \
+                        (user_uid is None or key[1] == user_uid) and \
+                        (session_uid is None or key[2] == session_uid):
+                    _session_cache.pop(key, None)
+
     @staticmethod
     def from_data(data):
         """Return an authorisation created from the json-decoded dictionary"""
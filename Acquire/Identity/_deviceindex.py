@@ -0,0 +1,134 @@
+
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+from Acquire.ObjectStore import Mutex as _Mutex
+
+from Acquire.Service import login_to_service_account as \
+                            _login_to_service_account
+
+__all__ = ["DeviceIndex"]
+
+
+class DeviceIndex:
+    """This class holds the encrypted OTP secrets of all of the devices
+       that a user has asked to be remembered. These are held together
+       in a single object (device_index/<user>), mapping device UID to
+       secret, so that they can be read at the same time as the user's
+       account. Devices that were remembered before this index existed
+       (devices/<user>/<device uid>) are moved into the index when they
+       are next used
+    """
+    def __init__(self, sanitised_name=None):
+        """Construct the index for the user with the passed sanitised
+           username
+        """
+        self._name = sanitised_name
+
+    def __str__(self):
+        return "DeviceIndex(user=%s)" % self._name
+
+    def _key(self):
+        """Return the key for this index in the object store"""
+        return "device_index/%s" % self._name
+
+    def _legacy_key(self, device_uid):
+        """Return the key used for the device before this index existed"""
+        return "devices/%s/%s" % (self._name, device_uid)
+
+    def load(self, bucket=None):
+        """Load and return the dictionary of device UID to encrypted
+           secret for all of the devices in this index
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        try:
+            devices = _ObjectStore.get_object_from_json(bucket, self._key())
+        except:
+            devices = None
+
+        if devices is None:
+            devices = {}
+
+        return devices
+
+    def _update(self, added, removed, bucket):
+        """Internal function that adds the device UID to secret mapping
+           in 'added' to, and removes the device UIDs in 'removed' from,
+           the index. This holds the mutex for the index while it is
+           updated so that concurrent updates are not lost
+        """
+        m = _Mutex(self._key(), timeout=600, lease_time=600, bucket=bucket)
+
+        try:
+            devices = self.load(bucket)
+
+            for (device_uid, secret) in added.items():
+                devices[device_uid] = secret
+
+            for device_uid in removed:
+                devices.pop(device_uid, None)
+
+            _ObjectStore.set_object_from_json(bucket, self._key(), devices)
+        finally:
+            m.unlock()
+
+    def get_secret(self, device_uid, devices=None, bucket=None):
+        """Return the encrypted OTP secret of the device with UID
+           'device_uid', or None if this device is not remembered.
+           'devices' is the result of 'load', if this has already
+           been read
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        if devices is None:
+            devices = self.load(bucket)
+
+        device_uid = str(device_uid)
+
+        try:
+            return devices[device_uid]
+        except KeyError:
+            pass
+
+        # this may have been saved before the index existed
+        try:
+            secret = _ObjectStore.get_string_object(
+                        bucket, self._legacy_key(device_uid))
+        except:
+            secret = None
+
+        if secret is None:
+            return None
+
+        self._update({device_uid: secret}, [], bucket)
+
+        try:
+            _ObjectStore.delete_object(bucket, self._legacy_key(device_uid))
+        except:
+            pass
+
+        return secret
+
+    def add(self, device_uid, secret, bucket=None):
+        """Remember the device with UID 'device_uid', whose OTP secret
+           (encrypted using the user's public key) is 'secret'
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        self._update({str(device_uid): secret}, [], bucket)
+
+    def remove(self, device_uid, bucket=None):
+        """Forget the device with UID 'device_uid'"""
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        device_uid = str(device_uid)
+
+        self._update({}, [device_uid], bucket)
+
+        try:
+            _ObjectStore.delete_object(bucket, self._legacy_key(device_uid))
+        except:
+            pass
@@ -2,10 +2,11 @@
 import uuid as _uuid
 from copy import copy as _copy
 
-from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.Crypto import get_private_key as _get_private_key
 from Acquire.Crypto import PublicKey as _PublicKey
 
 from Acquire.Service import call_function as _call_function
+from Acquire.Service import gather_calls as _gather_calls
 from Acquire.Service import Service as _Service
 from Acquire.Service import ServiceError
 
@@ -47,7 +48,7 @@ class IdentityService(_Service):
                     "You must supply either a username "
                     "or a user's UID for a lookup")
 
-        key = _PrivateKey()
+        key = _get_private_key()
 
         response = None
 
@@ -56,23 +57,37 @@ class IdentityService(_Service):
         else:
             args = {"session_uid": str(session_uid)}
 
+        # the username and user_uid lookups are independent, so are
+        # made concurrently if both are needed
+        calls = []
+
+        if username:
+            username_args = _copy(args)
+            username_args["username"] = str(username)
+            calls.append({"service_url": self.service_url(),
+                          "function": "whois",
+                          "public_cert": self.public_certificate(),
+                          "response_key": key, "args": username_args})
+
+        if user_uid:
+            uid_args = _copy(args)
+            uid_args["user_uid"] = str(user_uid)
+            calls.append({"service_url": self.service_url(),
+                          "function": "whois",
+                          "public_cert": self.public_certificate(),
+                          "response_key": key, "args": uid_args})
+
         try:
+            responses = _gather_calls(calls)
+
             if username:
-                args["username"] = str(username)
-                response = _call_function(
-                                self.service_url(), "whois",
-                                public_cert=self.public_certificate(),
-                                response_key=key, args=args)
+                response = responses.pop(0)
                 lookup_uid = response["user_uid"]
             else:
                 lookup_uid = None
 
             if user_uid:
-                args["user_uid"] = str(user_uid)
-                response = _call_function(
-                    self.service_url(), "whois",
-                    public_cert=self.public_certificate(),
-                    response_key=key, args=args)
+                response = responses.pop(0)
                 lookup_username = response["username"]
             else:
                 lookup_username = None
@@ -113,3 +128,43 @@ class IdentityService(_Service):
             pass
 
         return result
+
+    def whois_many(self, sessions):
+        """Look up many login sessions in a single call. 'sessions' is
+           a list of (user_uid, session_uid) pairs. This returns a list
+           of dictionaries, in the same order, each holding the
+           username, public_key, public_cert and logout_timestamp (if
+           the user has logged out) of the session. If a session could
+           not be found then its "error" key holds the reason why
+        """
+        sessions = [[str(user_uid), str(session_uid)]
+                    for (user_uid, session_uid) in sessions]
+
+        if len(sessions) == 0:
+            return []
+
+        key = _get_private_key()
+
+        try:
+            response = _call_function(
+                            self.service_url(), "whois_many",
+                            public_cert=self.public_certificate(),
+                            response_key=key, args={"sessions": sessions})
+        except Exception as e:
+            raise IdentityServiceError("Failed whois lookup: %s" % str(e))
+
+        results = response["results"]
+
+        if len(results) != len(sessions):
+            raise IdentityServiceError(
+                "The identity service returned %d results for %d sessions" %
+                (len(results), len(sessions)))
+
+        for result in results:
+            for name in ["public_key", "public_cert"]:
+                try:
+                    result[name] = _PublicKey.from_data(result[name])
+                except:
+                    pass
+
+        return results
@@ -3,16 +3,59 @@ import datetime as _datetime
 import uuid as _uuid
 
 import base64 as _base64
+import json as _json
 
 from Acquire.Crypto import PublicKey as _PublicKey
 
+from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
+from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
+
 from ._errors import LoginSessionError
 
+from ._records import pack_record as _pack_record
+from ._records import unpack_record as _unpack_record
+from ._records import is_record as _is_record
+from ._records import pack_string as _pack_string
+from ._records import unpack_string as _unpack_string
+from ._records import pack_timestamp as _pack_timestamp
+from ._records import unpack_timestamp as _unpack_timestamp
+from ._records import pem_to_der as _pem_to_der
+from ._records import der_to_pem as _der_to_pem
+
 __all__ = ["LoginSession", "LoginSessionError"]
 
+# The magic string and version of the binary record of a LoginSession
+_record_magic = b"\x00ALS"
+_record_version = 1
+
+
+def _load_key(key):
+    """Return the passed key as a PublicKey. Keys that are read from the
+       object store are held as DER bytes, and are only loaded when
+       they are first used
+    """
+    if isinstance(key, bytes):
+        return _PublicKey.read_bytes(_der_to_pem(key))
+    else:
+        return key
+
+
+def _key_to_der(key):
+    """Return the DER bytes of the passed key (or None)"""
+    if key is None:
+        return None
+    elif isinstance(key, bytes):
+        return key
+    else:
+        return _pem_to_der(key.bytes())
+
 
 class LoginSession:
     """This class holds all details of a single login session"""
+    __slots__ = ["_pubkey", "_uid", "_request_datetime", "_login_datetime",
+                 "_logout_datetime", "_pubcert", "_status", "_ipaddr",
+                 "_hostname", "_login_message"]
+
     def __init__(self, public_key=None, public_cert=None, ip_addr=None,
                  hostname=None, login_message=None):
         self._pubkey = None
@@ -100,6 +143,7 @@ class LoginSession:
                 "You cannot get a public key from "
                 "a login session that has been marked as suspicious")
 
+        self._pubkey = _load_key(self._pubkey)
         return self._pubkey
 
     def public_certificate(self):
@@ -114,6 +158,7 @@ class LoginSession:
                 "You cannot get a public certificate from "
                 "a login session that has been marked as suspicious")
 
+        self._pubcert = _load_key(self._pubcert)
         return self._pubcert
 
     def request_source(self):
@@ -294,10 +339,12 @@ class LoginSession:
             data["logout_timestamp"] = None
 
         if self._pubkey:
-            data["public_key"] = self._pubkey.to_data()
+            data["public_key"] = {"bytes": _bytes_to_string(
+                                    _der_to_pem(_key_to_der(self._pubkey)))}
 
         if self._pubcert:
-            data["public_certificate"] = self._pubcert.to_data()
+            data["public_certificate"] = {"bytes": _bytes_to_string(
+                                    _der_to_pem(_key_to_der(self._pubcert)))}
 
         data["status"] = self._status
         data["ipaddr"] = self._ipaddr
@@ -337,14 +384,16 @@ class LoginSession:
             except:
                 logses._logout_datetime = None
 
+            # the keys are only loaded when they are used
             try:
-                logses._pubkey = _PublicKey.from_data(data["public_key"])
+                logses._pubkey = _pem_to_der(
+                    _string_to_bytes(data["public_key"]["bytes"]))
             except:
                 logses._pubkey = None
 
             try:
-                logses._pubcert = _PublicKey.from_data(
-                                            data["public_certificate"])
+                logses._pubcert = _pem_to_der(
+                    _string_to_bytes(data["public_certificate"]["bytes"]))
             except:
                 logses._pubcert = None
 
@@ -360,3 +409,69 @@ class LoginSession:
             raise LoginSessionError(
                 "Cannot load the LoginSession from "
                 "the object store? error = %s" % (str(e)))
+
+    def to_bytes(self):
+        """Return this LoginSession as a compact binary record. The keys
+           are stored in DER format
+        """
+        if self._uid is None:
+            return None
+
+        return _pack_record(_record_magic, _record_version, [
+                    _pack_string(self._uid),
+                    _pack_string(self._status),
+                    _pack_timestamp(self._request_datetime),
+                    _pack_timestamp(self._login_datetime),
+                    _pack_timestamp(self._logout_datetime),
+                    _key_to_der(self._pubkey),
+                    _key_to_der(self._pubcert),
+                    _pack_string(self._ipaddr),
+                    _pack_string(self._hostname),
+                    _pack_string(self._login_message)])
+
+    @staticmethod
+    def from_bytes(data):
+        """Return a LoginSession constructed from the passed bytes. These
+           can either be a binary record created by 'to_bytes', or the
+           json of the data created by 'to_data'
+        """
+        if data is None:
+            return None
+
+        if not _is_record(data, _record_magic):
+            return LoginSession.from_data(_json.loads(data))
+
+        try:
+            (version, fields) = _unpack_record(data, _record_magic)
+
+            if version != _record_version:
+                raise LoginSessionError("Unsupported version %s" % version)
+
+            logses = LoginSession()
+
+            logses._uid = _unpack_string(fields[0])
+            logses._status = _unpack_string(fields[1])
+
+            for (attr, field) in (("_request_datetime", fields[2]),
+                                  ("_login_datetime", fields[3]),
+                                  ("_logout_datetime", fields[4])):
+                timestamp = _unpack_timestamp(field)
+
+                if timestamp is not None:
+                    timestamp = _datetime.datetime.fromtimestamp(timestamp)
+
+                setattr(logses, attr, timestamp)
+
+            # the keys are only loaded when they are used
+            logses._pubkey = fields[5]
+            logses._pubcert = fields[6]
+            logses._ipaddr = _unpack_string(fields[7])
+            logses._hostname = _unpack_string(fields[8])
+            logses._login_message = _unpack_string(fields[9])
+
+            return logses
+
+        except Exception as e:
+            raise LoginSessionError(
+                "Cannot load the LoginSession from "
+                "the object store? error = %s" % (str(e)))
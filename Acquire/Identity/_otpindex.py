@@ -0,0 +1,104 @@
+
+import datetime as _datetime
+import hashlib as _hashlib
+
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+from Acquire.Service import login_to_service_account as \
+                            _login_to_service_account
+
+__all__ = ["OTPIndex"]
+
+
+class OTPIndex:
+    """This class records which one-time-codes have been used by a user,
+       so that a code cannot be used to log in more than once. Each use
+       is recorded under a key for the time window in which it was used
+       (otps/<user>/<window>/<code hash>), and also under the next
+       window, so that checking whether a code has been used in the
+       last '_window' seconds needs only a single read. Old windows
+       are pruned, so the index does not grow over time
+    """
+    _window = 600
+
+    def __init__(self, sanitised_name=None):
+        """Construct the index for the user with the passed sanitised
+           username
+        """
+        self._name = sanitised_name
+
+    def __str__(self):
+        return "OTPIndex(user=%s)" % self._name
+
+    def _root(self):
+        """Return the root key for this index in the object store"""
+        return "otps/%s" % self._name
+
+    @staticmethod
+    def _get_window(timestamp=None):
+        """Return the window that contains the passed timestamp"""
+        if timestamp is None:
+            timestamp = _datetime.datetime.utcnow().timestamp()
+
+        return int(timestamp // OTPIndex._window)
+
+    def _key(self, window, code):
+        """Return the key for the use of 'code' in 'window'"""
+        code_hash = _hashlib.sha256(
+                        ("%s|%s" % (self._name, code)).encode("utf-8"))
+
+        return "%s/%d/%s" % (self._root(), window, code_hash.hexdigest())
+
+    def get_session(self, code, bucket=None):
+        """Return the UID of the login session that used 'code' within
+           the last '_window' seconds, or None if the code has not been
+           used
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        try:
+            return _ObjectStore.get_string_object(
+                        bucket, self._key(OTPIndex._get_window(), code))
+        except:
+            return None
+
+    def record(self, code, session_uid, bucket=None):
+        """Record that 'code' has been used to log into the login session
+           with UID 'session_uid'
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        window = OTPIndex._get_window()
+
+        for w in (window, window + 1):
+            _ObjectStore.set_string_object(bucket, self._key(w, code),
+                                           str(session_uid))
+
+    def prune(self, bucket=None):
+        """Remove all of the uses that are too old to be checked. This
+           also removes any records saved using the old layout
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        window = OTPIndex._get_window()
+
+        try:
+            names = _ObjectStore.get_all_object_names(bucket, self._root())
+        except:
+            return
+
+        for name in names:
+            try:
+                keep = int(name.split("/")[0]) >= window
+            except:
+                keep = False
+
+            if not keep:
+                try:
+                    _ObjectStore.delete_object(bucket,
+                                               "%s/%s" % (self._root(), name))
+                except:
+                    pass
@@ -0,0 +1,156 @@
+
+import base64 as _base64
+import struct as _struct
+
+from ._errors import IdentityServiceError
+
+__all__ = ["pack_record", "unpack_record", "is_record",
+           "pack_timestamp", "unpack_timestamp",
+           "pem_to_der", "der_to_pem", "pack_pem", "unpack_pem",
+           "pack_string", "unpack_string"]
+
+# A record starts with a 4-byte magic string that identifies the type of
+# record (which can never start a json document), followed by a
+# 1-byte format version and then the fields. Each field is a 4-byte
+# length followed by that many bytes. A null field has length _null
+_record_header = _struct.Struct(">4sB")
+_field_length = _struct.Struct(">I")
+_timestamp = _struct.Struct(">d")
+_null = 0xFFFFFFFF
+
+
+def is_record(data, magic):
+    """Return whether or not 'data' is a record with the passed magic"""
+    return isinstance(data, (bytes, bytearray, memoryview)) and \
+        bytes(data[0:4]) == magic
+
+
+def pack_record(magic, version, fields):
+    """Pack the passed list of fields (bytes or None) into a record
+       with the passed magic string and format version
+    """
+    parts = [_record_header.pack(magic, version)]
+
+    for field in fields:
+        if field is None:
+            parts.append(_field_length.pack(_null))
+        else:
+            parts.append(_field_length.pack(len(field)))
+            parts.append(bytes(field))
+
+    return b"".join(parts)
+
+
+def unpack_record(data, magic):
+    """Unpack the record in 'data', which must have the passed magic
+       string. This returns the tuple (version, fields)
+    """
+    data = memoryview(data)
+
+    if not is_record(data, magic):
+        raise IdentityServiceError("The data is not a %s record" % magic)
+
+    (_, version) = _record_header.unpack_from(data, 0)
+    offset = _record_header.size
+
+    fields = []
+
+    try:
+        while offset < len(data):
+            (length,) = _field_length.unpack_from(data, offset)
+            offset += _field_length.size
+
+            if length == _null:
+                fields.append(None)
+            else:
+                if offset + length > len(data):
+                    raise ValueError("truncated field")
+
+                fields.append(bytes(data[offset:offset + length]))
+                offset += length
+    except Exception as e:
+        raise IdentityServiceError("Corrupt %s record: %s" % (magic, str(e)))
+
+    return (version, fields)
+
+
+def pack_string(s):
+    """Return the passed string (or None) as a field"""
+    if s is None:
+        return None
+    else:
+        return str(s).encode("utf-8")
+
+
+def unpack_string(field):
+    """Return the string (or None) held in the passed field"""
+    if field is None:
+        return None
+    else:
+        return field.decode("utf-8")
+
+
+def pack_timestamp(dt):
+    """Return the passed datetime (or None) as a field"""
+    if dt is None:
+        return None
+    else:
+        return _timestamp.pack(dt.timestamp())
+
+
+def unpack_timestamp(field):
+    """Return the timestamp (or None) held in the passed field"""
+    if field is None:
+        return None
+    else:
+        return _timestamp.unpack(field)[0]
+
+
+def pem_to_der(pem):
+    """Return the DER bytes of the passed PEM encoded key. This only
+       removes the PEM armour, so does not need to load the key
+    """
+    lines = [line.strip() for line in bytes(pem).splitlines()]
+    lines = [line for line in lines
+             if len(line) > 0 and not line.startswith(b"-----")]
+
+    return _base64.b64decode(b"".join(lines))
+
+
+def der_to_pem(der, label="PUBLIC KEY"):
+    """Return the PEM encoding of the passed DER bytes of a key. This
+       only adds the PEM armour, so does not need to load the key
+    """
+    b64 = _base64.b64encode(der)
+    lines = [b"-----BEGIN %s-----" % label.encode("utf-8")]
+    lines += [b64[i:i + 64] for i in range(0, len(b64), 64)]
+    lines.append(b"-----END %s-----" % label.encode("utf-8"))
+
+    return b"\n".join(lines) + b"\n"
+
+
+def pack_pem(pem, label):
+    """Return the passed PEM encoded key (with PEM label 'label') as
+       a field holding the DER bytes. Anything that is not a PEM key
+       with this label is stored unchanged
+    """
+    if pem is None:
+        return None
+
+    pem = bytes(pem)
+
+    if pem.startswith(b"-----BEGIN %s-----" % label.encode("utf-8")):
+        return pem_to_der(pem)
+    else:
+        return pem
+
+
+def unpack_pem(field, label):
+    """Return the PEM encoded key held in the passed field"""
+    if field is None:
+        return None
+    elif field.startswith(b"-----"):
+        # this was not converted to DER
+        return field
+    else:
+        return der_to_pem(field, label)
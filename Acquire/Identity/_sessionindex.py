@@ -0,0 +1,288 @@
+
+import datetime as _datetime
+
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+from Acquire.Service import login_to_service_account as \
+                            _login_to_service_account
+
+from ._loginsession import LoginSession as _LoginSession
+
+__all__ = ["SessionIndex"]
+
+
+class SessionIndex:
+    """This class holds an index of the login sessions (and login
+       requests) of a user. Each session is recorded under a key that
+       holds the time at which the session expires
+       (session_index/<user>/<expiry>/<session uid>), so that the open
+       sessions can be counted, and the expired sessions found, by
+       listing the names of the keys, without having to load and parse
+       every session
+    """
+    # The maximum number of expired sessions removed in one call to prune
+    _max_prune = 20
+
+    # The maximum number of expired sessions removed at the same time
+    _max_workers = 8
+
+    def __init__(self, sanitised_name=None):
+        """Construct the index for the user with the passed sanitised
+           username
+        """
+        self._name = sanitised_name
+
+    def __str__(self):
+        return "SessionIndex(user=%s)" % self._name
+
+    def _root(self):
+        """Return the root key for this index in the object store"""
+        return "session_index/%s" % self._name
+
+    def _key(self, expires, session_uid):
+        """Return the key for the session 'session_uid' that expires
+           at the timestamp 'expires'
+        """
+        return "%s/%d/%s" % (self._root(), expires, session_uid)
+
+    def _migrated_key(self):
+        """Return the key used to record that the sessions saved before
+           this index existed have been added to the index
+        """
+        return "%s/migrated" % self._root()
+
+    @staticmethod
+    def _now():
+        """Return the current timestamp"""
+        return _datetime.datetime.utcnow().timestamp()
+
+    @staticmethod
+    def _get_expiry(login_session, timeout):
+        """Return the timestamp at which 'login_session' expires
+           if it can remain open for 'timeout' hours
+        """
+        return int(login_session.timestamp() + 3600.0 * timeout) + 1
+
+    @staticmethod
+    def _get_timeout(login_session, user_account):
+        """Return the number of hours that 'login_session' of
+           'user_account' can remain open
+        """
+        if login_session.is_approved() or login_session.is_suspicious():
+            return user_account.login_timeout()
+        else:
+            return user_account.login_request_timeout()
+
+    def _get_entries(self, bucket):
+        """Return the (expiry, session_uid) of all sessions in the index"""
+        try:
+            names = _ObjectStore.get_all_object_names(bucket, self._root())
+        except:
+            return []
+
+        entries = []
+
+        for name in names:
+            try:
+                (expires, session_uid) = name.split("/")
+                entries.append((int(expires), session_uid))
+            except:
+                # this is not a session in the index
+                pass
+
+        return entries
+
+    def add(self, login_session, timeout, bucket=None):
+        """Add 'login_session' to the index, recording that it will
+           expire 'timeout' hours after it was created
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        _ObjectStore.set_string_object(
+            bucket, self._key(SessionIndex._get_expiry(login_session,
+                                                       timeout),
+                              login_session.uuid()),
+            str(login_session.status()))
+
+    def update(self, login_session, timeout, bucket=None):
+        """Update the index for 'login_session', e.g. after it has been
+           approved, so that it now expires 'timeout' hours after it
+           was created
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        expires = SessionIndex._get_expiry(login_session, timeout)
+        session_uid = login_session.uuid()
+
+        self.add(login_session, timeout, bucket=bucket)
+
+        for (old_expires, uid) in self._get_entries(bucket):
+            if uid == session_uid and old_expires != expires:
+                try:
+                    _ObjectStore.delete_object(
+                        bucket, self._key(old_expires, uid))
+                except:
+                    pass
+
+    def remove(self, session_uid, bucket=None):
+        """Remove the session with UID 'session_uid' from the index"""
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        session_uid = str(session_uid)
+
+        for (expires, uid) in self._get_entries(bucket):
+            if uid == session_uid:
+                try:
+                    _ObjectStore.delete_object(bucket,
+                                               self._key(expires, uid))
+                except:
+                    pass
+
+    def count_open(self, bucket=None):
+        """Return the number of sessions and requests of this user that
+           have not yet expired. This only lists the names of the keys
+           in the index, so does not load any sessions
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        now = SessionIndex._now()
+
+        return len([e for e in self._get_entries(bucket) if e[0] >= now])
+
+    def is_migrated(self, bucket=None):
+        """Return whether or not the sessions saved before this index
+           existed have been added to the index
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        try:
+            _ObjectStore.get_string_object(bucket, self._migrated_key())
+            return True
+        except:
+            return False
+
+    def migrate(self, user_account, bucket=None):
+        """Add all of the sessions of 'user_account' that were saved
+           before this index existed to the index. This has to load
+           every session, so is only done once for each user
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        root = "sessions/%s" % self._name
+
+        try:
+            names = _ObjectStore.get_all_object_names(bucket, root)
+        except:
+            names = []
+
+        indexed = set([e[1] for e in self._get_entries(bucket)])
+
+        for name in names:
+            if name in indexed:
+                continue
+
+            try:
+                login_session = _LoginSession.from_bytes(
+                    _ObjectStore.get_object(
+                        bucket, "%s/%s" % (root, name)))
+                timeout = SessionIndex._get_timeout(login_session,
+                                                    user_account)
+                self.add(login_session, timeout, bucket=bucket)
+            except:
+                # this is corrupt - index it as already expired so
+                # that it is removed by the next prune
+                _ObjectStore.set_string_object(bucket, self._key(0, name),
+                                               "corrupt")
+
+        _ObjectStore.set_string_object(bucket, self._migrated_key(),
+                                       str(SessionIndex._now()))
+
+    def _expire(self, user_account, expires, session_uid, bucket, log):
+        """Expire the session 'session_uid' that was indexed as expiring
+           at 'expires'. Approved sessions are auto-logged out and
+           moved to expired_sessions
+        """
+        key = "sessions/%s/%s" % (self._name, session_uid)
+        request_keys = ["requests/%s/%s" % (session_uid[:8], self._name),
+                        "requests/%s/%s" % (session_uid[:8], session_uid)]
+
+        try:
+            login_session = _LoginSession.from_bytes(
+                                _ObjectStore.get_object(bucket, key))
+        except:
+            log.append("Session %s does not exist or is corrupt" % key)
+            login_session = None
+
+        if login_session is not None:
+            timeout = SessionIndex._get_timeout(login_session, user_account)
+
+            if SessionIndex._get_expiry(login_session, timeout) != expires:
+                # the session has changed since it was indexed (e.g. it
+                # has been approved) - re-index it rather than expire it
+                if SessionIndex._get_expiry(login_session, timeout) > \
+                        SessionIndex._now():
+                    self.update(login_session, timeout, bucket=bucket)
+                    return
+
+            if login_session.is_approved() or \
+                    login_session.is_suspicious():
+                # auto-logout expired sessions
+                log.append("Auto-logging out expired session '%s'" % key)
+                login_session.logout()
+                _ObjectStore.set_object(
+                    bucket, "expired_sessions/%s/%s" % (self._name,
+                                                        session_uid),
+                    login_session.to_bytes())
+
+        log.append("Deleting expired session '%s'" % key)
+
+        for k in [key, self._key(expires, session_uid)] + request_keys:
+            try:
+                _ObjectStore.delete_object(bucket, k)
+            except:
+                pass
+
+    def prune(self, user_account, bucket=None, max_prune=None, log=None):
+        """Remove up to 'max_prune' of the expired sessions and requests
+           of 'user_account', oldest first. Only the expired sessions are
+           loaded, and they are removed concurrently, so the cost of this
+           is bounded however many sessions the user has open. This
+           returns the number of sessions that were pruned
+        """
+        if bucket is None:
+            bucket = _login_to_service_account()
+
+        if max_prune is None:
+            max_prune = SessionIndex._max_prune
+
+        if log is None:
+            log = []
+
+        now = SessionIndex._now()
+
+        expired = sorted([e for e in self._get_entries(bucket)
+                          if e[0] < now])[0:max_prune]
+
+        if len(expired) == 0:
+            return 0
+
+        def _expire(entry):
+            self._expire(user_account, entry[0], entry[1], bucket, log)
+
+        if len(expired) > 1:
+            with _ThreadPoolExecutor(
+                    max_workers=min(len(expired),
+                                    SessionIndex._max_workers)) as pool:
+                list(pool.map(_expire, expired))
+        else:
+            _expire(expired[0])
+
+        return len(expired)
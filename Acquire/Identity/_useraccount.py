@@ -1,19 +1,85 @@
 
 import base64 as _base64
+import datetime as _datetime
+import hashlib as _hashlib
+import hmac as _hmac
+import json as _json
+import os as _os
+import threading as _threading
 import uuid as _uuid
 
+from cachetools import TTLCache as _TTLCache
+
 from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.Crypto import PublicKey as _PublicKey
+from Acquire.Crypto import SymmetricKey as _SymmetricKey
 from Acquire.Crypto import OTP as _OTP
 
 from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
 from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
 
 from Acquire.Service import get_service_info as _get_service_info
+from Acquire.Service import RateLimiter as _RateLimiter
+from Acquire.Service import MemoryRateStore as _MemoryRateStore
 
 from ._errors import UsernameError, ExistingAccountError, UserValidationError
 
+from ._records import pack_record as _pack_record
+from ._records import unpack_record as _unpack_record
+from ._records import is_record as _is_record
+from ._records import pack_string as _pack_string
+from ._records import unpack_string as _unpack_string
+from ._records import pack_pem as _pack_pem
+from ._records import unpack_pem as _unpack_pem
+
 __all__ = ["UserAccount"]
 
+# The decrypted OTP secrets of the accounts that have recently logged
+# in, keyed by sanitised username. Decrypting the private key with the
+# password (KDF plus RSA load) and then the OTP secret is the most
+# expensive part of a login, so we cache the result for five minutes.
+# The secret is held encrypted with a key derived from the password,
+# a random salt and the version of the account, so it can only be
+# read by someone who knows the password, and it is not used once
+# the account's keys have changed
+_otp_cache = _TTLCache(maxsize=1000, ttl=300)
+
+# The decrypted OTP secrets of remembered devices, keyed by
+# (sanitised username, hash of the device secret). These are held
+# in the same way as the account OTP secrets, but for an hour (the
+# lifetime of a session key), as remembered devices are used by
+# machines that log in again every few minutes
+_device_otp_cache = _TTLCache(maxsize=10000, ttl=3600)
+
+# The number of times the full (expensive) validation has failed for
+# each account from each source address. This is limited (to an
+# average of 10 a minute, with bursts of up to 10) to stop repeated
+# incorrect logins from using up the CPU of the service. Only failures
+# are counted, and only for the source that made them, so someone
+# else guessing passwords cannot lock the user out. A correct password
+# that is in the OTP cache is never checked against this limit
+_failed_validation_store = _MemoryRateStore(ttl=600)
+_failed_validations = _RateLimiter(rate=10.0 / 60.0, burst=10,
+                                   store=_failed_validation_store)
+
+_otp_cache_lock = _threading.Lock()
+
+# The magic string and version of the binary record of a UserAccount
+_record_magic = b"\x00AUA"
+_record_version = 1
+
+
+def _get_cache_key(password, salt, version, ttl=3600):
+    """Return the symmetric key used to encrypt the cached OTP secret"""
+    key = _hmac.new(salt, ("%s|%s" % (version, password)).encode("utf-8"),
+                    _hashlib.sha256).digest()
+
+    # the cache entry expires with the cache, so the key expiry
+    # only needs to be later than that
+    return _SymmetricKey(key=key, uid=version,
+                         expiry=_datetime.datetime.now() +
+                         _datetime.timedelta(seconds=ttl + 60))
+
 
 class UserAccount:
     """This class holds all information about a user's account,
@@ -23,6 +89,8 @@ class UserAccount:
        This data can be serialised to an from json to allow
        easy saving a retrieval from an object store
     """
+    __slots__ = ["_username", "_sanitised_username", "_privkey", "_pubkey",
+                 "_otp_secret", "_uuid", "_status"]
 
     def __init__(self, username=None):
         """Construct from the passed username"""
@@ -133,6 +201,9 @@ class UserAccount:
         self._pubkey = pubkey
         self._otp_secret = secret
 
+        # the password or OTP secret may have changed
+        UserAccount._clear_otp_cache(self._sanitised_username)
+
         if self._uuid is None:
             # generate the uuid now, as this should not happen until
             # the account has been first activated. After this point,
@@ -160,35 +231,163 @@ class UserAccount:
         return "_".join(username.split()).replace("/", "") \
                   .replace("@", "_AT_").replace(".", "_DOT_")
 
+    def _version(self):
+        """Return the version of the keys of this account. This changes
+           whenever the password or OTP secret are changed
+        """
+        h = _hashlib.sha256()
+
+        for part in (self._uuid, self._privkey, self._otp_secret):
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+
+            h.update(part or b"")
+            h.update(b"|")
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _clear_otp_cache(sanitised_name=None):
+        """Remove the cached OTP secrets of the passed account and its
+           devices (or of all accounts if 'sanitised_name' is None)
+        """
+        with _otp_cache_lock:
+            if sanitised_name is None:
+                _otp_cache.clear()
+                _device_otp_cache.clear()
+                _failed_validation_store.clear()
+            else:
+                _otp_cache.pop(sanitised_name, None)
+
+                for key in list(_device_otp_cache.keys()):
+                    if key[0] == sanitised_name:
+                        _device_otp_cache.pop(key, None)
+
+    def _get_otp_cache(self, device_secret=None):
+        """Return the cache, and the key in that cache, used for the
+           OTP of this account, or of the device with 'device_secret'
+        """
+        if device_secret is None:
+            return (_otp_cache, self._sanitised_username)
+        else:
+            if isinstance(device_secret, str):
+                device_secret = device_secret.encode("utf-8")
+
+            return (_device_otp_cache,
+                    (self._sanitised_username,
+                     _hashlib.sha256(device_secret).hexdigest()))
+
+    def _get_cached_otp(self, password, device_secret=None):
+        """Return the OTP of this account (or of the device with
+           'device_secret') from the cache, or None if it is not cached,
+           or if the password is wrong
+        """
+        (cache, key) = self._get_otp_cache(device_secret)
+
+        with _otp_cache_lock:
+            try:
+                (version, salt, secret) = cache[key]
+            except KeyError:
+                return None
+
+        if version != self._version():
+            return None
+
+        try:
+            return _OTP.decrypt(secret,
+                                _get_cache_key(password, salt, version,
+                                               cache.ttl))
+        except:
+            # the password is wrong
+            return None
+
+    def _set_cached_otp(self, password, otp, device_secret=None):
+        """Save the passed (decrypted) OTP of this account (or of the
+           device with 'device_secret') to the cache, encrypted with a
+           key derived from 'password'
+        """
+        (cache, key) = self._get_otp_cache(device_secret)
+
+        salt = _os.urandom(16)
+        version = self._version()
+        secret = otp.encrypt(_get_cache_key(password, salt, version,
+                                            cache.ttl))
+
+        with _otp_cache_lock:
+            cache[key] = (version, salt, secret)
+
+    def _failed_validation_key(self, source):
+        """Return the key used to count the failed full validations of
+           this account from 'source'. This is None if the source is
+           not known, in which case the failures are not limited
+        """
+        if source is None:
+            return None
+
+        return "%s|%s" % (self._sanitised_username, source)
+
+    def _check_full_validation_rate(self, source=None):
+        """Raise an exception if the full validation of this account
+           has failed too many times recently for calls from 'source'
+        """
+        key = self._failed_validation_key(source)
+
+        if _failed_validations.tokens(key) < 1:
+            raise UserValidationError(
+                "Too many failed attempts to validate the password of "
+                "this account. Please wait a minute and try again.")
+
     def validate_password(self, password, otpcode, remember_device=False,
-                          device_secret=None):
+                          device_secret=None, source=None):
         """Validate that the passed password and one-time-code are valid.
            If they are, then do nothing. Otherwise raise an exception.
            If 'remember_device' is true, then this returns the provisioning
-           uri needed to initialise the OTP code for this account
+           uri needed to initialise the OTP code for this account.
+           'source' is the address of the caller, which is used to
+           limit the number of failed attempts
         """
         if not self.is_active():
             raise UserValidationError(
                 "Cannot validate against an inactive account")
 
-        # see if we can decrypt the private key using the password
-        privkey = _PrivateKey.read_bytes(self._privkey, password)
+        if not device_secret:
+            device_secret = None
 
-        if device_secret:
-            # decrypt the passed device secret and check the supplied
-            # otpcode for that...
-            otp = _OTP.decrypt(_string_to_bytes(device_secret), privkey)
-            otp.verify(otpcode)
-        else:
-            # now decrypt the secret otp and validate the supplied otpcode
-            otp = _OTP.decrypt(self._otp_secret, privkey)
-            otp.verify(otpcode)
+        # use the recently decrypted OTP secret if the password
+        # is the same - this avoids decrypting the private key
+        otp = self._get_cached_otp(password, device_secret)
+
+        if otp is None:
+            self._check_full_validation_rate(source)
+
+            try:
+                # see if we can decrypt the private key using the password
+                privkey = _PrivateKey.read_bytes(self._privkey, password)
+
+                if device_secret:
+                    # decrypt the passed device secret and check the
+                    # supplied otpcode for that...
+                    otp = _OTP.decrypt(_string_to_bytes(device_secret),
+                                       privkey)
+                else:
+                    # now decrypt the secret otp
+                    otp = _OTP.decrypt(self._otp_secret, privkey)
+            except:
+                _failed_validations.allow(
+                    self._failed_validation_key(source))
+                raise
+
+            self._set_cached_otp(password, otp, device_secret)
+
+        # validate the supplied otpcode
+        otp.verify(otpcode)
 
         if remember_device:
             # create a new OTP that is unique for this device and return
             # this together with the provisioning code
             otp = _OTP()
-            otpsecret = _bytes_to_string(otp.encrypt(privkey.public_key()))
+            otpsecret = _bytes_to_string(
+                            otp.encrypt(_PublicKey.read_bytes(self._pubkey)))
             return (otpsecret, otp.provisioning_uri(self.username()))
 
     def to_data(self):
@@ -230,3 +429,46 @@ class UserAccount:
             user_account._otp_secret = None
 
         return user_account
+
+    def to_bytes(self):
+        """Return this account as a compact binary record. The keys
+           are stored in DER format
+        """
+        if self._username is None:
+            return None
+
+        return _pack_record(_record_magic, _record_version, [
+                    _pack_string(self._username),
+                    _pack_string(self._status),
+                    _pack_string(self._uuid),
+                    _pack_pem(self._privkey, "ENCRYPTED PRIVATE KEY"),
+                    _pack_pem(self._pubkey, "PUBLIC KEY"),
+                    self._otp_secret])
+
+    @staticmethod
+    def from_bytes(data):
+        """Return a UserAccount constructed from the passed bytes. These
+           can either be a binary record created by 'to_bytes', or the
+           json of the data created by 'to_data'
+        """
+        if data is None:
+            return None
+
+        if not _is_record(data, _record_magic):
+            return UserAccount.from_data(_json.loads(data))
+
+        (version, fields) = _unpack_record(data, _record_magic)
+
+        if version != _record_version:
+            raise UserValidationError(
+                "Unsupported version of a user account: %s" % version)
+
+        user_account = UserAccount(_unpack_string(fields[0]))
+        user_account._status = _unpack_string(fields[1])
+        user_account._uuid = _unpack_string(fields[2])
+        user_account._privkey = _unpack_pem(fields[3],
+                                            "ENCRYPTED PRIVATE KEY")
+        user_account._pubkey = _unpack_pem(fields[4], "PUBLIC KEY")
+        user_account._otp_secret = fields[5]
+
+        return user_account
@@ -7,27 +7,15 @@ module that is unlikely to be used by the user, but instead is used
 by most of the other modules.
 """
 
-from ._objstore import *
-from ._encoding import *
-from ._mutex import *
 from ._errors import *
 
-try:
-    if __IPYTHON__:
-        def _set_printer(C):
-            """Function to tell ipython to use __str__ if available"""
-            get_ipython().display_formatter.formatters['text/plain'].for_type(
-                C,
-                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
-                )
+# All other submodules are only imported when they are first used
+from Acquire._lazy import lazy_loader as _lazy_loader
 
-        import sys as _sys
-        import inspect as _inspect
-
-        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
-                                          _inspect.isclass)
-
-        for _clsmember in _clsmembers:
-            _set_printer(_clsmember[1])
-except:
-    pass
+(__getattr__, __dir__, _lazy_names) = _lazy_loader(__name__, {
+    "_objstore": ["ObjectStore", "set_object_store_backend",
+                  "use_testing_object_store_backend",
+                  "use_oci_object_store_backend"],
+    "_encoding": ["bytes_to_string", "string_to_bytes", "string_to_encoded",
+                  "encoded_to_string"],
+    "_mutex": ["Mutex"]})
@@ -46,6 +46,10 @@ class ObjectStore:
     def get_all_object_names(bucket, prefix=None):
         return _objstore_backend.get_all_object_names(bucket, prefix)
 
+    @staticmethod
+    def get_all_prefixes(bucket, prefix=None):
+        return _objstore_backend.get_all_prefixes(bucket, prefix)
+
     @staticmethod
     def get_all_objects(bucket, prefix=None):
         return _objstore_backend.get_all_objects(bucket, prefix)
@@ -94,6 +98,10 @@ class ObjectStore:
     def clear_all_except(bucket, keys):
         _objstore_backend.clear_all_except(bucket, keys)
 
+    @staticmethod
+    def wait_for_change(bucket, key, data, timeout=10):
+        return _objstore_backend.wait_for_change(bucket, key, data, timeout)
+
 
 def set_object_store_backend(backend):
     """Set the backend that is used to actually connect to
@@ -4,6 +4,7 @@ import datetime as _datetime
 import uuid as _uuid
 import json as _json
 import os as _os
+import time as _time
 
 from ._errors import ObjectStoreError
 
@@ -160,6 +161,35 @@ class OCI_ObjectStore:
 
         return names
 
+    @staticmethod
+    def get_all_prefixes(bucket, prefix=None):
+        """Returns the names of the prefixes (the next part of the key,
+           up to the next '/') of the objects directly under 'prefix',
+           without listing the objects themselves
+        """
+        if prefix:
+            prefix = "%s/" % prefix
+        else:
+            prefix = None
+
+        objects = bucket["client"].list_objects(bucket["namespace"],
+                                                bucket["bucket_name"],
+                                                prefix=prefix,
+                                                delimiter="/").data
+
+        names = []
+
+        for name in objects.prefixes:
+            if prefix:
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+                else:
+                    continue
+
+            names.append(name.rstrip("/"))
+
+        return names
+
     @staticmethod
     def get_all_objects(bucket, prefix=None):
         """Return all of the objects in the passed bucket"""
@@ -308,3 +338,56 @@ class OCI_ObjectStore:
                 bucket["client"].delete_object(bucket["namespace"],
                                                bucket["bucket_name"],
                                                name)
+
+    @staticmethod
+    def _get_etag(bucket, key):
+        """Return the etag of the object at 'key', or None if there
+           is no such object"""
+        try:
+            response = bucket["client"].head_object(bucket["namespace"],
+                                                    bucket["bucket_name"],
+                                                    key)
+            return response.headers["etag"]
+        except:
+            return None
+
+    @staticmethod
+    def wait_for_change(bucket, key, data, timeout):
+        """Block until the object at 'key' is no longer equal to 'data'
+           (which is None if there is no object), or until 'timeout'
+           seconds have passed. This returns the current value of the
+           object (or None if it does not exist). The OCI object store
+           cannot notify us when an object changes, so this polls the
+           etag of the object (which is much cheaper than reading it),
+           and only reads the object when the etag changes. Note that
+           this blocks the calling function for the whole of the
+           wait, so 'timeout' should be kept short
+        """
+        end_time = _time.monotonic() + timeout
+        delay = 0.1
+        etag = None
+        current = None
+        first = True
+
+        while True:
+            new_etag = OCI_ObjectStore._get_etag(bucket, key)
+
+            if first or new_etag != etag:
+                first = False
+                etag = new_etag
+
+                try:
+                    current = OCI_ObjectStore.get_object(bucket, key)
+                except:
+                    current = None
+
+                if current != data:
+                    return current
+
+            remaining = end_time - _time.monotonic()
+
+            if remaining <= 0:
+                return current
+
+            _time.sleep(min(delay, remaining))
+            delay = min(2 * delay, 1.0)
@@ -6,11 +6,16 @@ import uuid as _uuid
 import json as _json
 import glob as _glob
 import threading
+import time as _time
 
 from ._errors import ObjectStoreError
 
 _rlock = threading.RLock()
 
+# Notified whenever an object is changed, so that wait_for_change
+# can stand in for a watch on a key
+_changed = threading.Condition(_rlock)
+
 __all__ = ["Testing_ObjectStore"]
 
 
@@ -84,6 +89,25 @@ class Testing_ObjectStore:
 
         return object_names
 
+    @staticmethod
+    def get_all_prefixes(bucket, prefix=None):
+        """Returns the names of the prefixes (the next part of the key,
+           up to the next '/') of the objects directly under 'prefix',
+           without listing the objects themselves
+        """
+        if prefix:
+            root = "%s/%s" % (bucket, prefix)
+        else:
+            root = bucket
+
+        try:
+            names = _os.listdir(root)
+        except:
+            return []
+
+        return [name for name in names
+                if _os.path.isdir(_os.path.join(root, name))]
+
     @staticmethod
     def get_all_objects(bucket, prefix=None):
         """Return all of the objects in the passed bucket"""
@@ -136,6 +160,8 @@ class Testing_ObjectStore:
                     FILE.write(data)
                     FILE.flush()
 
+            _changed.notify_all()
+
     @staticmethod
     def set_object_from_file(bucket, key, filename):
         """Set the value of 'key' in 'bucket' to equal the contents
@@ -205,10 +231,36 @@ class Testing_ObjectStore:
     @staticmethod
     def delete_object(bucket, key):
         """Removes the object at 'key'"""
-        try:
-            _os.remove("%s/%s._data" % (bucket, key))
-        except:
-            pass
+        with _rlock:
+            try:
+                _os.remove("%s/%s._data" % (bucket, key))
+            except:
+                pass
+
+            _changed.notify_all()
+
+    @staticmethod
+    def wait_for_change(bucket, key, data, timeout):
+        """Block until the object at 'key' is no longer equal to 'data'
+           (which is None if there is no object), or until 'timeout'
+           seconds have passed. This returns the current value of the
+           object (or None if it does not exist)
+        """
+        end_time = _time.monotonic() + timeout
+
+        with _changed:
+            while True:
+                try:
+                    current = Testing_ObjectStore.get_object(bucket, key)
+                except:
+                    current = None
+
+                remaining = end_time - _time.monotonic()
+
+                if current != data or remaining <= 0:
+                    return current
+
+                _changed.wait(remaining)
 
     @staticmethod
     def clear_all_except(bucket, keys):
@@ -5,31 +5,36 @@ This module provides the base classes and functions used to define
 the services used in the system. It is not likely to be user-facing
 """
 
-from ._function import *
-from ._get_public_certs import *
-from ._get_services import *
-from ._login_to_objstore import *
-from ._service_account import *
-from ._service import *
-from ._profile import *
 from ._errors import *
 
-try:
-    if __IPYTHON__:
-        def _set_printer(C):
-            """Function to tell ipython to use __str__ if available"""
-            get_ipython().display_formatter.formatters['text/plain'].for_type(
-                C,
-                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
-                )
+# All other submodules are only imported when they are first used
+from Acquire._lazy import lazy_loader as _lazy_loader
 
-        import sys as _sys
-        import inspect as _inspect
-
-        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
-                                          _inspect.isclass)
-
-        for _clsmember in _clsmembers:
-            _set_printer(_clsmember[1])
-except:
-    pass
+(__getattr__, __dir__, _lazy_names) = _lazy_loader(__name__, {
+    "_function": ["call_function", "pack_arguments", "unpack_arguments",
+                  "create_return_value", "pack_return_value",
+                  "unpack_return_value"],
+    "_http_client": ["set_connection_timeouts", "get_connection_timeouts",
+                     "get_connection_stats", "reset_connection_stats",
+                     "close_connections"],
+    "_async_function": ["async_call_function", "gather_calls",
+                        "async_gather_calls"],
+    "_batch": ["run_batch", "call_batch_function"],
+    "_session_keys": ["register_session_key", "get_session_key",
+                      "get_client_session_key", "set_client_session_key",
+                      "clear_client_session_key"],
+    "_get_public_certs": ["get_public_certs"],
+    "_get_services": ["url_to_encoded", "get_trusted_service_info",
+                      "set_trusted_service_info",
+                      "remove_trusted_service_info",
+                      "get_remote_service_info"],
+    "_login_to_objstore": ["login_to_service_account"],
+    "_service_account": ["get_service_info", "get_service_private_key",
+                         "get_service_private_certificate",
+                         "get_service_public_key",
+                         "get_service_public_certificate"],
+    "_service": ["Service"],
+    "_profile": ["start_profile", "end_profile"],
+    "_warmup": ["warmup_service", "get_warmup_status"],
+    "_rate_limiter": ["RateLimiter", "MemoryRateStore",
+                      "ObjectStoreRateStore", "get_source_address"]})
@@ -0,0 +1,126 @@
+
+import asyncio as _asyncio
+import threading as _threading
+
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+from functools import partial as _partial
+
+from ._function import call_function as _call_function
+
+__all__ = ["async_call_function", "gather_calls", "async_gather_calls"]
+
+# The pool of threads used to make concurrent calls. Each thread keeps
+# its own open connections to the services, so reusing the same threads
+# means that concurrent calls also reuse connections
+_executor = None
+_executor_lock = _threading.Lock()
+
+# The maximum number of calls that will be made at the same time
+_max_concurrent_calls = 16
+
+
+def _get_executor():
+    """Return the thread pool used to make concurrent calls"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = _ThreadPoolExecutor(
+                            max_workers=_max_concurrent_calls,
+                            thread_name_prefix="acquire_call")
+
+        return _executor
+
+
+def _to_call(call):
+    """Convert the passed call into a function that takes no arguments.
+       The call can be a dictionary of the keyword arguments to pass
+       to call_function, or a function that takes no arguments
+    """
+    if isinstance(call, dict):
+        return _partial(_call_function, **call)
+    elif callable(call):
+        return call
+    else:
+        raise TypeError("Each call must be a dictionary of the arguments "
+                        "to call_function, or a function, not '%s'" %
+                        str(call))
+
+
+async def async_call_function(service_url, function=None, args_key=None,
+                              response_key=None, public_cert=None, args=None,
+                              **kwargs):
+    """Asynchronous version of call_function. This takes the same arguments,
+       and makes the call in a worker thread so that the event loop is not
+       blocked while waiting for the response
+    """
+    loop = _asyncio.get_event_loop()
+
+    return await loop.run_in_executor(
+                    _get_executor(),
+                    _partial(_call_function, service_url, function=function,
+                             args_key=args_key, response_key=response_key,
+                             public_cert=public_cert, args=args, **kwargs))
+
+
+async def async_gather_calls(calls, return_exceptions=False):
+    """Asynchronous version of gather_calls"""
+    loop = _asyncio.get_event_loop()
+    executor = _get_executor()
+
+    return await _asyncio.gather(
+                    *[loop.run_in_executor(executor, _to_call(call))
+                      for call in calls],
+                    return_exceptions=return_exceptions)
+
+
+def gather_calls(calls, return_exceptions=False):
+    """Make all of the passed calls concurrently, returning the list of
+       results in the same order as 'calls'. Each call is either a
+       dictionary of the keyword arguments to pass to call_function
+       (e.g. {"service_url": url, "function": "whois", "args": args})
+       or a function that takes no arguments. If any call raises an
+       exception then the first such exception is raised, unless
+       'return_exceptions' is True, in which case the exception
+       is returned in place of the result.
+
+       This is safe to call from within a running event loop, as it
+       waits on the worker threads rather than on the loop
+    """
+    calls = [_to_call(call) for call in calls]
+
+    results = []
+    error = None
+
+    if len(calls) < 2 or _threading.current_thread().name.startswith(
+                                                            "acquire_call"):
+        # make the calls in this thread if there is nothing to overlap,
+        # or if this is already a worker thread (waiting on the pool
+        # from inside the pool could deadlock)
+        for call in calls:
+            try:
+                results.append(call())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+
+                results.append(e)
+
+        return results
+
+    executor = _get_executor()
+    futures = [executor.submit(call) for call in calls]
+
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if error is None:
+                error = e
+
+            results.append(e)
+
+    if error is not None and not return_exceptions:
+        raise error
+
+    return results
@@ -0,0 +1,174 @@
+
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+from ._function import call_function as _call_function
+from ._function import create_return_value as _create_return_value
+
+from ._errors import RemoteFunctionCallError, BatchNotSupportedError
+
+__all__ = ["run_batch", "call_batch_function"]
+
+# The maximum number of calls that can be made in a single batch
+_max_batch_size = 100
+
+# The maximum number of calls in a batch that are run at the same time
+_max_batch_workers = 8
+
+
+def _run_call(route_function, call):
+    """Run a single call from a batch using 'route_function', returning
+       the result. Errors are returned as the result of the call, in the
+       same way as they would be for a normal call
+    """
+    try:
+        function = call["function"]
+    except:
+        function = None
+
+    if function is not None:
+        function = str(function)
+
+    try:
+        args = call["args"]
+    except:
+        args = None
+
+    if args is None:
+        args = {}
+
+    if function == "batch":
+        return {"status": -1,
+                "message": "You cannot call 'batch' from within a batch"}
+
+    try:
+        args["function"] = function
+        return route_function(function, args)
+    except Exception as e:
+        return {"status": -1,
+                "message": "Error %s: %s" % (e.__class__, str(e))}
+
+
+def run_batch(args, route_function):
+    """Run the batch of calls held in 'args', using 'route_function' to
+       route each call to the function that implements it. The
+       calls are held as a list of {"function": name, "args": args}
+       dictionaries in args["calls"]. These are run in order, unless
+       args["concurrent"] is True, in which case they are run at the
+       same time. The results are returned, in the same order as the
+       calls, as a list in the "results" key of the return value.
+       Each call returns its own status, so one failed call does not
+       fail the whole batch
+    """
+    try:
+        calls = args["calls"]
+    except:
+        calls = None
+
+    if calls is None:
+        calls = []
+
+    if not isinstance(calls, list):
+        raise TypeError("The calls in a batch must be passed as a list")
+
+    if len(calls) > _max_batch_size:
+        raise ValueError("You cannot make more than %d calls in a "
+                         "batch (requested %d)" %
+                         (_max_batch_size, len(calls)))
+
+    try:
+        concurrent = bool(args["concurrent"])
+    except:
+        concurrent = False
+
+    if concurrent and len(calls) > 1:
+        with _ThreadPoolExecutor(
+                max_workers=min(len(calls), _max_batch_workers)) as pool:
+            results = list(pool.map(lambda call: _run_call(route_function,
+                                                           call), calls))
+    else:
+        results = [_run_call(route_function, call) for call in calls]
+
+    return_value = _create_return_value(0, "Success")
+    return_value["results"] = results
+
+    return return_value
+
+
+def call_batch_function(service_url, calls, args_key=None, response_key=None,
+                        public_cert=None, concurrent=False,
+                        return_exceptions=False, use_session_key=False):
+    """Call the batch of remote functions in 'calls' at 'service_url'
+       using a single call (so only a single encrypted envelope is sent
+       and returned). Each call is either a {"function": name, "args": args}
+       dictionary, or a (function, args) tuple. The keys (and
+       'use_session_key') are used as for call_function. If 'concurrent'
+       is True then the service is allowed to run the calls at the
+       same time, rather than in order.
+
+       This returns the list of results in the same order as 'calls'. If
+       any call failed then a RemoteFunctionCallError is raised for the
+       first failure, unless 'return_exceptions' is True, in which case
+       the error is returned in place of the result. A
+       BatchNotSupportedError is raised if the service is too old to
+       run batches of calls
+    """
+    batch = []
+
+    for call in calls:
+        if isinstance(call, dict):
+            function = call.get("function", None)
+            args = call.get("args", None)
+        else:
+            (function, args) = call
+
+        if args is None:
+            args = {}
+
+        batch.append({"function": function, "args": args})
+
+    response = _call_function(service_url, "batch", args_key=args_key,
+                              response_key=response_key,
+                              public_cert=public_cert,
+                              use_session_key=use_session_key,
+                              args={"calls": batch,
+                                    "concurrent": bool(concurrent)})
+
+    if response.get("status", 0) != 0 and \
+            str(response.get("message", "")).startswith("Unknown function"):
+        raise BatchNotSupportedError(
+            "The service at '%s' cannot run batches of calls: %s" %
+            (service_url, response["message"]))
+
+    try:
+        results = response["results"]
+    except:
+        raise RemoteFunctionCallError(
+            "The service at '%s' did not return the results of the "
+            "batch of calls: %s" % (service_url, str(response)))
+
+    if len(results) != len(batch):
+        raise RemoteFunctionCallError(
+            "The service at '%s' returned %d results for a batch of %d "
+            "calls" % (service_url, len(results), len(batch)))
+
+    for (i, result) in enumerate(results):
+        status = None
+
+        try:
+            status = result["status"]
+        except:
+            pass
+
+        if status is not None and status != 0:
+            error = RemoteFunctionCallError(
+                "Error calling '%s' at '%s'. Server returned "
+                "error code '%d' with message '%s'" %
+                (batch[i]["function"], service_url, status,
+                 result.get("message", None)))
+
+            if return_exceptions:
+                results[i] = error
+            else:
+                raise error
+
+    return results
@@ -1,7 +1,8 @@
 
 __all__ = [ "AccountError", "PackingError", "UnpackingError", 
             "RemoteFunctionCallError", "ServiceError", "ServiceAccountError",
-            "MissingServiceAccountError" ]
+            "MissingServiceAccountError", "RateLimitError",
+            "BatchNotSupportedError" ]
 
 class AccountError(Exception):
     pass
@@ -23,3 +24,9 @@ class ServiceAccountError(Exception):
 
 class MissingServiceAccountError(Exception):
     pass
+
+class RateLimitError(Exception):
+    pass
+
+class BatchNotSupportedError(RemoteFunctionCallError):
+    pass
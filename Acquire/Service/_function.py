@@ -1,17 +1,58 @@
 
 import json as _json
+import struct as _struct
+import threading as _threading
+import uuid as _uuid
 
-from io import BytesIO as _BytesIO
+from cachetools import TTLCache as _TTLCache
 
 from Acquire.Crypto import PublicKey as _PublicKey
+from Acquire.Crypto import SymmetricKey as _SymmetricKey
 from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
 from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
 
+from ._http_client import _http_post
+
 from ._errors import PackingError, UnpackingError, RemoteFunctionCallError
 
 __all__ = ["call_function", "pack_arguments", "unpack_arguments",
            "create_return_value", "pack_return_value", "unpack_return_value"]
 
+# Arguments and return values can be packed either as json (the default,
+# understood by all services) or into a binary envelope. The binary
+# envelope holds the ciphertext and signature as raw bytes, so avoids
+# base64-encoding them and then json-encoding the result. It starts
+# with '_binary_magic', which can never start a json document, followed
+# by the version and flags, and then the length-prefixed session key
+# UID, signature and data
+_binary_magic = b"\x00AQB"
+_binary_version = 1
+_binary_header = _struct.Struct(">4sBB")
+_binary_length = _struct.Struct(">I")
+
+_binary_encrypted = 0x01
+_binary_signed = 0x02
+
+# The services that have replied that they cannot unpack binary
+# envelopes, so must be called using json. This reply is not signed,
+# so the services are only remembered for an hour, after which binary
+# envelopes are tried again
+_json_only_services = _TTLCache(maxsize=1000, ttl=3600)
+_json_only_lock = _threading.Lock()
+
+# The messages with which services that are too old to understand
+# binary envelopes reply. These fail to decode the envelope as json,
+# and then fail again when reporting the error (the message depends
+# on the version of python), or (if newer) report the decode error
+_old_service_messages = [
+    "Cannot unpack arguments: local variable 'data' referenced "
+    "before assignment",
+    "Cannot unpack arguments: cannot access local variable 'data' "
+    "where it is not associated with a value"]
+
+_old_service_prefix = "Cannot unpack arguments: Cannot decode json " \
+                      "from '%s" % repr(_binary_magic)[0:-1]
+
 
 def _get_signing_certificate():
     """Return the signing certificate for this service"""
@@ -24,13 +65,25 @@ def _get_key(key):
     """The user may pass the key in multiple ways. It could just be
        a key. Or it could be a function that gets the key on demand.
        Or it could be a dictionary that has the key stored under
-       "encryption_public_key"
+       "encryption_public_key", or the UID of a registered session
+       key stored under "session_key_uid"
     """
     if key is None:
         return None
-    elif isinstance(key, _PublicKey):
+    elif isinstance(key, _PublicKey) or isinstance(key, _SymmetricKey):
         return key
     elif isinstance(key, dict):
+        if "session_key_uid" in key:
+            from ._session_keys import get_session_key as _get_session_key
+            session_key = _get_session_key(key["session_key_uid"])
+
+            if session_key is None:
+                raise PackingError(
+                    "The session key '%s' has expired or is unknown" %
+                    key["session_key_uid"])
+
+            return session_key
+
         try:
             key = key["encryption_public_key"]
         except:
@@ -80,7 +133,79 @@ def create_return_value(status, message, log=None, error=None):
     return return_value
 
 
-def pack_return_value(result, key=None, response_key=None, public_cert=None):
+def _pack_binary(data, flags=0, signature=None, session_key_uid=None):
+    """Internal function used to pack the passed (bytes) data, signature
+       and session key UID into a binary envelope
+    """
+    if signature is None:
+        signature = b""
+
+    if session_key_uid is None:
+        session_key_uid = b""
+    else:
+        session_key_uid = session_key_uid.encode("utf-8")
+
+    parts = [_binary_header.pack(_binary_magic, _binary_version, flags)]
+
+    for part in (session_key_uid, signature, data):
+        parts.append(_binary_length.pack(len(part)))
+        parts.append(part)
+
+    return b"".join(parts)
+
+
+def _is_binary(data):
+    """Return whether or not the passed data is a binary envelope"""
+    return isinstance(data, (bytes, bytearray, memoryview)) and \
+        bytes(data[0:4]) == _binary_magic
+
+
+def _unpack_binary(data):
+    """Internal function used to unpack the binary envelope in 'data',
+       returning the tuple (flags, session_key_uid, signature, data)
+    """
+    data = memoryview(data)
+
+    try:
+        (_magic, version, flags) = _binary_header.unpack_from(data, 0)
+        offset = _binary_header.size
+
+        parts = []
+
+        for i in range(0, 3):
+            (length,) = _binary_length.unpack_from(data, offset)
+            offset += _binary_length.size
+
+            if offset + length > len(data):
+                raise ValueError("The envelope is truncated")
+
+            parts.append(data[offset:offset+length])
+            offset += length
+    except Exception as e:
+        raise UnpackingError("Cannot unpack the binary envelope: %s" %
+                             str(e))
+
+    if version != _binary_version:
+        raise UnpackingError("Cannot unpack a version %d binary envelope"
+                             % version)
+
+    (session_key_uid, signature, data) = parts
+
+    if len(session_key_uid) == 0:
+        session_key_uid = None
+    else:
+        session_key_uid = bytes(session_key_uid).decode("utf-8")
+
+    if len(signature) == 0:
+        signature = None
+    else:
+        signature = bytes(signature)
+
+    return (flags, session_key_uid, signature, bytes(data))
+
+
+def pack_return_value(result, key=None, response_key=None, public_cert=None,
+                      binary=False):
     """Pack the passed result into a json string, optionally
        encrypting the result with the passed key, and optionally
        supplying a public response key, with which the function
@@ -88,6 +213,10 @@ def pack_return_value(result, key=None, response_key=None, public_cert=None):
        provided then we will ask the service to sign their response.
        Note that you can only ask the service to sign their response
        if you provide a 'reponse_key' for them to encrypt it with too
+
+       If 'binary' is True (or 'key' is the arguments of a call that
+       were sent in a binary envelope) then the result is packed into
+       a binary envelope rather than a json string
     """
 
     try:
@@ -95,6 +224,18 @@ def pack_return_value(result, key=None, response_key=None, public_cert=None):
     except:
         sign_result = False
 
+    try:
+        binary = binary or bool(key["binary_envelope"])
+    except:
+        pass
+
+    try:
+        # a reply encrypted using a session key is bound to the
+        # request that it answers
+        request_id = key["session_key_request"]
+    except:
+        request_id = None
+
     key = _get_key(key)
     response_key = _get_key(response_key)
 
@@ -113,25 +254,62 @@ def pack_return_value(result, key=None, response_key=None, public_cert=None):
     result = _json.dumps(result).encode("utf-8")
 
     if key:
-        response = {}
+        if isinstance(key, _SymmetricKey):
+            result_data = key.encrypt(result, request_id)
+        else:
+            result_data = key.encrypt(result)
 
-        result_data = key.encrypt(result)
+        signature = None
+        session_key_uid = None
 
-        if sign_result:
+        if isinstance(key, _SymmetricKey):
+            # only the client and this service know the session key, so
+            # the encryption itself authenticates the message
+            session_key_uid = key.uid()
+
+        elif sign_result:
             # sign using the signing certificate for this service
             signature = _get_signing_certificate().sign(result_data)
+
+        if binary:
+            flags = _binary_encrypted
+
+            if signature is not None:
+                flags |= _binary_signed
+
+            return _pack_binary(result_data, flags, signature,
+                                session_key_uid)
+
+        response = {}
+
+        if session_key_uid is not None:
+            response["session_key_uid"] = session_key_uid
+
+        if signature is not None:
             response["signature"] = _bytes_to_string(signature)
 
         response["data"] = _bytes_to_string(result_data)
         response["encrypted"] = True
         result = _json.dumps(response).encode("utf-8")
 
+    elif binary:
+        result = _pack_binary(result)
+
     return result
 
 
-def pack_arguments(args, key=None, response_key=None, public_cert=None):
+def pack_arguments(args, key=None, response_key=None, public_cert=None,
+                   binary=False):
     """Pack the passed arguments, optionally encrypted using the passed key"""
-    return pack_return_value(args, key, response_key, public_cert)
+    return pack_return_value(args, key, response_key, public_cert, binary)
+
+
+# The keys that only have meaning in arguments that were encrypted. These
+# are removed from arguments that were not encrypted, so that they cannot
+# be used to make the service encrypt its reply using someone else's
+# session key
+_encrypted_only_keys = ["session_key_uid", "session_key_request",
+                        "binary_envelope"]
 
 
 def unpack_arguments(args, key=None, public_cert=None):
@@ -139,17 +317,55 @@ def unpack_arguments(args, key=None, public_cert=None):
        as a json string, packed using pack_arguments. This will always
        return a dictionary. If there are no arguments, then an empty
        dictionary will be returned. If 'public_cert' is supplied then
-       a signature of the result will be verified using 'public_cert'
+       a signature of the result will be verified using 'public_cert'.
+
+       The arguments can also be a binary envelope, in which case
+       the "binary_envelope" key of the result is set, so that the
+       reply is packed into a binary envelope too
+    """
+    return _unpack(args, key, public_cert)
+
+
+def _unpack(args, key=None, public_cert=None, request_id=None,
+            decrypted=False):
+    """Internal function that implements unpack_arguments. 'request_id'
+       is the ID of the request that a reply encrypted using a session
+       key must answer. 'decrypted' is True if 'args' have just
+       been decrypted, so can be trusted to say how the reply
+       should be encrypted
     """
     if not (args and len(args) > 0):
         return {}
 
+    if _is_binary(args):
+        (flags, session_key_uid, signature, data) = _unpack_binary(args)
+
+        if not (flags & _binary_encrypted):
+            if public_cert:
+                raise UnpackingError(
+                    "Cannot unpack the result as it should be "
+                    "signed, but it isn't! (only encrypted results "
+                    "are signed)")
+
+            result = _unpack(data)
+        else:
+            if public_cert and signature is None:
+                raise UnpackingError(
+                    "We requested that the data was signed "
+                    "but a signature was not provided!")
+
+            result = _unpack_encrypted(data, session_key_uid, signature,
+                                       key, public_cert, request_id)
+
+        result["binary_envelope"] = True
+        return result
+
     # args should be a json-encoded utf-8 string
     try:
         data = _json.loads(args)
     except Exception as e:
         raise UnpackingError("Cannot decode json from '%s' : %s" %
-                             (data, str(e)))
+                             (args, str(e)))
 
     while not isinstance(data, dict):
         if not (data and len(data) > 0):
@@ -176,6 +392,8 @@ def unpack_arguments(args, key=None, public_cert=None):
 
         is_encrypted = False
 
+    signature = None
+
     if public_cert:
         try:
             signature = _string_to_bytes(data["signature"])
@@ -185,31 +403,113 @@ def unpack_arguments(args, key=None, public_cert=None):
                 "but a signature was not provided!")
 
     if is_encrypted:
-        encrypted_data = _string_to_bytes(data["data"])
-
-        if public_cert:
-            try:
-                public_cert.verify(signature, encrypted_data)
-            except Exception as e:
-                raise UnpackingError(
-                    "The signature of the returned data "
-                    "is incorrect and does not match what we "
-                    "know! %s" % str(e))
+        try:
+            session_key_uid = data["session_key_uid"]
+        except:
+            session_key_uid = None
 
-        decrypted_data = _get_key(key).decrypt(encrypted_data)
-        return unpack_arguments(decrypted_data.decode("utf-8"))
+        return _unpack_encrypted(_string_to_bytes(data["data"]),
+                                 session_key_uid, signature, key,
+                                 public_cert, request_id)
     else:
+        if not decrypted:
+            for k in _encrypted_only_keys:
+                data.pop(k, None)
+
         return data
 
 
-def unpack_return_value(return_value, key=None, public_cert=None):
+def _unpack_encrypted(encrypted_data, session_key_uid, signature, key=None,
+                      public_cert=None, request_id=None):
+    """Internal function used to verify, decrypt and unpack the passed
+       encrypted data, using either the session key with UID
+       'session_key_uid' or the private key 'key'
+    """
+    if session_key_uid is not None:
+        return _unpack_with_session_key(encrypted_data, session_key_uid,
+                                        key, request_id)
+
+    if public_cert:
+        try:
+            public_cert.verify(signature, encrypted_data)
+        except Exception as e:
+            raise UnpackingError(
+                "The signature of the returned data "
+                "is incorrect and does not match what we "
+                "know! %s" % str(e))
+
+    decrypted_data = _get_key(key).decrypt(encrypted_data)
+    result = _unpack(decrypted_data)
+
+    # only messages encrypted with a session key may say that
+    # the reply should use a session key
+
+    if "session_key" in result:
+        # the caller wants to negotiate a session key. This is bound
+        # to the public key that the caller sent for the response
+        from ._session_keys import register_session_key \
+            as _register_session_key
+        _register_session_key(
+            _SymmetricKey.from_data(result.pop("session_key")),
+            result.get("encryption_public_key", None))
+
+    return result
+
+
+def _unpack_with_session_key(encrypted_data, session_key_uid, key=None,
+                             request_id=None):
+    """Internal function used to decrypt and unpack data that was
+       encrypted with the session key with UID 'session_key_uid'. The
+       session key is either passed as 'key' (by the client) or is
+       found from the keys registered with this service. A reply
+       must have been encrypted for the request with ID 'request_id'
+    """
+    key = _get_key(key)
+
+    if not (isinstance(key, _SymmetricKey) and key.uid() == session_key_uid):
+        from ._session_keys import get_session_key as _get_session_key
+        key = _get_session_key(session_key_uid)
+
+        if key is None:
+            raise UnpackingError("Unknown session key '%s'" % session_key_uid)
+
+    decrypted_data = key.decrypt(encrypted_data, request_id)
+    result = _unpack(decrypted_data, decrypted=True)
+    result.pop("binary_envelope", None)
+
+    # record the session key so that the reply is encrypted using it
+    result["session_key_uid"] = session_key_uid
+
+    return result
+
+
+def _cannot_unpack_binary(result):
+    """Return whether or not 'result' is the reply of a service that
+       is too old to unpack the arguments sent to it in a binary
+       envelope. Only the exact errors of these services count, so
+       that no other failure can turn off binary envelopes
+    """
+    if result.get("status", 0) == 0:
+        return False
+
+    message = str(result.get("message", ""))
+
+    return message in _old_service_messages or \
+        message.startswith(_old_service_prefix)
+
+
+def unpack_return_value(return_value, key=None, public_cert=None,
+                        request_id=None):
     """Call this to unpack the passed arguments that have been encoded
-       as a json string, packed using pack_arguments"""
-    return unpack_arguments(return_value, key, public_cert)
+       as a json string, packed using pack_arguments. If the return
+       value was encrypted using a session key then it must answer
+       the request with ID 'request_id'"""
+    return _unpack(return_value, key, public_cert, request_id)
 
 
 def call_function(service_url, function=None, args_key=None, response_key=None,
-                  public_cert=None, args=None, **kwargs):
+                  public_cert=None, args=None, use_session_key=False,
+                  binary=False, **kwargs):
     """Call the remote function called 'function' at 'service_url' passing
        in named function arguments in 'kwargs'. If 'args_key' is supplied,
        then encrypt the arguments using 'args'. If 'response_key'
@@ -219,6 +519,19 @@ def call_function(service_url, function=None, args_key=None, response_key=None,
        we will ask the service to sign their response using their
        service signing certificate, and we will validate the
        signature using 'public_cert'
+
+       If 'use_session_key' is True (and 'args_key' is supplied) then
+       a symmetric session key is negotiated with the service as part
+       of this call (sent encrypted using 'args_key'). Later calls to
+       the same service then encrypt both the arguments and the
+       response using this session key, so need no asymmetric
+       encryption, decryption or signing
+
+       If 'binary' is True then the arguments (and so the response)
+       are packed into a binary envelope rather than json. This is
+       smaller and quicker to pack for large arguments. Services that
+       cannot unpack binary envelopes are remembered, and are called
+       using json instead
     """
     try:
         import pycurl as _pycurl
@@ -232,6 +545,9 @@ def call_function(service_url, function=None, args_key=None, response_key=None,
 
     if args is None:
         args = {}
+    else:
+        # never add keys (e.g. the session key) to the caller's arguments
+        args = dict(args)
 
     if function is not None:
         args["function"] = function
@@ -239,25 +555,46 @@ def call_function(service_url, function=None, args_key=None, response_key=None,
     for key, value in kwargs.items():
         args[key] = value
 
-    if response_key:
+    if binary:
+        with _json_only_lock:
+            binary = service_url not in _json_only_services
+
+    session_key = None
+    new_session_key = None
+    # the arguments to use if this call has to be made again
+    original_args = dict(args)
+    request_id = None
+
+    if use_session_key and args_key is not None and \
+            response_key is not None:
+        from ._session_keys import get_client_session_key \
+            as _get_client_session_key
+
+        session_key = _get_client_session_key(service_url)
+
+        if session_key is None:
+            # negotiate a new session key as part of this call
+            new_session_key = _SymmetricKey()
+            args["session_key"] = new_session_key.to_data()
+
+    if session_key:
+        # the reply must be encrypted for this request, so that it
+        # cannot be swapped with the reply to another request
+        request_id = str(_uuid.uuid4())
+        args["session_key_request"] = request_id
+        args_json = pack_arguments(args, session_key, binary=binary)
+    elif response_key:
         args_json = pack_arguments(args, args_key, response_key.public_key(),
-                                   public_cert=public_cert)
+                                   public_cert=public_cert, binary=binary)
     else:
-        args_json = pack_arguments(args, args_key)
-
-    buffer = _BytesIO()
-    c = _pycurl.Curl()
-    c.setopt(c.URL, service_url)
-    c.setopt(c.WRITEDATA, buffer)
-    c.setopt(c.POSTFIELDS, args_json)
+        args_json = pack_arguments(args, args_key, binary=binary)
 
     args = None
-    args_json = None
-    args_key = None
 
     try:
-        c.perform()
-        c.close()
+        # this reuses this thread's connection to the service if it is open
+        result = _http_post(service_url, args_json)
+        args_json = None
     except _pycurl.error as e:
         raise RemoteFunctionCallError(
             "Cannot call remote function '%s' at  '%s' because of a possible "
@@ -268,15 +605,54 @@ def call_function(service_url, function=None, args_key=None, response_key=None,
             "Cannot call remote function '%s' at '%s' because of a possible "
             "nework issue: %s" % (function, service_url, str(e)))
 
-    result = buffer.getvalue().decode("utf-8")
-
-    # Now unpack the results
+    # Now unpack the results (this detects if they are in a binary
+    # envelope or are json)
     try:
-        result = unpack_return_value(result, response_key, public_cert)
+        if session_key:
+            result = unpack_return_value(result, session_key,
+                                         request_id=request_id)
+
+            # only a reply encrypted using the session key comes from
+            # the service - anything else is only trusted enough to
+            # decide whether to call again without the session key
+            session_key_reply = (result.pop("session_key_uid", None) ==
+                                 session_key.uid())
+        else:
+            result = unpack_return_value(result, response_key, public_cert)
     except Exception as e:
         raise RemoteFunctionCallError(
             "Error calling '%s' at '%s': %s" % (function, service_url, str(e)))
 
+    if binary and _cannot_unpack_binary(result):
+        # this service is too old to understand binary envelopes. The
+        # function was not called, so call again using json
+        with _json_only_lock:
+            _json_only_services[service_url] = True
+
+        return call_function(service_url, args_key=args_key,
+                             response_key=response_key,
+                             public_cert=public_cert, args=original_args,
+                             use_session_key=use_session_key)
+
+    if session_key and result.get("status", 0) != 0 and \
+            str(result.get("message", "")).startswith(
+                                            "Cannot unpack arguments"):
+        # the service no longer knows the session key (or cannot use
+        # session keys). The function was not called, so it is safe
+        # to forget the key and call again using asymmetric encryption
+        from ._session_keys import clear_client_session_key \
+            as _clear_client_session_key
+        _clear_client_session_key(service_url)
+
+        return call_function(service_url, args_key=args_key,
+                             response_key=response_key,
+                             public_cert=public_cert, args=original_args)
+
+    if session_key and not session_key_reply:
+        raise RemoteFunctionCallError(
+            "Error calling '%s' at '%s': the reply was not encrypted "
+            "using the session key" % (function, service_url))
+
     if len(result) == 1 and "error" in result:
         raise RemoteFunctionCallError(
             "Error calling '%s' at '%s': '%s'" % (function, service_url,
@@ -288,4 +664,10 @@ def call_function(service_url, function=None, args_key=None, response_key=None,
                 "error code '%d' with message '%s'" %
                 (function, service_url, result["status"], result["message"]))
 
+    if new_session_key:
+        # the service has accepted the call, so has registered the key
+        from ._session_keys import set_client_session_key \
+            as _set_client_session_key
+        _set_client_session_key(service_url, new_session_key)
+
     return result
@@ -1,11 +1,18 @@
 
 import base64 as _base64
+import json as _json
+import os as _os
+import tempfile as _tempfile
+import threading as _threading
+import uuid as _uuid
 
 from cachetools import cached as _cached
 from cachetools import TTLCache as _TTLCache
 
 from Acquire.ObjectStore import ObjectStore as _ObjectStore
-from Acquire.Crypto import PrivateKey as _PrivateKey
+from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
+from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
+from Acquire.Crypto import get_private_key as _get_private_key
 
 from ._service import Service as _Service
 from ._function import call_function as _call_function
@@ -20,6 +27,30 @@ from ._errors import ServiceError, ServiceAccountError
 # cause problems for a maximum of 300 seconds)
 _cache = _TTLCache(maxsize=50, ttl=300)
 
+# The trusted services are held as a single (signed) blob in the object
+# store, which is also copied to a local file so that new processes in
+# the same container don't need to fetch it. The blob is tagged with the
+# version held in the object store, which is changed whenever a trusted
+# service is added or removed. The version is re-read at most every 60
+# seconds, so other instances of this service see a change within
+# a minute
+_version_cache = _TTLCache(maxsize=1, ttl=60)
+
+# The version, data and parsed Service objects of the trusted services
+# loaded by this process
+_trusted_version = None
+_trusted_data = {}
+_trusted_services = {}
+_trusted_lock = _threading.Lock()
+
+# The local copy of the blob is held in a directory that only this user
+# can access, in a file named after this service, so that it cannot be
+# replaced by another user, or mixed up with the blob of another service
+# running in the same container
+_trusted_local_dir = _os.path.join(_tempfile.gettempdir(),
+                                   "acquire_%s" % _os.getuid())
+_trusted_local_files = {}
+
 __all__ = ["url_to_encoded", "get_trusted_service_info",
            "set_trusted_service_info", "remove_trusted_service_info",
            "get_remote_service_info"]
@@ -32,39 +63,322 @@ def url_to_encoded(url):
     return _base64.b64encode(url.encode("utf-8")).decode("utf-8")
 
 
+def _services_key(name):
+    """Return the object store key for 'name' in the services root. The
+       names used for the version and blob start with '_', so cannot
+       clash with the (base64) encoded service URLs
+    """
+    return "services/%s" % name
+
+
+def _clear_trusted_cache():
+    """Clear this process's cache of the trusted services"""
+    global _trusted_version, _trusted_data, _trusted_services
+
+    with _trusted_lock:
+        _version_cache.clear()
+        _trusted_version = None
+        _trusted_data = {}
+        _trusted_services = {}
+
+
+def _bump_trusted_version(bucket):
+    """Change the version of the trusted services, so that all instances
+       of this service reload them. This returns the new version
+    """
+    version = str(_uuid.uuid4())
+    _ObjectStore.set_string_object(bucket, _services_key("_version"), version)
+
+    with _trusted_lock:
+        _version_cache["version"] = version
+
+    return version
+
+
+def _get_trusted_version(bucket):
+    """Return the current version of the trusted services"""
+    with _trusted_lock:
+        try:
+            return _version_cache["version"]
+        except:
+            pass
+
+    try:
+        version = _ObjectStore.get_string_object(bucket,
+                                                 _services_key("_version"))
+    except:
+        version = None
+
+    if version is None:
+        # services set before versions were introduced
+        return _bump_trusted_version(bucket)
+
+    with _trusted_lock:
+        _version_cache["version"] = version
+
+    return version
+
+
+def _sign_blob(payload):
+    """Return the signature of 'payload' using this service's signing
+       certificate, or None if this service cannot sign
+    """
+    try:
+        from ._service_account import get_service_private_certificate \
+            as _get_service_private_certificate
+        return _bytes_to_string(
+                    _get_service_private_certificate().sign(payload))
+    except:
+        return None
+
+
+def _get_service_certificate():
+    """Return the public certificate of this service, or None if this
+       service does not have one
+    """
+    try:
+        from ._service_account import get_service_public_certificate \
+            as _get_service_public_certificate
+        return _get_service_public_certificate()
+    except:
+        return None
+
+
+def _read_blob(blob, version):
+    """Return the trusted service data held in 'blob' if it is for
+       'version', else None. If this service has a certificate then
+       the blob must be signed with it
+    """
+    try:
+        payload = blob["payload"]
+        signature = blob["signature"]
+
+        public_cert = _get_service_certificate()
+
+        if public_cert is not None:
+            if signature is None:
+                return None
+
+            public_cert.verify(_string_to_bytes(signature), payload)
+
+        data = _json.loads(payload)
+
+        if data["version"] != version:
+            return None
+
+        return data["services"]
+    except:
+        return None
+
+
+def _get_local_file():
+    """Return the name of the local file used to hold the blob of
+       trusted services for this service, or None if there isn't a
+       private location for this file
+    """
+    try:
+        from ._service_account import get_service_info \
+            as _get_service_info
+        service_uid = _get_service_info().uid()
+    except:
+        return None
+
+    try:
+        return _trusted_local_files[service_uid]
+    except:
+        pass
+
+    try:
+        _os.makedirs(_trusted_local_dir, mode=0o700, exist_ok=True)
+        stat = _os.stat(_trusted_local_dir)
+
+        if stat.st_uid != _os.getuid() or (stat.st_mode & 0o077) != 0:
+            # another user could write to this directory
+            return None
+    except:
+        return None
+
+    local_file = _os.path.join(_trusted_local_dir,
+                               "trusted_services_%s.json" % service_uid)
+    _trusted_local_files[service_uid] = local_file
+
+    return local_file
+
+
+def _write_local_blob(blob):
+    """Write the blob to the local file, so that other processes of
+       this service in this container can use it
+    """
+    local_file = _get_local_file()
+
+    if local_file is None:
+        return
+
+    try:
+        tmpfile = "%s.%s" % (local_file, str(_uuid.uuid4()))
+
+        fd = _os.open(tmpfile, _os.O_WRONLY | _os.O_CREAT | _os.O_EXCL,
+                      0o600)
+
+        with _os.fdopen(fd, "w") as FILE:
+            _json.dump(blob, FILE)
+
+        _os.replace(tmpfile, local_file)
+    except:
+        pass
+
+
+def _load_trusted_services(bucket, version):
+    """Return the data of all trusted services at 'version', loading
+       this from the local file, the blob in the object store or, if
+       neither are up to date, from the individual service entries
+       (in which case the blob is rebuilt)
+    """
+    local_file = _get_local_file()
+
+    if local_file is not None:
+        try:
+            with open(local_file, "r") as FILE:
+                services = _read_blob(_json.load(FILE), version)
+
+            if services is not None:
+                return services
+        except:
+            pass
+
+    blob = _ObjectStore.get_object_from_json(bucket, _services_key("_all"))
+
+    if blob is not None:
+        services = _read_blob(blob, version)
+
+        if services is not None:
+            _write_local_blob(blob)
+            return services
+
+    services = {}
+
+    for (name, data) in _ObjectStore.get_all_strings(bucket,
+                                                     "services").items():
+        if name.startswith("_"):
+            continue
+
+        try:
+            url = _base64.b64decode(name.encode("utf-8")).decode("utf-8")
+            services[url] = _json.loads(data)
+        except:
+            pass
+
+    payload = _json.dumps({"version": version, "services": services})
+    blob = {"payload": payload, "signature": _sign_blob(payload.encode(
+                                                                "utf-8"))}
+
+    _ObjectStore.set_object_from_json(bucket, _services_key("_all"), blob)
+    _write_local_blob(blob)
+
+    return services
+
+
 def set_trusted_service_info(service_url, service):
     """Set the trusted service info for 'service_url' to 'service'"""
     bucket = _login_to_service_account()
     _ObjectStore.set_object_from_json(
                                 bucket,
-                                "services/%s" % url_to_encoded(service_url),
+                                _services_key(url_to_encoded(service_url)),
                                 service.to_data())
 
+    _clear_trusted_cache()
+    _bump_trusted_version(bucket)
+
 
 def remove_trusted_service_info(service_url):
     """Remove the passed 'service_url' from the list of trusted services"""
     bucket = _login_to_service_account()
     try:
-        _ObjectStore.delete_object(bucket,
-                                   "services/%s" % url_to_encoded(service_url))
+        _ObjectStore.delete_object(
+                        bucket, _services_key(url_to_encoded(service_url)))
     except:
         pass
 
+    _clear_trusted_cache()
+    _bump_trusted_version(bucket)
+
+
+def _prime_trusted_services():
+    """Load and parse all of the trusted services, so that later calls
+       to get_trusted_service_info do not need to. This returns the
+       number of trusted services
+    """
+    global _trusted_version, _trusted_data, _trusted_services
+
+    bucket = _login_to_service_account()
+    version = _get_trusted_version(bucket)
+    services = _load_trusted_services(bucket, version)
+
+    parsed = {}
+
+    for (service_url, data) in services.items():
+        try:
+            parsed[service_url] = _Service.from_data(data)
+        except:
+            pass
+
+    with _trusted_lock:
+        _trusted_version = version
+        _trusted_data = services
+        _trusted_services = parsed
+
+    return len(services)
+
 
-# Cached as the remove service information will not change too often
-@_cached(_cache)
 def get_trusted_service_info(service_url):
-    """Return the trusted service info for 'service_url'"""
+    """Return the trusted service info for 'service_url'. The trusted
+       services are loaded together, and the parsed Service objects
+       are kept by this process until the trusted services change
+    """
+    global _trusted_version, _trusted_data, _trusted_services
+
     bucket = _login_to_service_account()
-    data = _ObjectStore.get_object_from_json(
-                            bucket,
-                            "services/%s" % url_to_encoded(service_url))
+    version = _get_trusted_version(bucket)
+
+    with _trusted_lock:
+        if version == _trusted_version:
+            try:
+                return _trusted_services[service_url]
+            except:
+                pass
+
+            data = _trusted_data.get(service_url, None)
+        else:
+            data = None
+
+    if data is None and version != _trusted_version:
+        services = _load_trusted_services(bucket, version)
+
+        with _trusted_lock:
+            _trusted_version = version
+            _trusted_data = services
+            _trusted_services = {}
+
+        data = services.get(service_url, None)
 
     if data is None:
-        raise ServiceAccountError("We do not trust the service at '%s'" %
-                                  service_url)
+        # this service may have been added by an instance that has
+        # not yet updated the version, so look it up directly
+        data = _ObjectStore.get_object_from_json(
+                            bucket,
+                            _services_key(url_to_encoded(service_url)))
+
+        if data is None:
+            raise ServiceAccountError("We do not trust the service at '%s'"
+                                      % service_url)
+
+    service = _Service.from_data(data)
+
+    with _trusted_lock:
+        if version == _trusted_version:
+            _trusted_services[service_url] = service
 
-    return _Service.from_data(data)
+    return service
 
 
 # Cached to stop us sending too many requests for info to remote services
@@ -74,7 +388,7 @@ def get_remote_service_info(service_url):
        'service_url'
     """
 
-    key = _PrivateKey()
+    key = _get_private_key()
 
     try:
         response = _call_function(service_url, response_key=key)
@@ -86,5 +400,5 @@ def get_remote_service_info(service_url):
         return _Service.from_data(response["service_info"])
     except Exception as e:
         raise ServiceError(
-                "Cannot extract service info for '%s' from '%s': %s" &
+                "Cannot extract service info for '%s' from '%s': %s" %
                 (service_url, str(response), str(e)))
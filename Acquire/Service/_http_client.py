@@ -0,0 +1,196 @@
+
+import threading as _threading
+
+from io import BytesIO as _BytesIO
+from urllib.parse import urlparse as _urlparse
+
+__all__ = ["set_connection_timeouts", "get_connection_timeouts",
+           "get_connection_stats", "reset_connection_stats",
+           "close_connections"]
+
+# Each thread holds its own set of curl handles, keyed by host, so
+# that the connection to each service is kept alive and reused
+# between calls (a curl handle must not be used by two threads at once)
+_local = _threading.local()
+
+# The share object lets the handles in all threads share the DNS cache
+# and SSL sessions. The connection cache is not shared, so that each
+# thread's handle owns its connection, and closing the handle closes it
+_share = None
+_share_lock = _threading.Lock()
+
+_stats = {"calls": 0, "new_connections": 0, "reused_connections": 0}
+_stats_lock = _threading.Lock()
+
+# The default time (in seconds) to wait to connect to a service, and
+# to wait for a whole call to complete
+_connect_timeout = 10
+_timeout = 60
+
+
+def set_connection_timeouts(connect_timeout=None, timeout=None):
+    """Set the maximum time in seconds to wait to connect to a service
+       ('connect_timeout') and to wait for a whole call to a service
+       to complete ('timeout'). Pass None to leave a value unchanged,
+       or 0 to wait forever
+    """
+    global _connect_timeout, _timeout
+
+    if connect_timeout is not None:
+        connect_timeout = int(connect_timeout)
+
+        if connect_timeout < 0:
+            raise ValueError("The connect timeout cannot be negative")
+
+        _connect_timeout = connect_timeout
+
+    if timeout is not None:
+        timeout = int(timeout)
+
+        if timeout < 0:
+            raise ValueError("The timeout cannot be negative")
+
+        _timeout = timeout
+
+
+def get_connection_timeouts():
+    """Return the (connect_timeout, timeout) used when calling services"""
+    return (_connect_timeout, _timeout)
+
+
+def get_connection_stats():
+    """Return a dictionary of the number of calls made to services, and
+       how many of those needed a new connection versus reusing
+       an existing connection
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_connection_stats():
+    """Reset the connection statistics to zero"""
+    with _stats_lock:
+        for key in _stats.keys():
+            _stats[key] = 0
+
+
+def close_connections():
+    """Close all of the connections held by the calling thread"""
+    handles = getattr(_local, "handles", None)
+
+    if handles is None:
+        return
+
+    for handle in handles.values():
+        try:
+            handle.close()
+        except:
+            pass
+
+    handles.clear()
+
+
+def _get_share(pycurl):
+    """Return the share object used by all of the curl handles"""
+    global _share
+
+    with _share_lock:
+        if _share is None:
+            share = pycurl.CurlShare()
+            share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+            _share = share
+
+        return _share
+
+
+def _get_handle(pycurl, host):
+    """Return the curl handle for 'host' for the calling thread"""
+    handles = getattr(_local, "handles", None)
+
+    if handles is None:
+        handles = {}
+        _local.handles = handles
+
+    try:
+        return handles[host]
+    except:
+        pass
+
+    # the share is kept by the handle (even when it is reset), so
+    # it can only be set once
+    handle = pycurl.Curl()
+    handle.setopt(handle.SHARE, _get_share(pycurl))
+    handles[host] = handle
+    return handle
+
+
+def _discard_handle(host):
+    """Close and discard the calling thread's curl handle for 'host'"""
+    handles = getattr(_local, "handles", None)
+
+    if handles is None:
+        return
+
+    handle = handles.pop(host, None)
+
+    if handle is not None:
+        try:
+            handle.close()
+        except:
+            pass
+
+
+def _http_post(url, data):
+    """Post 'data' to 'url', returning the body of the response as bytes.
+       This reuses the calling thread's connection to the host of 'url'
+       if one is open. This raises pycurl.error if the call fails
+    """
+    import pycurl as _pycurl
+
+    parts = _urlparse(url)
+    host = "%s://%s" % (parts.scheme, parts.netloc)
+
+    c = _get_handle(_pycurl, host)
+
+    # reset the options from the last call, but keep the connection
+    c.reset()
+
+    buffer = _BytesIO()
+    c.setopt(c.URL, url)
+    c.setopt(c.WRITEDATA, buffer)
+    c.setopt(c.POSTFIELDS, data)
+    c.setopt(c.CONNECTTIMEOUT, _connect_timeout)
+    c.setopt(c.TIMEOUT, _timeout)
+
+    try:
+        c.setopt(c.TCP_KEEPALIVE, 1)
+    except:
+        pass
+
+    try:
+        c.setopt(c.HTTP_VERSION, _pycurl.CURL_HTTP_VERSION_2TLS)
+    except:
+        # this libcurl does not support HTTP/2
+        pass
+
+    try:
+        c.perform()
+    except:
+        _discard_handle(host)
+        raise
+
+    try:
+        num_connects = c.getinfo(c.NUM_CONNECTS)
+    except:
+        num_connects = 1
+
+    with _stats_lock:
+        _stats["calls"] += 1
+
+        if num_connects > 0:
+            _stats["new_connections"] += 1
+        else:
+            _stats["reused_connections"] += 1
+
+    return buffer.getvalue()
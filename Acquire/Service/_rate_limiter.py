@@ -0,0 +1,208 @@
+
+import hashlib as _hashlib
+import sys as _sys
+import threading as _threading
+import time as _time
+
+from cachetools import TTLCache as _TTLCache
+
+from ._errors import RateLimitError
+
+__all__ = ["RateLimiter", "MemoryRateStore", "ObjectStoreRateStore",
+           "get_source_address"]
+
+# The number of trusted proxies (including the HTTP gateway) that append
+# the address of their caller to the X-Forwarded-For header. Entries
+# before these were sent by the client, so cannot be trusted
+_trusted_proxies = 1
+
+
+class MemoryRateStore:
+    """This is a rate store that holds the state of the token buckets
+       in the memory of this process. It is fast, so can be used to
+       check every call, but is only shared by calls that are handled
+       by the same container. Buckets that have not been used for
+       'ttl' seconds are forgotten (i.e. become full again)
+    """
+    def __init__(self, maxsize=10000, ttl=3600):
+        self._buckets = _TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = _threading.Lock()
+
+    def update(self, key, function):
+        """Atomically replace the state of the bucket 'key' with
+           function(state), returning the result of 'function'
+        """
+        with self._lock:
+            (state, result) = function(self._buckets.get(key, None))
+            self._buckets[key] = state
+
+        return result
+
+    def clear(self):
+        """Forget the state of all of the buckets"""
+        with self._lock:
+            self._buckets.clear()
+
+
+class ObjectStoreRateStore:
+    """This is a rate store that holds the state of the token buckets
+       in the object store, under 'rate_limits/<name>/<key hash>', so
+       that the limit is shared by all of the containers of a service.
+       This needs a read and a write for each check, so should only
+       be used for calls that are already writing to the object store.
+       The update is not atomic, so concurrent calls may use slightly
+       more than the allowed rate
+    """
+    def __init__(self, name, bucket=None):
+        self._name = name
+        self._bucket = bucket
+
+    def _key(self, key):
+        """Return the object store key for the bucket 'key'"""
+        return "rate_limits/%s/%s" % (
+            self._name, _hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def update(self, key, function):
+        """Replace the state of the bucket 'key' with function(state),
+           returning the result of 'function'
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        if self._bucket is None:
+            from ._login_to_objstore import login_to_service_account \
+                as _login_to_service_account
+            self._bucket = _login_to_service_account()
+
+        object_key = self._key(key)
+
+        try:
+            state = tuple(_ObjectStore.get_object_from_json(self._bucket,
+                                                            object_key))
+        except:
+            state = None
+
+        (state, result) = function(state)
+
+        _ObjectStore.set_object_from_json(self._bucket, object_key,
+                                          list(state))
+
+        return result
+
+
+class RateLimiter:
+    """This class implements a token-bucket rate limiter. Each key
+       (e.g. an IP address or a username) has a bucket that holds up
+       to 'burst' tokens, and which is refilled at 'rate' tokens per
+       second. Each call takes one token from the bucket, and is
+       refused if the bucket is empty
+    """
+    def __init__(self, rate, burst, store=None):
+        """Construct a limiter that allows 'rate' calls per second
+           per key, with bursts of up to 'burst' calls. The state of
+           the buckets is held in 'store' (by default, in memory)
+        """
+        if store is None:
+            store = MemoryRateStore()
+
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._store = store
+
+    def __str__(self):
+        return "RateLimiter(rate=%s, burst=%s)" % (self._rate, self._burst)
+
+    def _take(self, state, cost, now):
+        """Take 'cost' tokens from the bucket with passed state,
+           returning the new state and whether this was allowed
+        """
+        if state is None:
+            tokens = self._burst
+        else:
+            (tokens, timestamp) = state
+            tokens = min(self._burst,
+                         tokens + max(0.0, now - timestamp) * self._rate)
+
+        if tokens >= cost:
+            return ((tokens - cost, now), True)
+        else:
+            return ((tokens, now), False)
+
+    def allow(self, key, cost=1):
+        """Return whether or not a call for 'key' is allowed, taking
+           'cost' tokens from its bucket if it is. Calls with a null
+           key (e.g. because the source address is missing) are
+           logged and allowed. Limiting them together would let a
+           few callers block everyone whose address is missing
+        """
+        if key is None:
+            _sys.stderr.write("RateLimiter: allowing a call with an "
+                              "unknown key\n")
+            return True
+
+        now = _time.time()
+
+        return self._store.update(str(key),
+                                  lambda state: self._take(state, cost, now))
+
+    def tokens(self, key):
+        """Return the number of tokens that are currently in the bucket
+           for 'key', without taking any
+        """
+        if key is None:
+            return self._burst
+
+        now = _time.time()
+
+        def _peek(state):
+            (state, _allowed) = self._take(state, 0, now)
+            return (state, state[0])
+
+        return self._store.update(str(key), _peek)
+
+    def check(self, key, cost=1):
+        """Take 'cost' tokens from the bucket for 'key', raising a
+           RateLimitError if there are not enough
+        """
+        if not self.allow(key, cost):
+            raise RateLimitError(
+                "Too many requests from '%s'. Please wait and try again."
+                % key)
+
+
+def get_source_address(ctx, trusted_proxies=None):
+    """Return the IP address of the source of the call with passed
+       Fn context, or None if this is not known. This is read from
+       the X-Forwarded-For header. The client can add any entries it
+       likes to the start of this header, so the address is the entry
+       added by the outermost of the 'trusted_proxies' proxies (by
+       default _trusted_proxies, i.e. the HTTP gateway), which is
+       the address that connected to that proxy
+    """
+    if trusted_proxies is None:
+        trusted_proxies = _trusted_proxies
+
+    trusted_proxies = max(1, int(trusted_proxies))
+
+    try:
+        headers = ctx.Headers()
+    except:
+        return None
+
+    if headers is None:
+        return None
+
+    for name in ("Fn-Http-H-X-Forwarded-For", "X-Forwarded-For"):
+        for (key, value) in headers.items():
+            if key.lower() == name.lower() and value:
+                if isinstance(value, (list, tuple)):
+                    value = ",".join([str(v) for v in value])
+
+                addresses = [a.strip() for a in str(value).split(",")]
+                addresses = [a for a in addresses if len(a) > 0]
+
+                if len(addresses) == 0:
+                    return None
+
+                return addresses[-min(trusted_proxies, len(addresses))]
+
+    return None
@@ -1,6 +1,8 @@
 
 import os as _os
 import json as _json
+import hashlib as _hashlib
+import threading as _threading
 
 from cachetools import cached as _cached
 from cachetools import TTLCache as _TTLCache
@@ -19,6 +21,14 @@ from ._errors import ServiceError, ServiceAccountError, \
 # cause problems for a maximum of 300 seconds)
 _cache = _TTLCache(maxsize=50, ttl=300)
 
+# Decrypting the private key and certificate of this service is slow, so
+# the decrypted Service is kept for the lifetime of the process. It is
+# only decrypted again if the stored service info (or the password)
+# changes, which is detected using a hash of the data
+_private_service = None
+_private_service_digest = None
+_private_service_lock = _threading.Lock()
+
 
 __all__ = ["get_service_info", "get_service_private_key",
            "get_service_private_certificate", "get_service_public_key",
@@ -47,6 +57,32 @@ def _get_service_info_data():
     return service
 
 
+def _get_private_service(data, password):
+    """Internal function that returns the Service decrypted from 'data'
+       using 'password', reusing the last decrypted Service if the
+       data and password have not changed
+    """
+    global _private_service, _private_service_digest
+
+    h = _hashlib.sha256()
+    h.update(_json.dumps(data, sort_keys=True).encode("utf-8"))
+    h.update(password.encode("utf-8"))
+    digest = h.digest()
+
+    with _private_service_lock:
+        if digest == _private_service_digest and \
+                _private_service is not None:
+            return _private_service
+
+    service = _Service.from_data(data, password)
+
+    with _private_service_lock:
+        _private_service = service
+        _private_service_digest = digest
+
+    return service
+
+
 def get_service_info(need_private_access=False):
     """Return the service info object for this service. If private
        access is needed then this will decrypt and access the private
@@ -61,7 +97,7 @@ def get_service_info(need_private_access=False):
         if service_password is None:
             raise ServiceAccountError("You must supply a $SERVICE_PASSWORD")
 
-        service = _Service.from_data(service, service_password)
+        service = _get_private_service(service, service_password)
     else:
         service = _Service.from_data(service)
 
@@ -0,0 +1,306 @@
+
+import datetime as _datetime
+import hashlib as _hashlib
+import json as _json
+import threading as _threading
+
+from cachetools import TTLCache as _TTLCache
+
+from Acquire.Crypto import SymmetricKey as _SymmetricKey
+from Acquire.Crypto import PublicKey as _PublicKey
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
+from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
+from Acquire.ObjectStore import string_to_bytes as _string_to_bytes
+
+from ._errors import UnpackingError
+
+__all__ = ["register_session_key", "get_session_key",
+           "get_client_session_key", "set_client_session_key",
+           "clear_client_session_key"]
+
+# The session keys registered with this service, keyed by key UID.
+# Each entry is the tuple (key, fingerprint of the client's public key).
+# Keys are held for at most an hour, which is the longest lifetime
+# of a session key. The keys are also saved (encrypted) to the object
+# store, so that other instances of this service can find them
+_session_keys = _TTLCache(maxsize=1000, ttl=3600)
+_session_keys_lock = _threading.Lock()
+
+# The longest time (in seconds) that a session key can be used for.
+# Keys sent with a later expiry are registered with this lifetime
+_max_session_key_lifetime = 3600
+
+# The maximum number of expired session keys removed from the object
+# store each time the keys are pruned. The keys are pruned at most
+# once every _prune_interval seconds by each instance of this service,
+# as this needs a listing of the index of keys
+_max_prune = 20
+_prune_interval = 300
+_last_prune = None
+_prune_lock = _threading.Lock()
+
+# The session keys that this client has negotiated with each service,
+# keyed by service URL
+_client_session_keys = {}
+_client_session_keys_lock = _threading.Lock()
+
+# Stop using a session key this many seconds before it expires, so
+# that it cannot expire while a call is in flight
+_client_expiry_margin = 300
+
+
+def _session_key_root():
+    return "session_keys"
+
+
+def _session_key_index_root():
+    return "session_key_index"
+
+
+def _get_fingerprint(client_key):
+    """Return the fingerprint of the passed client public key (either
+       a PublicKey or its bytes encoded as a string)
+    """
+    if isinstance(client_key, _PublicKey):
+        client_key = client_key.bytes()
+    elif isinstance(client_key, str):
+        client_key = _string_to_bytes(client_key)
+
+    return _hashlib.sha256(bytes(client_key)).hexdigest()
+
+
+def _get_bucket(bucket):
+    """Return 'bucket', logging into the service account if needed"""
+    if bucket is None:
+        from ._login_to_objstore import login_to_service_account \
+            as _login_to_service_account
+        bucket = _login_to_service_account()
+
+    return bucket
+
+
+def _load_session_key(uid, bucket):
+    """Load the (key, client fingerprint) for the session key with UID
+       'uid' from the object store, returning (None, None) if there
+       is no such key
+    """
+    try:
+        from ._service_account import get_service_private_key \
+            as _get_service_private_key
+
+        data = _ObjectStore.get_string_object(
+                    _get_bucket(bucket), "%s/%s" % (_session_key_root(), uid))
+
+        data = _get_service_private_key().decrypt(_string_to_bytes(data))
+        data = _json.loads(data.decode("utf-8"))
+
+        key = _SymmetricKey.from_data(data["key"])
+        fingerprint = data["client"]
+    except:
+        return (None, None)
+
+    if key is None or key.uid() != uid:
+        return (None, None)
+
+    return (key, fingerprint)
+
+
+def _should_prune():
+    """Return whether or not it is time for this instance to prune
+       the expired session keys
+    """
+    global _last_prune
+
+    now = _datetime.datetime.now().timestamp()
+
+    with _prune_lock:
+        if _last_prune is not None and \
+                now - _last_prune < _prune_interval:
+            return False
+
+        _last_prune = now
+        return True
+
+
+def _prune_session_keys(bucket):
+    """Remove up to _max_prune of the expired session keys from the
+       object store. The keys are indexed by expiry time
+       (session_key_index/<expiry>/<uid>), so the expired keys are
+       found by listing the index, without loading any keys
+    """
+    now = _datetime.datetime.now().timestamp()
+
+    try:
+        names = _ObjectStore.get_all_object_names(bucket,
+                                                  _session_key_index_root())
+    except:
+        return
+
+    expired = []
+
+    for name in names:
+        try:
+            (expiry, uid) = name.split("/")
+            if int(expiry) < now:
+                expired.append((int(expiry), uid))
+        except:
+            pass
+
+    for (expiry, uid) in sorted(expired)[0:_max_prune]:
+        for key in ["%s/%s" % (_session_key_root(), uid),
+                    "%s/%d/%s" % (_session_key_index_root(), expiry, uid)]:
+            try:
+                _ObjectStore.delete_object(bucket, key)
+            except:
+                pass
+
+
+def register_session_key(key, client_key, bucket=None):
+    """Register the passed session key with this service, so that it
+       can be used to decrypt and encrypt messages sent by the client
+       with public key 'client_key' that created the key. The key is
+       cached in memory and is written to the object store encrypted
+       using this service's public key. A key UID can only be
+       registered once, and only by the client that first registered
+       it. Keys are registered for at most _max_session_key_lifetime
+       seconds
+    """
+    if not isinstance(key, _SymmetricKey):
+        raise TypeError("The session key must be a SymmetricKey")
+
+    if client_key is None:
+        raise UnpackingError(
+            "A session key can only be registered by a client that "
+            "supplies its public key")
+
+    if key.is_expired():
+        return
+
+    max_expiry = _datetime.datetime.now() + \
+        _datetime.timedelta(seconds=_max_session_key_lifetime)
+
+    if key.expiry() > max_expiry:
+        data = key.to_data()
+        data["expiry"] = max_expiry.timestamp()
+        key = _SymmetricKey.from_data(data)
+
+    uid = key.uid()
+    fingerprint = _get_fingerprint(client_key)
+
+    try:
+        bucket = _get_bucket(bucket)
+    except:
+        # this instance can still use the key
+        bucket = None
+
+    with _session_keys_lock:
+        existing = _session_keys.get(uid, None)
+
+    if existing is None and bucket is not None:
+        existing = _load_session_key(uid, bucket)
+
+        if existing[0] is None:
+            existing = None
+
+    if existing is not None:
+        if existing[0] == key and existing[1] == fingerprint:
+            # the same client is registering the same key again
+            return
+
+        raise UnpackingError(
+            "Cannot register the session key '%s' as a key with this "
+            "UID has already been registered" % uid)
+
+    with _session_keys_lock:
+        _session_keys[uid] = (key, fingerprint)
+
+    if bucket is None:
+        return
+
+    try:
+        from ._service_account import get_service_public_key \
+            as _get_service_public_key
+
+        data = _get_service_public_key().encrypt(
+                    _json.dumps({"key": key.to_data(),
+                                 "client": fingerprint}).encode("utf-8"))
+
+        _ObjectStore.set_string_object(
+            bucket, "%s/%s" % (_session_key_root(), uid),
+            _bytes_to_string(data))
+
+        _ObjectStore.set_string_object(
+            bucket, "%s/%d/%s" % (_session_key_index_root(),
+                                  int(key.expiry().timestamp()) + 1, uid),
+            fingerprint)
+    except:
+        # this instance can still use the key, so this is not fatal
+        return
+
+    if _should_prune():
+        _prune_session_keys(bucket)
+
+
+def get_session_key(uid, bucket=None):
+    """Return the session key with UID 'uid' that has been registered
+       with this service, or None if there is no such key or it
+       has expired
+    """
+    if uid is None:
+        return None
+
+    uid = str(uid)
+
+    with _session_keys_lock:
+        entry = _session_keys.get(uid, None)
+
+    if entry is None:
+        try:
+            bucket = _get_bucket(bucket)
+        except:
+            return None
+
+        entry = _load_session_key(uid, bucket)
+
+        if entry[0] is None:
+            return None
+
+        with _session_keys_lock:
+            _session_keys[uid] = entry
+
+    key = entry[0]
+
+    if key.is_expired():
+        return None
+
+    return key
+
+
+def get_client_session_key(service_url):
+    """Return the session key that this client has negotiated with the
+       service at 'service_url', or None if there isn't a usable key
+    """
+    with _client_session_keys_lock:
+        key = _client_session_keys.get(service_url, None)
+
+        if key is not None and key.is_expired(_client_expiry_margin):
+            del _client_session_keys[service_url]
+            key = None
+
+    return key
+
+
+def set_client_session_key(service_url, key):
+    """Record that this client has negotiated the session key 'key'
+       with the service at 'service_url'
+    """
+    with _client_session_keys_lock:
+        _client_session_keys[service_url] = key
+
+
+def clear_client_session_key(service_url):
+    """Forget the session key negotiated with the service at
+       'service_url'
+    """
+    with _client_session_keys_lock:
+        _client_session_keys.pop(service_url, None)
@@ -0,0 +1,102 @@
+
+import importlib as _importlib
+import json as _json
+import sys as _sys
+import threading as _threading
+import time as _time
+
+__all__ = ["warmup_service", "get_warmup_status"]
+
+# The result of the last warmup of this process
+_warmup_status = None
+_warmup_lock = _threading.Lock()
+
+
+def _get_private_keys():
+    """Decrypt the private key and signing certificate of this service"""
+    from ._service_account import get_service_private_key \
+        as _get_service_private_key
+    from ._service_account import get_service_private_certificate \
+        as _get_service_private_certificate
+
+    _get_service_private_key()
+    _get_service_private_certificate()
+
+
+def _import_handlers(handlers):
+    """Import all of the passed handler modules"""
+    for handler in handlers:
+        _importlib.import_module(handler)
+
+
+def warmup_service(handlers=None):
+    """Do all of the slow work needed before this service can handle
+       a call, so that the first real call after a container starts is
+       not slowed down. This logs into the service account, decrypts the
+       service keys, loads the trusted services, pre-generates response
+       keys and imports the passed handler modules. This returns a
+       dictionary of the time (in ms) taken by each stage, any errors,
+       and whether or not the service is now ready. This is also
+       written to stderr, so that it appears in the service's log
+    """
+    from ._login_to_objstore import login_to_service_account \
+        as _login_to_service_account
+    from ._service_account import get_service_info as _get_service_info
+    from ._get_services import _prime_trusted_services
+    from Acquire.Crypto import get_private_key as _get_private_key
+
+    if handlers is None:
+        handlers = []
+
+    stages = [("login", _login_to_service_account),
+              ("service_info", _get_service_info),
+              ("service_keys", _get_private_keys),
+              ("trusted_services", _prime_trusted_services),
+              ("response_key", _get_private_key),
+              ("handlers", lambda: _import_handlers(handlers))]
+
+    timings = {}
+    errors = {}
+
+    start = _time.monotonic()
+
+    for (name, stage) in stages:
+        stage_start = _time.monotonic()
+
+        try:
+            stage()
+        except Exception as e:
+            errors[name] = "%s: %s" % (e.__class__.__name__, str(e))
+
+        timings[name] = 1000.0 * (_time.monotonic() - stage_start)
+
+    status = {"ready": len(errors) == 0,
+              "timings": timings,
+              "total": 1000.0 * (_time.monotonic() - start),
+              "warmed_at": _time.time()}
+
+    if len(errors) > 0:
+        status["errors"] = errors
+
+    try:
+        _sys.stderr.write("warmup: %s\n" % _json.dumps(status))
+    except:
+        pass
+
+    global _warmup_status
+
+    with _warmup_lock:
+        _warmup_status = status
+
+    return status
+
+
+def get_warmup_status():
+    """Return the result of the last call to warmup_service in this
+       process, or None if this process has not been warmed up
+    """
+    with _warmup_lock:
+        if _warmup_status is None:
+            return None
+        else:
+            return dict(_warmup_status)
@@ -13,15 +13,16 @@ three services:
     This 
 """
 
-import lazy_import as _lazy_import
-
-Access = _lazy_import.lazy_module("Acquire.Access")
-Accounting = _lazy_import.lazy_module("Acquire.Accounting")
-Client = _lazy_import.lazy_module("Acquire.Client")
-Crypto = _lazy_import.lazy_module("Acquire.Crypto")
-Identity = _lazy_import.lazy_module("Acquire.Identity")
-ObjectStore = _lazy_import.lazy_module("Acquire.ObjectStore")
-Service = _lazy_import.lazy_module("Acquire.Service")
+import importlib as _importlib
 
 __all__ = ["Access", "Accounting", "Client", "Crypto",
            "Identity", "ObjectStore", "Service"]
+
+
+def __getattr__(name):
+    """Import the subpackages only when they are first used"""
+    if name in __all__:
+        return _importlib.import_module("%s.%s" % (__name__, name))
+
+    raise AttributeError("module '%s' has no attribute '%s'" %
+                         (__name__, name))
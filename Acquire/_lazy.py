@@ -0,0 +1,65 @@
+
+import importlib as _importlib
+import sys as _sys
+
+__all__ = ["lazy_loader"]
+
+
+def _set_printer(value):
+    """If this is running in ipython and 'value' is a class, then
+       tell ipython to print objects of that class using __str__
+    """
+    if not isinstance(value, type):
+        return
+
+    try:
+        formatter = get_ipython().display_formatter.formatters["text/plain"]
+    except:
+        # this is not running in ipython
+        return
+
+    formatter.for_type(
+        value, lambda obj, p, cycle: p.text(str(obj) if not cycle else "..."))
+
+
+def lazy_loader(package, modules):
+    """Return the (__getattr__, __dir__, names) needed to make 'package'
+       load its submodules lazily (PEP 562). 'modules' is a dictionary
+       mapping the name of each submodule to the list of names that it
+       exports. A submodule is only imported when one of its names is
+       first used, so importing the package itself is quick, which
+       matters for the cold start of the Fn functions. When running
+       in ipython, each class is set to print using __str__ when it
+       is loaded
+    """
+    names = {}
+
+    # the classes that have already been imported (e.g. the errors)
+    for value in list(_sys.modules[package].__dict__.values()):
+        _set_printer(value)
+
+    for (module, module_names) in modules.items():
+        for name in module_names:
+            names[name] = module
+
+    def __getattr__(name):
+        try:
+            module = names[name]
+        except KeyError:
+            raise AttributeError("module '%s' has no attribute '%s'" %
+                                 (package, name))
+
+        value = getattr(_importlib.import_module(
+                            "%s.%s" % (package, module)), name)
+
+        # save the value so that this is only called once per name
+        setattr(_sys.modules[package], name, value)
+        _set_printer(value)
+
+        return value
+
+    def __dir__():
+        return sorted(set(names.keys()) |
+                      set(_sys.modules[package].__dict__.keys()))
+
+    return (__getattr__, __dir__, list(names.keys()))
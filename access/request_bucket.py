@@ -4,7 +4,7 @@ from Acquire.Service import login_to_service_account
 from Acquire.Service import call_function
 from Acquire.Service import Service
 
-from Acquire.Crypto import PrivateKey
+from Acquire.Crypto import get_private_key
 
 from Acquire.ObjectStore import ObjectStore, string_to_bytes
 
@@ -52,7 +52,7 @@ def run(args):
 
     # Since we trust this identity service, we can ask it to give us the
     # public certificate and signing certificate for this user.
-    key = PrivateKey()
+    key = get_private_key()
 
     response = call_function(identity_service_url, "get_user_keys",
                              args_key=identity_service.public_key(),
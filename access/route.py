@@ -5,7 +5,50 @@ import json
 
 from Acquire.Service import unpack_arguments, get_service_private_key
 from Acquire.Service import create_return_value, pack_return_value, \
-                            start_profile, end_profile
+                            start_profile, end_profile, run_batch, \
+                            warmup_service
+
+# The modules that implement the functions of this service
+_handlers = ["root", "request", "request_bucket", "setup"]
+
+
+def route_function(function, args):
+    """Function that routes the passed call to the function
+       that implements it, returning the result"""
+    if function is None:
+        from root import run as _root
+        result = _root(args)
+    elif function == "request":
+        from request import run as _request
+        result = _request(args)
+    elif function == "request_bucket":
+        from request_bucket import run as _request_bucket
+        result = _request_bucket(args)
+    elif function == "setup":
+        from setup import run as _setup
+        result = _setup(args)
+    elif function == "warmup":
+        result = warmup(args)
+    else:
+        result = {"status": -1,
+                  "message": "Unknown function '%s'" % function}
+
+    return result
+
+
+def warmup(args=None):
+    """Log into the service account, decrypt the service keys, load
+       the trusted services and import all of the handlers, so that
+       this function is ready to handle calls. This can be called
+       by a scheduled ping after the function has been deployed.
+       Anyone can call this, so it only returns whether or not the
+       function is ready. The timings and any errors are written to
+       the function's log
+    """
+    if warmup_service(_handlers)["ready"]:
+        return create_return_value(0, "Success")
+    else:
+        return create_return_value(-1, "The service is not ready")
 
 
 async def handler(ctx, data=None, loop=None):
@@ -33,21 +76,10 @@ async def handler(ctx, data=None, loop=None):
         function = None
 
     try:
-        if function is None:
-            from root import run as _root
-            result = _root(args)
-        elif function == "request":
-            from request import run as _request
-            result = _request(args)
-        elif function == "request_bucket":
-            from request_bucket import run as _request_bucket
-            result = _request_bucket(args)
-        elif function == "setup":
-            from setup import run as _setup
-            result = _setup(args)
+        if function == "batch":
+            result = run_batch(args, route_function)
         else:
-            result = {"status": -1,
-                      "message": "Unknown function '%s'" % function}
+            result = route_function(function, args)
 
     except Exception as e:
         result = {"status": -1,
@@ -65,10 +65,8 @@ def run(args):
                 "accounts unless you have authenticated as the user!")
 
         bucket = login_to_service_account()
-        account_names = accounts.list_accounts(bucket=bucket)
 
-        for account_name in account_names:
-            account = accounts.get_account(account_name, bucket=bucket)
+        for account in accounts.get_accounts(bucket=bucket):
             account_uids[account.uid()] = account.name()
 
     else:
@@ -1,10 +1,64 @@
 
 import asyncio
 import fdk
+import json
 
 from Acquire.Service import unpack_arguments, get_service_private_key
 from Acquire.Service import create_return_value, pack_return_value, \
-                            start_profile, end_profile
+                            start_profile, end_profile, run_batch, \
+                            warmup_service
+
+# The modules that implement the functions of this service
+_handlers = ["root", "create_account", "deposit", "get_account_uids",
+             "get_info", "perform", "setup"]
+
+
+def route_function(function, args):
+    """Function that routes the passed call to the function
+       that implements it, returning the result"""
+    if function is None:
+        from root import run as _root
+        result = _root(args)
+    elif function == "create_account":
+        from create_account import run as _create_account
+        result = _create_account(args)
+    elif function == "deposit":
+        from deposit import run as _deposit
+        result = _deposit(args)
+    elif function == "get_account_uids":
+        from get_account_uids import run as _get_account_uids
+        result = _get_account_uids(args)
+    elif function == "get_info":
+        from get_info import run as _get_info
+        result = _get_info(args)
+    elif function == "perform":
+        from perform import run as _perform
+        result = _perform(args)
+    elif function == "setup":
+        from setup import run as _setup
+        result = _setup(args)
+    elif function == "warmup":
+        result = warmup(args)
+    else:
+        result = {"status": -1,
+                  "message": "Unknown function '%s'" % function}
+
+    return result
+
+
+def warmup(args=None):
+    """Log into the service account, decrypt the service keys, load
+       the trusted services and import all of the handlers, so that
+       this function is ready to handle calls. This can be called
+       by a scheduled ping after the function has been deployed.
+       Anyone can call this, so it only returns whether or not the
+       function is ready. The timings and any errors are written to
+       the function's log
+    """
+    if warmup_service(_handlers)["ready"]:
+        return create_return_value(0, "Success")
+    else:
+        return create_return_value(-1, "The service is not ready")
 
 
 async def handler(ctx, data=None, loop=None):
@@ -32,30 +86,10 @@ async def handler(ctx, data=None, loop=None):
         function = None
 
     try:
-        if function is None:
-            from root import run as _root
-            result = _root(args)
-        elif function == "create_account":
-            from create_account import run as _create_account
-            result = _create_account(args)
-        elif function == "deposit":
-            from deposit import run as _deposit
-            result = _deposit(args)
-        elif function == "get_account_uids":
-            from get_account_uids import run as _get_account_uids
-            result = _get_account_uids(args)
-        elif function == "get_info":
-            from get_info import run as _get_info
-            result = _get_info(args)
-        elif function == "perform":
-            from perform import run as _perform
-            result = _perform(args)
-        elif function == "setup":
-            from setup import run as _setup
-            result = _setup(args)
+        if function == "batch":
+            result = run_batch(args, route_function)
         else:
-            result = {"status": -1,
-                      "message": "Unknown function '%s'" % function}
+            result = route_function(function, args)
 
     except Exception as e:
         result = {"status": -1,
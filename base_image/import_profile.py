@@ -0,0 +1,139 @@
+"""
+Report the cost of the imports needed by each Fn function, and snapshot
+the modules that are imported once the function has been warmed up
+(i.e. once route.py and all of the modules that it routes calls to
+have been imported). Use this to find the modules that slow down the
+cold start of a function.
+
+Run this from a python that has all of the function's dependencies
+installed (e.g. in the base image), e.g.
+
+    python3 import_profile.py ../identity ../access ../accounting
+
+Use '--snapshot imports.json' to save the import graph of each function
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+_import_time = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+_handler = re.compile(r"from (\w+) import run")
+
+# Code run in the profiled python to import (warm up) the function
+_warm_code = """
+import importlib, json, sys
+for module in %s:
+    importlib.import_module(module)
+print(json.dumps(sorted(sys.modules.keys())))
+"""
+
+
+def _get_handler_modules(function_dir):
+    """Return the modules that route.py in 'function_dir' routes to"""
+    with open(os.path.join(function_dir, "route.py"), "r") as FILE:
+        modules = _handler.findall(FILE.read())
+
+    # remove duplicates, but keep the order
+    return list(dict.fromkeys(modules))
+
+
+def profile_function(function_dir, root_dir):
+    """Import (warm up) the function in 'function_dir' in a new python
+       process using '-X importtime'. This returns a dictionary of the
+       modules that were imported and the cost of importing each one
+    """
+    modules = ["route"] + _get_handler_modules(function_dir)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+                            [function_dir, root_dir] +
+                            [p for p in [os.getenv("PYTHONPATH")] if p])
+
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                        _warm_code % repr(modules)],
+                       cwd=function_dir, env=env,
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                       universal_newlines=True)
+
+    if p.returncode != 0:
+        raise RuntimeError("Cannot import the function in '%s':\n%s" %
+                           (function_dir, p.stderr))
+
+    costs = {}
+    total = 0
+
+    for line in p.stderr.splitlines():
+        m = _import_time.match(line)
+
+        if m is None:
+            continue
+
+        (self_us, cumulative_us, indent, module) = m.groups()
+        costs[module] = (int(self_us), int(cumulative_us))
+
+        if len(indent) == 1:
+            # this is a top-level import
+            total += int(cumulative_us)
+
+    return {"function": os.path.basename(os.path.abspath(function_dir)),
+            "handlers": modules,
+            "import_time_us": total,
+            "costs": costs,
+            "modules": json.loads(p.stdout.strip().splitlines()[-1])}
+
+
+def print_report(profile, top):
+    """Print the 'top' most expensive imports in 'profile'"""
+    print("\n%s: %d modules imported in %.1f ms" %
+          (profile["function"], len(profile["modules"]),
+           profile["import_time_us"] / 1000.0))
+
+    costs = profile["costs"]
+
+    for (title, index) in [("self", 0), ("cumulative", 1)]:
+        print("\n  Most expensive imports (%s):" % title)
+
+        ranked = sorted(costs.items(), key=lambda x: x[1][index],
+                        reverse=True)
+
+        for (module, cost) in ranked[0:top]:
+            print("    %10.1f ms  %s" % (cost[index] / 1000.0, module))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Profile the imports of the Fn functions")
+    parser.add_argument("function_dirs", nargs="+",
+                        help="The directories holding each function")
+    parser.add_argument("--top", type=int, default=15,
+                        help="The number of imports to report")
+    parser.add_argument("--snapshot", default=None,
+                        help="Write the import graph of each function "
+                             "to this json file")
+
+    args = parser.parse_args(argv)
+
+    # the directory that holds the Acquire package
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            os.pardir))
+
+    profiles = []
+
+    for function_dir in args.function_dirs:
+        profile = profile_function(os.path.abspath(function_dir), root_dir)
+        print_report(profile, args.top)
+        profiles.append(profile)
+
+    if args.snapshot:
+        with open(args.snapshot, "w") as FILE:
+            json.dump(profiles, FILE, indent=2)
+
+        print("\nWritten the import graph snapshot to %s" % args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
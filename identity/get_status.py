@@ -33,8 +33,8 @@ def run(args):
         (user_account.sanitised_name(), session_uid)
 
     try:
-        login_session = LoginSession.from_data(
-                            ObjectStore.get_object_from_json(
+        login_session = LoginSession.from_bytes(
+                            ObjectStore.get_object(
                                 bucket, user_session_key))
     except:
         login_session = None
@@ -44,9 +44,12 @@ def run(args):
                                 (user_account.sanitised_name(),
                                     session_uid)
 
-        login_session = LoginSession.from_data(
-                            ObjectStore.get_object_from_json(
-                                bucket, user_session_key))
+        try:
+            login_session = LoginSession.from_bytes(
+                                ObjectStore.get_object(
+                                    bucket, user_session_key))
+        except:
+            login_session = None
 
     if login_session is None:
         raise InvalidSessionError(
@@ -1,11 +1,13 @@
 
-import datetime
 import uuid
 
+from concurrent.futures import ThreadPoolExecutor
+
 from Acquire.Service import login_to_service_account
 from Acquire.Service import create_return_value
 
-from Acquire.Identity import UserAccount, LoginSession
+from Acquire.Identity import UserAccount, LoginSession, OTPIndex, \
+    SessionIndex, DeviceIndex
 
 from Acquire.ObjectStore import ObjectStore
 
@@ -14,6 +16,92 @@ class LoginError(Exception):
     pass
 
 
+def _find_legacy_login_request(bucket, user_account, short_uid):
+    """Find the login request with short UID 'short_uid' that was
+       recorded before requests were indexed by username. This scans all
+       requests with this short UID. This returns the
+       (session uid, request key) of the request, or (None, None)
+    """
+    base_key = "requests/%s" % short_uid
+
+    try:
+        session_keys = ObjectStore.get_all_object_names(bucket, base_key)
+    except:
+        session_keys = []
+
+    # try all of the sessions to find the one that the user
+    # may be referring to...
+    login_session_key = None
+    request_session_key = None
+
+    for session_key in session_keys:
+        try:
+            session_user = ObjectStore.get_string_object(
+                bucket, "%s/%s" % (base_key, session_key))
+        except:
+            continue
+
+        # did the right user request this session?
+        if user_account.name() == session_user:
+            if login_session_key:
+                # this is an extremely unlikely edge case, whereby
+                # two login requests within a 30 minute interval for the
+                # same user result in the same short UID. This should be
+                # signified as an error and the user asked to create a
+                # new request
+                raise LoginError(
+                    "You have found an extremely rare edge-case "
+                    "whereby two different login requests have randomly "
+                    "obtained the same short UID. As we can't work out "
+                    "which request is valid, the login is denied. Please "
+                    "create a new login request, which will then have a "
+                    "new login request UID")
+            else:
+                login_session_key = session_key
+                request_session_key = "%s/%s" % (base_key, session_key)
+
+    return (login_session_key, request_session_key)
+
+
+def _read_all(reads):
+    """Run all of the passed read functions concurrently, returning
+       their results in order (with None for any read that failed)
+    """
+    with ThreadPoolExecutor(max_workers=len(reads)) as pool:
+        futures = [pool.submit(read) for read in reads]
+
+    results = []
+
+    for future in futures:
+        try:
+            results.append(future.result())
+        except:
+            results.append(None)
+
+    return results
+
+
+def find_login_request(bucket, user_account, short_uid):
+    """Return the (session uid, request key) of the login request with
+       short UID 'short_uid' made by 'user_account', or (None, None)
+       if there is no such request. request_login makes sure that the
+       short UIDs of the open requests of a user never clash, so this
+       needs only a single read
+    """
+    request_key = "requests/%s/%s" % (short_uid,
+                                      user_account.sanitised_name())
+
+    try:
+        session_uid = ObjectStore.get_string_object(bucket, request_key)
+    except:
+        session_uid = None
+
+    if session_uid:
+        return (session_uid, request_key)
+    else:
+        return _find_legacy_login_request(bucket, user_account, short_uid)
+
+
 def run(args):
     """This function is called by the user to log in and validate
        that a session is authorised to connect"""
@@ -38,6 +126,11 @@ def run(args):
     except:
         device_uid = None
 
+    try:
+        source = args["source_address"]
+    except:
+        source = None
+
     # create the user account for the user
     user_account = UserAccount(username)
 
@@ -46,36 +139,8 @@ def run(args):
     bucket = login_to_service_account()
 
     # locate the session referred to by this uid
-    base_key = "requests/%s" % short_uid
-    session_keys = ObjectStore.get_all_object_names(bucket, base_key)
-
-    # try all of the sessions to find the one that the user
-    # may be referring to...
-    login_session_key = None
-    request_session_key = None
-
-    for session_key in session_keys:
-        request_session_key = "%s/%s" % (base_key, session_key)
-        session_user = ObjectStore.get_string_object(
-            bucket, request_session_key)
-
-        # did the right user request this session?
-        if user_account.name() == session_user:
-            if login_session_key:
-                # this is an extremely unlikely edge case, whereby
-                # two login requests within a 30 minute interval for the
-                # same user result in the same short UID. This should be
-                # signified as an error and the user asked to create a
-                # new request
-                raise LoginError(
-                    "You have found an extremely rare edge-case "
-                    "whereby two different login requests have randomly "
-                    "obtained the same short UID. As we can't work out "
-                    "which request is valid, the login is denied. Please "
-                    "create a new login request, which will then have a "
-                    "new login request UID")
-            else:
-                login_session_key = session_key
+    (login_session_key, request_session_key) = \
+        find_login_request(bucket, user_account, short_uid)
 
     if not login_session_key:
         raise LoginError(
@@ -86,25 +151,35 @@ def run(args):
                                             login_session_key)
 
     # fully load the user account from the object store so that we
-    # can validate the username and password
+    # can validate the username and password. The account, the login
+    # session and (if needed) the user's remembered devices are read
+    # together, in a single batch of concurrent reads
+    account_key = "accounts/%s" % user_account.sanitised_name()
+    device_index = DeviceIndex(user_account.sanitised_name())
+    use_device = (not remember_device) and device_uid
+
+    reads = [lambda: ObjectStore.get_object(bucket, account_key),
+             lambda: ObjectStore.get_object(bucket, login_session_key)]
+
+    if use_device:
+        reads.append(lambda: device_index.load(bucket))
+
+    results = _read_all(reads)
+
     try:
-        account_key = "accounts/%s" % user_account.sanitised_name()
-        user_account = UserAccount.from_data(
-            ObjectStore.get_object_from_json(bucket, account_key))
+        user_account = UserAccount.from_bytes(results[0])
     except:
+        user_account = None
+
+    if user_account is None:
         raise LoginError("No account available with username '%s'" %
                          username)
 
-    if (not remember_device) and device_uid:
+    if use_device:
         # see if this device has been seen before
-        device_key = "devices/%s/%s" % (user_account.sanitised_name(),
-                                        device_uid)
-
-        try:
-            device_secret = ObjectStore.get_string_object(bucket,
-                                                          device_key)
-        except:
-            device_secret = None
+        device_secret = device_index.get_secret(device_uid,
+                                                devices=results[2],
+                                                bucket=bucket)
 
         if device_secret is None:
             raise LoginError(
@@ -118,103 +193,83 @@ def run(args):
     try:
         if device_secret:
             user_account.validate_password(password, otpcode,
-                                           device_secret=device_secret)
+                                           device_secret=device_secret,
+                                           source=source)
         elif remember_device:
             (device_secret, provisioning_uri) = \
                         user_account.validate_password(
                                     password, otpcode,
-                                    remember_device=True)
-
-            device_uid = str(uuid.uuid4())
-            device_key = "devices/%s/%s" % (user_account.sanitised_name(),
-                                            device_uid)
+                                    remember_device=True,
+                                    source=source)
 
-            assigned_device_uid = device_uid
+            assigned_device_uid = str(uuid.uuid4())
         else:
-            user_account.validate_password(password, otpcode)
+            user_account.validate_password(password, otpcode,
+                                           source=source)
     except:
         # don't leak info about why validation failed
         raise LoginError("The password or OTP code is incorrect")
 
     # the user is valid - load up the actual login session
-    login_session = LoginSession.from_data(
-                        ObjectStore.get_object_from_json(bucket,
-                                                         login_session_key))
+    login_session = LoginSession.from_bytes(results[1])
+
+    if login_session is None:
+        raise LoginError(
+            "The login request with short UID '%s' no longer exists" %
+            short_uid)
 
     # we must record the session against which this otpcode has
     # been validated. This is to stop us validating an otpcode more than
     # once (e.g. if the password and code have been intercepted).
     # Any sessions validated using the same code should be treated
     # as immediately suspcious
-    otproot = "otps/%s" % user_account.sanitised_name()
-    sessions = ObjectStore.get_all_strings(bucket, otproot)
-
-    utcnow = datetime.datetime.utcnow()
-
-    for session in sessions:
-        otpkey = "%s/%s" % (otproot, session)
-        otpstring = ObjectStore.get_string_object(bucket, otpkey)
-
-        (timestamp, code) = otpstring.split("|||")
-
-        # remove all codes that are more than 10 minutes old. The
-        # otp codes are only valid for 3 minutes, so no need to record
-        # codes that have been used that are older than that...
-        timedelta = utcnow - datetime.datetime.fromtimestamp(
-                                                    float(timestamp))
-
-        if timedelta.seconds > 600:
-            try:
-                ObjectStore.delete_object(bucket, otpkey)
-            except:
-                pass
-
-        elif code == str(otpcode):
-            # Low probability there is some recycling,
-            # but very suspicious if the code was validated within the last
-            # 10 minutes... (as 3 minute timeout of a code)
-            suspect_key = "sessions/%s/%s" % (
-                user_account.sanitised_name(), session)
-
-            suspect_session = None
-
-            try:
-                suspect_session = LoginSession.from_data(
-                        ObjectStore.get_object_from_json(bucket,
-                                                         suspect_key))
-            except:
-                pass
-
-            if suspect_session:
-                suspect_session.set_suspicious()
-                ObjectStore.set_object_from_json(bucket, suspect_key,
-                                                 suspect_session.to_data())
+    otp_index = OTPIndex(user_account.sanitised_name())
+    suspect_session_uid = otp_index.get_session(otpcode, bucket=bucket)
 
-            raise LoginError(
-                "Cannot authorise the login as the one-time-code "
-                "you supplied has already been used within the last 10 "
-                "minutes. The chance of this happening is really low, so "
-                "we are treating this as a suspicious event. You need to "
-                "try another code. Meanwhile, the other login that used "
-                "this code has been put into a 'suspicious' state.")
+    if suspect_session_uid is not None:
+        # Low probability there is some recycling,
+        # but very suspicious if the code was validated within the last
+        # 10 minutes... (as 3 minute timeout of a code)
+        suspect_key = "sessions/%s/%s" % (
+            user_account.sanitised_name(), suspect_session_uid)
+
+        suspect_session = None
+
+        try:
+            suspect_session = LoginSession.from_bytes(
+                    ObjectStore.get_object(bucket, suspect_key))
+        except:
+            pass
+
+        if suspect_session:
+            suspect_session.set_suspicious()
+            ObjectStore.set_object(bucket, suspect_key,
+                                   suspect_session.to_bytes())
 
-    # record the value and timestamp of when this otpcode was used
-    otpkey = "%s/%s" % (otproot, login_session.uuid())
-    otpstring = "%s|||%s" % (datetime.datetime.utcnow().timestamp(),
-                             otpcode)
+        raise LoginError(
+            "Cannot authorise the login as the one-time-code "
+            "you supplied has already been used within the last 10 "
+            "minutes. The chance of this happening is really low, so "
+            "we are treating this as a suspicious event. You need to "
+            "try another code. Meanwhile, the other login that used "
+            "this code has been put into a 'suspicious' state.")
 
-    ObjectStore.set_string_object(bucket, otpkey, otpstring)
+    # record that this otpcode has been used
+    otp_index.record(otpcode, login_session.uuid(), bucket=bucket)
 
     login_session.set_approved()
 
     # write this session back to the object store
-    ObjectStore.set_object_from_json(bucket, login_session_key,
-                                     login_session.to_data())
+    ObjectStore.set_object(bucket, login_session_key,
+                           login_session.to_bytes())
+
+    # the session now stays open until the login times out
+    SessionIndex(user_account.sanitised_name()).update(
+        login_session, user_account.login_timeout(), bucket=bucket)
 
     # save the device secret as everything has now worked
     if assigned_device_uid:
-        ObjectStore.set_string_object(bucket, device_key,
-                                      device_secret)
+        device_index.add(assigned_device_uid, device_secret, bucket=bucket)
 
     # finally, remove this from the list of requested logins
     try:
@@ -222,6 +277,9 @@ def run(args):
     except:
         pass
 
+    # remove the records of otpcodes that are too old to be reused
+    otp_index.prune(bucket=bucket)
+
     status = 0
     message = "Success: Status = %s" % login_session.status()
 
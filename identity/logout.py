@@ -2,7 +2,8 @@
 from Acquire.Service import create_return_value
 from Acquire.Service import login_to_service_account
 
-from Acquire.Identity import UserAccount, LoginSession
+from Acquire.Identity import UserAccount, LoginSession, Authorisation, \
+    SessionIndex
 
 from Acquire.ObjectStore import ObjectStore, string_to_bytes
 
@@ -36,11 +37,15 @@ def run(args):
     user_session_key = "sessions/%s/%s" % \
         (user_account.sanitised_name(), session_uid)
 
-    request_session_key = "requests/%s/%s" % (session_uid[:8], session_uid)
+    request_session_keys = [
+        "requests/%s/%s" % (session_uid[:8], user_account.sanitised_name()),
+        "requests/%s/%s" % (session_uid[:8], session_uid)]
 
-    login_session = LoginSession.from_data(
-                        ObjectStore.get_object_from_json(bucket,
-                                                         user_session_key))
+    try:
+        login_session = LoginSession.from_bytes(
+                            ObjectStore.get_object(bucket, user_session_key))
+    except:
+        login_session = None
 
     if login_session:
         # get the signing certificate from the login session and
@@ -56,6 +61,11 @@ def run(args):
         if login_session.is_approved():
             login_session.logout()
 
+            # drop this session from this process's cache of verified
+            # sessions (other services look the session up again for
+            # any authorisation signed after they last looked it up)
+            Authorisation.invalidate_session(session_uid=session_uid)
+
     # only save sessions that were successfully approved
     if login_session:
         if login_session.is_logged_out():
@@ -63,18 +73,22 @@ def run(args):
                                     (user_account.sanitised_name(),
                                      session_uid)
 
-            ObjectStore.set_object_from_json(bucket, expired_session_key,
-                                             login_session.to_data())
+            ObjectStore.set_object(bucket, expired_session_key,
+                                   login_session.to_bytes())
 
     try:
         ObjectStore.delete_object(bucket, user_session_key)
     except:
         pass
 
-    try:
-        ObjectStore.delete_object(bucket, request_session_key)
-    except:
-        pass
+    for request_session_key in request_session_keys:
+        try:
+            ObjectStore.delete_object(bucket, request_session_key)
+        except:
+            pass
+
+    SessionIndex(user_account.sanitised_name()).remove(session_uid,
+                                                       bucket=bucket)
 
     status = 0
     message = "Successfully logged out"
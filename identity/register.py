@@ -49,8 +49,7 @@ def run(args):
     account_key = "accounts/%s" % user_account.sanitised_name()
 
     try:
-        existing_data = ObjectStore.get_object_from_json(bucket,
-                                                         account_key)
+        existing_data = ObjectStore.get_object(bucket, account_key)
     except:
         existing_data = None
 
@@ -59,8 +58,8 @@ def run(args):
 
     if existing_data is None:
         # save the new account details
-        ObjectStore.set_object_from_json(bucket, account_key,
-                                         user_account.to_data())
+        ObjectStore.set_object(bucket, account_key,
+                               user_account.to_bytes())
 
         # need to update the "whois" database with the uuid of this user
         ObjectStore.set_string_object(bucket,
@@ -80,7 +79,7 @@ def run(args):
         if old_password != password:
             # this is a change of password request - validate that
             # the existing password unlocks the existing key
-            user_account = UserAccount.from_data(existing_data)
+            user_account = UserAccount.from_bytes(existing_data)
 
             testkey = PrivateKey.read_bytes(user_account.private_key(),
                                             old_password)
@@ -95,8 +94,8 @@ def run(args):
             user_account.set_keys(privkey, pubkey, new_secret)
 
             # save the new account details
-            ObjectStore.set_object_from_json(bucket, account_key,
-                                             user_account.to_data())
+            ObjectStore.set_object(bucket, account_key,
+                                   user_account.to_bytes())
 
             message = "Updated the password for '%s'" % username
         else:
@@ -1,81 +1,30 @@
 
 from Acquire.Service import login_to_service_account, get_service_info
 from Acquire.Service import create_return_value
+from Acquire.Service import RateLimiter, ObjectStoreRateStore
 
 from Acquire.ObjectStore import ObjectStore, string_to_bytes
 
-from Acquire.Identity import UserAccount, LoginSession
+from Acquire.Identity import UserAccount, LoginSession, SessionIndex
 
 from Acquire.Crypto import PublicKey
 
 
-class InvalidLoginError(Exception):
-    pass
-
+# Limit the number of login requests for each user from each source
+# address (shared by all instances of this function) to an average of
+# one every 30 seconds, with bursts of up to 10 requests. This is
+# keyed by source as well as user, so that someone else cannot use up
+# the requests of a user
+_user_limiter = RateLimiter(rate=1.0 / 30.0, burst=10,
+                            store=ObjectStoreRateStore("request_login"))
 
-def prune_expired_sessions(bucket, user_account, root, sessions, log=[]):
-    """This function will scan through all open requests and
-       login sessions and will prune away old, expired or otherwise
-       weird sessions. It will also use the ipaddress of the source
-       to rate limit or blacklist sources"""
+# The number of times to try to create a request whose short UID does
+# not clash with another open request of the same user
+max_request_attempts = 5
 
-    for name in sessions:
-        key = "%s/%s" % (root, name)
-        request_key = "requests/%s/%s" % (name[:8], name)
 
-        try:
-            session = ObjectStore.get_object_from_json(bucket, key)
-        except:
-            log.append("Session %s does not exist!" % name)
-            session = None
-
-        if session:
-            should_delete = False
-            should_logout = False
-
-            try:
-                session = LoginSession.from_data(session)
-                if session.is_approved() or session.is_suspicious():
-                    if session.hours_since_creation() > user_account \
-                                                            .login_timeout():
-                        should_logout = True
-                        should_delete = True
-                else:
-                    if session.hours_since_creation() > user_account \
-                                                    .login_request_timeout():
-                        log.append("Expired login request: %s > %s" %
-                                   (session.hours_since_creation(),
-                                    user_account.login_request_timeout()))
-                        should_delete = True
-            except Exception as e:
-                # this is corrupt - delete it
-                log.append("Deleting session as corrupt? %s" % str(e))
-                should_delete = True
-
-            if should_logout:
-                # auto-logout expired sessions
-                log.append("Auto-logging out expired session '%s'" % key)
-                session.logout()
-                expire_session_key = "expired_sessions/%s/%s" % \
-                                     (user_account.sanitised_name(),
-                                      session.uuid())
-
-                ObjectStore.set_object_from_json(bucket, expire_session_key,
-                                                 session.to_data())
-
-            # now delete any expired sessions
-            if should_delete:
-                log.append("Deleting expired session '%s'" % key)
-
-                try:
-                    ObjectStore.delete_object(bucket, key)
-                except:
-                    pass
-
-                try:
-                    ObjectStore.delete_object(bucket, request_key)
-                except:
-                    pass
+class InvalidLoginError(Exception):
+    pass
 
 
 def run(args):
@@ -129,8 +78,7 @@ def run(args):
     account_key = "accounts/%s" % user_account.sanitised_name()
 
     try:
-        existing_data = ObjectStore.get_object_from_json(bucket,
-                                                         account_key)
+        existing_data = ObjectStore.get_object(bucket, account_key)
     except:
         existing_data = None
 
@@ -138,35 +86,74 @@ def run(args):
         raise InvalidLoginError("There is no user with name '%s'" %
                                 username)
 
-    user_account = UserAccount.from_data(existing_data)
+    user_account = UserAccount.from_bytes(existing_data)
     user_uid = user_account.uid()
 
-    # first, make sure that the user doens't have too many open
-    # login sessions at once - this prevents denial of service
-    user_session_root = "sessions/%s" % user_account.sanitised_name()
+    # stop a burst of requests for the same user from forcing
+    # unbounded session writes and listings. This is only checked
+    # for users that exist, so that requests for unknown usernames
+    # cannot create rate limit records
+    try:
+        source = args["source_address"]
+    except:
+        source = None
 
-    open_sessions = ObjectStore.get_all_object_names(bucket,
-                                                     user_session_root)
+    if source is None:
+        # this is logged and allowed by the limiter
+        limit_key = None
+    else:
+        limit_key = "%s|%s" % (user_account.sanitised_name(), source)
 
-    # take the opportunity to prune old user login sessions
-    prune_expired_sessions(bucket, user_account,
-                           user_session_root, open_sessions)
+    _user_limiter.check(limit_key)
 
-    # this is the key for the session in the object store
-    user_session_key = "%s/%s" % (user_session_root,
-                                  login_session.uuid())
+    # take the opportunity to prune old user login sessions. Only a
+    # bounded number of expired sessions are pruned per request, and
+    # the index means that the other sessions are not loaded
+    session_index = SessionIndex(user_account.sanitised_name())
 
-    ObjectStore.set_object_from_json(bucket, user_session_key,
-                                     login_session.to_data())
+    if not session_index.is_migrated(bucket=bucket):
+        session_index.migrate(user_account, bucket=bucket)
+
+    session_index.prune(user_account, bucket=bucket)
 
     # we will record a pointer to the request using the short
-    # UUID. This way we can give a simple URL. If there is a clash,
-    # then we will use the username provided at login to find the
-    # correct request from a much smaller pool (likely < 3)
-    request_key = "requests/%s/%s" % (login_session.short_uuid(),
-                                      login_session.uuid())
+    # UUID and the username. This way we can give a simple URL, and
+    # login can find the request with a single read. The short UUID
+    # must not clash with another open request from the same user,
+    # so generate a new UUID if it does
+    for i in range(0, max_request_attempts):
+        request_key = "requests/%s/%s" % (login_session.short_uuid(),
+                                          user_account.sanitised_name())
+
+        try:
+            ObjectStore.get_string_object(bucket, request_key)
+            clash = True
+        except:
+            clash = False
+
+        if not clash:
+            break
+
+        login_session.regenerate_uuid()
+
+    if clash:
+        raise InvalidLoginError(
+            "Unable to create a login request with a unique short UID. "
+            "Please try again later.")
+
+    # this is the key for the session in the object store
+    user_session_key = "sessions/%s/%s" % (user_account.sanitised_name(),
+                                           login_session.uuid())
+
+    ObjectStore.set_object(bucket, user_session_key,
+                           login_session.to_bytes())
+
+    session_index.add(login_session, user_account.login_request_timeout(),
+                      bucket=bucket)
 
-    ObjectStore.set_string_object(bucket, request_key, user_account.name())
+    # the pointer is written last, in a single write, so that it only
+    # ever refers to a session that exists
+    ObjectStore.set_string_object(bucket, request_key, login_session.uuid())
 
     status = 0
     # the login URL is the URL of this identity service plus the
@@ -5,7 +5,92 @@ import json
 
 from Acquire.Service import unpack_arguments, get_service_private_key
 from Acquire.Service import create_return_value, pack_return_value, \
-                            start_profile, end_profile
+                            start_profile, end_profile, run_batch, \
+                            warmup_service, RateLimiter, get_source_address
+
+# Limit the number of calls from each source IP address. This is checked
+# before the arguments are decrypted, so that a burst of calls from
+# one source cannot use up the CPU of this function. This allows an
+# average of 2 calls a second, with bursts of up to 60 calls. Calls
+# whose source is not known (e.g. the header is missing) are logged
+# and allowed, rather than sharing a single bucket
+_source_limiter = RateLimiter(rate=2, burst=60)
+
+# The modules that implement the functions of this service
+_handlers = ["root", "request_login", "get_keys", "get_status", "login",
+             "logout", "register", "setup", "wait_for_status", "whois",
+             "whois_many", "test"]
+
+
+def route_function(function, args, source=None):
+    """Function that routes the passed call to the function
+       that implements it, returning the result. 'source' is the
+       address of the caller, which is passed to the functions in
+       args["source_address"] (replacing anything sent by the caller)
+    """
+    args["source_address"] = source
+
+    if function is None:
+        from root import run as _root
+        result = _root(args)
+    elif function == "request_login":
+        from request_login import run as _request_login
+        result = _request_login(args)
+    elif function == "get_keys":
+        from get_keys import run as _get_keys
+        result = _get_keys(args)
+    elif function == "get_status":
+        from get_status import run as _get_status
+        result = _get_status(args)
+    elif function == "login":
+        from login import run as _login
+        result = _login(args)
+    elif function == "logout":
+        from logout import run as _logout
+        result = _logout(args)
+    elif function == "register":
+        from register import run as _register
+        result = _register(args)
+    elif function == "request_login":
+        from request_login import run as _request_login
+        result = _request_login(args)
+    elif function == "setup":
+        from setup import run as _setup
+        result = _setup(args)
+    elif function == "wait_for_status":
+        from wait_for_status import run as _wait_for_status
+        result = _wait_for_status(args)
+    elif function == "whois":
+        from whois import run as _whois
+        result = _whois(args)
+    elif function == "whois_many":
+        from whois_many import run as _whois_many
+        result = _whois_many(args)
+    elif function == "test":
+        from test import run as _test
+        result = _test(args)
+    elif function == "warmup":
+        result = warmup(args)
+    else:
+        result = {"status": -1,
+                  "message": "Unknown function '%s'" % function}
+
+    return result
+
+
+def warmup(args=None):
+    """Log into the service account, decrypt the service keys, load
+       the trusted services and import all of the handlers, so that
+       this function is ready to handle calls. This can be called
+       by a scheduled ping after the function has been deployed.
+       Anyone can call this, so it only returns whether or not the
+       function is ready. The timings and any errors are written to
+       the function's log
+    """
+    if warmup_service(_handlers)["ready"]:
+        return create_return_value(0, "Success")
+    else:
+        return create_return_value(-1, "The service is not ready")
 
 
 async def handler(ctx, data=None, loop=None):
@@ -17,6 +102,14 @@ async def handler(ctx, data=None, loop=None):
     except:
         pass
 
+    source = get_source_address(ctx)
+
+    if not _source_limiter.allow(source):
+        result = {"status": -1,
+                  "message": "Too many requests from this address. "
+                             "Please wait and try again."}
+        return json.dumps(result)
+
     try:
         args = unpack_arguments(data, get_service_private_key)
     except Exception as e:
@@ -33,43 +126,26 @@ async def handler(ctx, data=None, loop=None):
     except:
         function = None
 
+    if function == "batch":
+        # each call in the batch is charged, not just the batch itself
+        try:
+            cost = len(args["calls"]) - 1
+        except:
+            cost = 0
+
+        if cost > 0 and not _source_limiter.allow(source, cost):
+            result = {"status": -1,
+                      "message": "Too many requests from this address. "
+                                 "Please wait and try again."}
+            return pack_return_value(result, args)
+
     try:
-        if function is None:
-            from root import run as _root
-            result = _root(args)
-        elif function == "request_login":
-            from request_login import run as _request_login
-            result = _request_login(args)
-        elif function == "get_keys":
-            from get_keys import run as _get_keys
-            result = _get_keys(args)
-        elif function == "get_status":
-            from get_status import run as _get_status
-            result = _get_status(args)
-        elif function == "login":
-            from login import run as _login
-            result = _login(args)
-        elif function == "logout":
-            from logout import run as _logout
-            result = _logout(args)
-        elif function == "register":
-            from register import run as _register
-            result = _register(args)
-        elif function == "request_login":
-            from request_login import run as _request_login
-            result = _request_login(args)
-        elif function == "setup":
-            from setup import run as _setup
-            result = _setup(args)
-        elif function == "whois":
-            from whois import run as _whois
-            result = _whois(args)
-        elif function == "test":
-            from test import run as _test
-            result = _test(args)
+        if function == "batch":
+            result = run_batch(
+                        args, lambda function, call_args:
+                        route_function(function, call_args, source))
         else:
-            result = {"status": -1,
-                      "message": "Unknown function '%s'" % function}
+            result = route_function(function, args, source)
 
     except Exception as e:
         result = {"status": -1,
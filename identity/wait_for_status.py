@@ -0,0 +1,86 @@
+
+import time
+
+from Acquire.Service import login_to_service_account
+from Acquire.Service import create_return_value
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Identity import UserAccount
+
+from whois import get_login_session
+
+# The maximum number of seconds that a call can wait for the status
+# to change. This must be less than the timeout of the function. The
+# OCI object store cannot notify us of changes, so the wait polls the
+# etag of the session, and each waiting client holds a function slot
+# for the whole of the wait. This is kept short so that a few clients
+# waiting to log in cannot use up all of the function slots
+max_timeout = 10
+
+
+def run(args):
+    """This function waits until the status of the login session with
+       passed UID is no longer equal to the passed "session_status",
+       or until "timeout" seconds have passed. This returns the current
+       status of the session. This lets a user who is waiting to log in
+       find out as soon as the login is approved, without having to
+       poll get_status
+    """
+
+    session_uid = args["session_uid"]
+    username = args["username"]
+
+    try:
+        session_status = args["session_status"]
+    except:
+        session_status = None
+
+    try:
+        timeout = float(args["timeout"])
+    except:
+        timeout = max_timeout
+
+    timeout = max(0.0, min(timeout, max_timeout))
+
+    # generate a sanitised version of the username
+    user_account = UserAccount(username)
+
+    bucket = login_to_service_account()
+
+    user_session_key = "sessions/%s/%s" % \
+        (user_account.sanitised_name(), session_uid)
+
+    end_time = time.monotonic() + timeout
+
+    try:
+        data = ObjectStore.get_object(bucket, user_session_key)
+    except:
+        data = None
+
+    login_session = get_login_session(bucket, user_account, session_uid)
+
+    while login_session.status() == session_status:
+        remaining = end_time - time.monotonic()
+
+        if remaining <= 0:
+            break
+
+        # wait for the session to change. When the user logs out, the
+        # session is moved to the expired sessions
+        data = ObjectStore.wait_for_change(bucket, user_session_key,
+                                           data, remaining)
+
+        login_session = get_login_session(bucket, user_account,
+                                          session_uid)
+
+        if data is None:
+            break
+
+    return_value = create_return_value(
+                    0, "Success: Status = %s" % login_session.status())
+
+    if login_session.status():
+        return_value["session_status"] = login_session.status()
+
+    return return_value
@@ -15,6 +15,51 @@ class InvalidSessionError(Exception):
     pass
 
 
+def get_username(bucket, user_uid):
+    """Return the username of the user with UID 'user_uid'"""
+    uid_key = "whois/%s" % user_uid
+
+    try:
+        return ObjectStore.get_string_object(bucket, uid_key)
+    except:
+        raise WhoisLookupError(
+            "Cannot find an account for user_uid '%s'" % user_uid)
+
+
+def get_login_session(bucket, user_account, session_uid):
+    """Return the login session with UID 'session_uid' of the
+       passed user, looking in both the current and the expired
+       sessions
+    """
+    user_session_key = "sessions/%s/%s" % \
+        (user_account.sanitised_name(), session_uid)
+
+    try:
+        login_session = LoginSession.from_bytes(
+                            ObjectStore.get_object(
+                                bucket, user_session_key))
+    except:
+        login_session = None
+
+    if login_session is None:
+        user_session_key = "expired_sessions/%s/%s" % \
+                                (user_account.sanitised_name(),
+                                 session_uid)
+
+        try:
+            login_session = LoginSession.from_bytes(
+                                ObjectStore.get_object(
+                                    bucket, user_session_key))
+        except:
+            login_session = None
+
+    if login_session is None:
+        raise InvalidSessionError(
+                "Cannot find the session '%s'" % session_uid)
+
+    return login_session
+
+
 def run(args):
     """This function will allow anyone to query who matches
        the passed UID or username (map from one to the other)"""
@@ -57,9 +102,8 @@ def run(args):
         user_key = "accounts/%s" % user_account.sanitised_name()
 
         try:
-            user_account = UserAccount.from_data(
-                                ObjectStore.get_object_from_json(bucket,
-                                                                 user_key))
+            user_account = UserAccount.from_bytes(
+                                ObjectStore.get_object(bucket, user_key))
         except:
             raise WhoisLookupError(
                 "Cannot find an account for name '%s'" % username)
@@ -69,14 +113,7 @@ def run(args):
     elif username is None:
         # look up the username from the uuid
         bucket = login_to_service_account()
-
-        uid_key = "whois/%s" % user_uid
-
-        try:
-            username = ObjectStore.get_string_object(bucket, uid_key)
-        except:
-            raise WhoisLookupError(
-                "Cannot find an account for user_uid '%s'" % user_uid)
+        username = get_username(bucket, user_uid)
 
     else:
         raise WhoisLookupError(
@@ -89,28 +126,7 @@ def run(args):
         if user_account is None:
             user_account = UserAccount(username)
 
-        user_session_key = "sessions/%s/%s" % \
-            (user_account.sanitised_name(), session_uid)
-
-        try:
-            login_session = LoginSession.from_data(
-                                ObjectStore.get_object_from_json(
-                                    bucket, user_session_key))
-        except:
-            login_session = None
-
-        if login_session is None:
-            user_session_key = "expired_sessions/%s/%s" % \
-                                    (user_account.sanitised_name(),
-                                     session_uid)
-
-            login_session = LoginSession.from_data(
-                                ObjectStore.get_object_from_json(
-                                    bucket, user_session_key))
-
-        if login_session is None:
-            raise InvalidSessionError(
-                    "Cannot find the session '%s'" % session_uid)
+        login_session = get_login_session(bucket, user_account, session_uid)
 
         if login_session.is_approved():
             public_key = login_session.public_key()
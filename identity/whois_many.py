@@ -0,0 +1,102 @@
+
+from concurrent.futures import ThreadPoolExecutor
+
+from Acquire.Service import login_to_service_account
+from Acquire.Service import create_return_value
+
+from Acquire.Identity import UserAccount
+
+from whois import get_username, get_login_session
+
+# The maximum number of sessions that can be looked up in one call
+max_sessions = 100
+
+# The maximum number of sessions that are looked up at the same time
+max_workers = 8
+
+
+class WhoisManyLookupError(Exception):
+    pass
+
+
+def _lookup(bucket, user_uid, session_uid):
+    """Return the whois information for the session 'session_uid'
+       of the user with UID 'user_uid'
+    """
+    result = {"user_uid": str(user_uid), "session_uid": str(session_uid)}
+
+    try:
+        username = get_username(bucket, user_uid)
+        result["username"] = str(username)
+
+        login_session = get_login_session(bucket, UserAccount(username),
+                                          session_uid)
+
+        if login_session.is_approved():
+            result["public_key"] = login_session.public_key().to_data()
+            result["public_cert"] = \
+                login_session.public_certificate().to_data()
+
+        elif login_session.is_logged_out():
+            result["public_cert"] = \
+                login_session.public_certificate().to_data()
+            result["logout_timestamp"] = \
+                login_session.logout_time().timestamp()
+
+        else:
+            raise WhoisManyLookupError(
+                    "You cannot get the keys for a session "
+                    "for which the user has not logged in!")
+
+        result["login_status"] = str(login_session.status())
+    except Exception as e:
+        result["error"] = str(e)
+
+    return result
+
+
+def run(args):
+    """This function looks up the public certificate and logout time
+       of many login sessions in one call. The sessions are passed as
+       a list of [user_uid, session_uid] pairs in "sessions". The
+       results are returned in the same order. A session that cannot
+       be found has its "error" key set, rather than failing the
+       whole call
+    """
+
+    try:
+        sessions = args["sessions"]
+    except:
+        sessions = None
+
+    if sessions is None:
+        sessions = []
+
+    if len(sessions) > max_sessions:
+        raise WhoisManyLookupError(
+            "You cannot look up more than %d sessions in one call "
+            "(requested %d)" % (max_sessions, len(sessions)))
+
+    sessions = [(str(user_uid), str(session_uid))
+                for (user_uid, session_uid) in sessions]
+
+    bucket = login_to_service_account()
+
+    # the same session may be requested more than once
+    unique = list(dict.fromkeys(sessions))
+
+    if len(unique) > 1:
+        with ThreadPoolExecutor(
+                max_workers=min(len(unique), max_workers)) as pool:
+            results = list(pool.map(
+                                lambda s: _lookup(bucket, s[0], s[1]),
+                                unique))
+    else:
+        results = [_lookup(bucket, s[0], s[1]) for s in unique]
+
+    results = dict(zip(unique, results))
+
+    return_value = create_return_value(0, "Success")
+    return_value["results"] = [results[s] for s in sessions]
+
+    return return_value
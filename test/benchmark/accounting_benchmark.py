@@ -0,0 +1,320 @@
+
+"""
+Throughput benchmark for the accounting code. This drives Ledger.perform,
+Ledger.receipt, Ledger.refund and Account.balance with a synthetic
+workload, and reports the operations per second, the p50/p99 latency
+and the number of object store calls per operation.
+
+The benchmark runs against the testing object store backend. Pass a
+directory on a tmpfs (e.g. /dev/shm, the default if it exists) to
+take the disk out of the measurements. Months of history can be
+fabricated before the timed runs using freezegun to travel back in time.
+
+Example;
+
+    python test/benchmark/accounting_benchmark.py --accounts 20 \
+        --transactions 500 --threads 4 --history-days 60
+"""
+
+import argparse
+import datetime
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from Acquire.Accounting import Accounts, Transaction, Ledger, Receipt, \
+                               Refund
+from Acquire.Identity import Authorisation
+from Acquire.ObjectStore import ObjectStore
+from Acquire.Service import login_to_service_account
+
+# the object store calls made, keyed by (operation, method)
+_counts = {}
+_counts_lock = threading.Lock()
+
+# the operation currently being run by each thread
+_current = threading.local()
+
+# the latencies (in seconds) of each call of each operation
+_latencies = {}
+
+
+def instrument_object_store():
+    """Wrap all of the ObjectStore functions so that every call is counted
+       against the operation that is being run by the calling thread. The
+       functions on the ObjectStore class are wrapped (rather than the
+       backend) as the backend is reset every time the service logs into
+       the testing object store
+    """
+    def _wrap(method, function):
+        def _counted(*args, **kwargs):
+            key = (getattr(_current, "operation", None), method)
+
+            with _counts_lock:
+                _counts[key] = _counts.get(key, 0) + 1
+
+            return function(*args, **kwargs)
+
+        return staticmethod(_counted)
+
+    for method in list(vars(ObjectStore)):
+        if not method.startswith("_"):
+            setattr(ObjectStore, method,
+                    _wrap(method, getattr(ObjectStore, method)))
+
+
+def timed(operation, function, *args, **kwargs):
+    """Call 'function', recording the latency against 'operation' and
+       counting the object store calls that it makes
+    """
+    _current.operation = operation
+
+    try:
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        _latencies.setdefault(operation, []).append(
+            time.perf_counter() - start)
+        return result
+    finally:
+        _current.operation = None
+
+
+def percentile(values, p):
+    """Return the p'th percentile of the passed (sorted) values"""
+    if len(values) == 0:
+        return 0
+
+    return values[min(len(values)-1, int(round(p * (len(values)-1) / 100)))]
+
+
+def run_phase(operation, tasks, threads):
+    """Run all of the passed tasks (zero-argument functions) using
+       'threads' threads, returning the wall-clock time taken and
+       the results
+    """
+    start = time.perf_counter()
+
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [pool.submit(timed, operation, task) for task in tasks]
+            results = [future.result() for future in futures]
+    else:
+        results = [timed(operation, task) for task in tasks]
+
+    return (time.perf_counter() - start, results)
+
+
+def report(operation, wall_time):
+    """Print the report for the passed operation"""
+    latencies = sorted(_latencies.get(operation, []))
+    n = len(latencies)
+
+    if n == 0:
+        print("%-10s  (no operations)" % operation)
+        return
+
+    calls = {}
+    for ((op, method), count) in _counts.items():
+        if op == operation:
+            calls[method] = count
+
+    total_calls = sum(calls.values())
+
+    print("%-10s %7d ops %9.1f ops/sec  p50 %8.2f ms  p99 %8.2f ms  "
+          "%7.1f objstore calls/op" %
+          (operation, n, n / wall_time, 1000*percentile(latencies, 50),
+           1000*percentile(latencies, 99), total_calls / n))
+
+    for method in sorted(calls, key=lambda m: -calls[m]):
+        print("            %-22s %8.2f/op" % (method, calls[method] / n))
+
+
+def create_accounts(num_accounts, bucket):
+    """Create the accounts used by the benchmark"""
+    accounts = Accounts("benchmark")
+
+    return [accounts.create_account("account_%06d" % i,
+                                    "Benchmark account %d" % i,
+                                    overdraft_limit=1e12, bucket=bucket)
+            for i in range(0, num_accounts)]
+
+
+def choose_pair(accounts, hot_accounts):
+    """Return a random (debit, credit) pair of different accounts. If
+       'hot_accounts' is set then the debit account is always chosen
+       from the first 'hot_accounts' accounts, to create contention
+    """
+    if hot_accounts:
+        debit = random.choice(accounts[0:hot_accounts])
+    else:
+        debit = random.choice(accounts)
+
+    credit = debit
+    while credit is debit:
+        credit = random.choice(accounts)
+
+    return (debit, credit)
+
+
+def fabricate_history(accounts, days, per_day, bucket):
+    """Use freezegun to travel back in time and fabricate 'days' days of
+       history, with 'per_day' transactions on each day
+    """
+    from freezegun import freeze_time
+
+    now = datetime.datetime.now()
+
+    for day in range(days, 0, -1):
+        for i in range(0, per_day):
+            when = now - datetime.timedelta(days=day) + \
+                datetime.timedelta(seconds=(i+1) * 86000 / (per_day+1))
+
+            with freeze_time(when):
+                (debit, credit) = choose_pair(accounts, None)
+                Ledger.perform(Transaction(random.randint(1, 100),
+                                           "history %d.%d" % (day, i)),
+                               debit, credit, Authorisation(),
+                               is_provisional=False, bucket=bucket)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Benchmark the throughput of the accounting "
+                            "code using a synthetic workload",
+                prog="accounting_benchmark")
+
+    parser.add_argument("--accounts", type=int, default=10,
+                        help="Number of accounts to create (default 10)")
+    parser.add_argument("--transactions", type=int, default=200,
+                        help="Number of transactions to perform "
+                             "(default 200)")
+    parser.add_argument("--provisional", type=float, default=0.5,
+                        help="Fraction of transactions that are provisional "
+                             "and then receipted (default 0.5)")
+    parser.add_argument("--refunds", type=float, default=0.2,
+                        help="Fraction of direct transactions that are "
+                             "refunded (default 0.2)")
+    parser.add_argument("--balances", type=int, default=None,
+                        help="Number of balance queries (default is the "
+                             "number of transactions)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Number of concurrent threads (default 1)")
+    parser.add_argument("--hot-accounts", type=int, default=0,
+                        help="Debit all transactions from this many 'hot' "
+                             "accounts to create contention (default 0, "
+                             "meaning use all accounts)")
+    parser.add_argument("--history-days", type=int, default=0,
+                        help="Number of days of history to fabricate before "
+                             "the benchmark (default 0)")
+    parser.add_argument("--history-per-day", type=int, default=5,
+                        help="Number of transactions per day of history "
+                             "(default 5)")
+    parser.add_argument("--dir", type=str, default=None,
+                        help="Directory for the testing object store "
+                             "(default is a temporary directory, on "
+                             "/dev/shm if available)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the random number generator")
+
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.accounts < 2:
+        print("You need at least two accounts!")
+        return 1
+
+    if args.dir:
+        directory = args.dir
+        cleanup = False
+    else:
+        try:
+            directory = tempfile.mkdtemp(prefix="acquire_bench_",
+                                         dir="/dev/shm")
+        except:
+            directory = tempfile.mkdtemp(prefix="acquire_bench_")
+
+        cleanup = True
+
+    try:
+        bucket = login_to_service_account(directory)
+
+        print("Creating %d accounts in %s" % (args.accounts, directory))
+
+        if args.history_days > 0:
+            # the accounts must exist before the start of the history
+            from freezegun import freeze_time
+
+            with freeze_time(datetime.datetime.now() -
+                             datetime.timedelta(days=args.history_days+1)):
+                accounts = create_accounts(args.accounts, bucket)
+        else:
+            accounts = create_accounts(args.accounts, bucket)
+
+        if args.history_days > 0:
+            print("Fabricating %d days of history (%d transactions "
+                  "per day)" % (args.history_days, args.history_per_day))
+            fabricate_history(accounts, args.history_days,
+                              args.history_per_day, bucket)
+
+        instrument_object_store()
+
+        def _perform(is_provisional):
+            (debit, credit) = choose_pair(accounts, args.hot_accounts)
+            return Ledger.perform(Transaction(random.randint(1, 100),
+                                              "benchmark"),
+                                  debit, credit, Authorisation(),
+                                  is_provisional=is_provisional,
+                                  bucket=bucket)
+
+        tasks = []
+        for i in range(0, args.transactions):
+            is_provisional = (random.random() < args.provisional)
+            tasks.append(lambda p=is_provisional: _perform(p))
+
+        walls = {}
+        (walls["perform"], records) = run_phase("perform", tasks,
+                                                args.threads)
+
+        provisional = [r for r in records if r.is_provisional()]
+        direct = [r for r in records if not r.is_provisional()]
+
+        tasks = [lambda r=r: Ledger.receipt(
+                    Receipt(r.credit_note(), Authorisation()), bucket=bucket)
+                 for r in provisional]
+        (walls["receipt"], _) = run_phase("receipt", tasks, args.threads)
+
+        tasks = [lambda r=r: Ledger.refund(
+                    Refund(r.credit_note(), Authorisation()), bucket=bucket)
+                 for r in direct if random.random() < args.refunds]
+        (walls["refund"], _) = run_phase("refund", tasks, args.threads)
+
+        num_balances = args.balances
+        if num_balances is None:
+            num_balances = args.transactions
+
+        tasks = [lambda a=random.choice(accounts): a.balance(bucket=bucket)
+                 for i in range(0, num_balances)]
+        (walls["balance"], _) = run_phase("balance", tasks, args.threads)
+
+        print("\nResults (%d threads, %d accounts, %d hot accounts, "
+              "%d days of history)" % (args.threads, args.accounts,
+                                       args.hot_accounts, args.history_days))
+
+        for operation in ["perform", "receipt", "refund", "balance"]:
+            report(operation, walls[operation])
+    finally:
+        if cleanup:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,12 @@
 
 import pytest
 
-from Acquire.Accounting import Accounts
+from Acquire.Accounting import Accounts, AccountsIndex, AccountError, \
+                               InsufficientFundsError, Ledger, Transaction
+
+from Acquire.Identity import Authorisation
+
+from Acquire.ObjectStore import ObjectStore
 
 from Acquire.Service import login_to_service_account
 
@@ -44,3 +49,137 @@ def test_accounts(bucket):
             assert(name == account.name())
 
             assert(account == created_accounts[name])
+
+
+def test_get_accounts(bucket):
+    accounts = Accounts(group="bulk")
+
+    account_names = ["account %d" % i for i in range(0, 10)]
+
+    created_accounts = []
+
+    for name in account_names:
+        created_accounts.append(accounts.create_account(
+                                    name,
+                                    description="Account: %s" % name,
+                                    bucket=bucket))
+
+    loaded_accounts = accounts.get_accounts(account_names, bucket=bucket)
+
+    assert(len(loaded_accounts) == len(account_names))
+
+    for (account, created) in zip(loaded_accounts, created_accounts):
+        assert(account == created)
+        assert(account.name() == created.name())
+
+    all_accounts = accounts.get_accounts(bucket=bucket)
+    assert(len(all_accounts) == len(account_names))
+
+    # changing the overdraft limit must invalidate the cached account
+    account = loaded_accounts[0]
+    account.set_overdraft_limit(100, bucket=bucket)
+
+    account = accounts.get_account(account.name(), bucket=bucket)
+    assert(account.get_overdraft_limit() == 100)
+
+    with pytest.raises(AccountError):
+        accounts.get_accounts(["account 0", "missing"], bucket=bucket)
+
+
+def test_stale_overdraft_limit(bucket):
+    accounts = Accounts(group="stale limit")
+
+    debtor = accounts.create_account("debtor", "debtor", overdraft_limit=100,
+                                     bucket=bucket)
+    creditor = accounts.create_account("creditor", "creditor",
+                                       bucket=bucket)
+
+    # load the account so that it is cached by this process
+    debtor = accounts.get_account("debtor", bucket=bucket)
+    assert(debtor.get_overdraft_limit() == 100)
+
+    # another function removes the overdraft
+    data = ObjectStore.get_object_from_json(bucket, debtor._key())
+    data["overdraft_limit"] = "0"
+    ObjectStore.set_object_from_json(bucket, debtor._key(), data)
+
+    # the debit must be checked against the new limit
+    with pytest.raises(InsufficientFundsError):
+        Ledger.perform(Transaction(50, "stale limit"), debtor, creditor,
+                       Authorisation(), is_provisional=False, bucket=bucket)
+
+    assert(debtor.get_overdraft_limit() == 0)
+
+
+def test_accounts_index(bucket):
+    accounts = Accounts(group="indexed")
+
+    account_names = ["alpha %d" % i for i in range(0, 5)] + \
+                    ["beta %d" % i for i in range(0, 5)]
+
+    for name in account_names:
+        accounts.create_account(name, description="Account: %s" % name,
+                                bucket=bucket)
+
+    names = accounts.list_accounts(bucket=bucket)
+    assert(names == sorted(account_names))
+
+    names = accounts.list_accounts(bucket=bucket, prefix="beta")
+    assert(names == ["beta %d" % i for i in range(0, 5)])
+
+    pages = []
+    start_after = None
+
+    while True:
+        page = accounts.list_accounts(bucket=bucket, start_after=start_after,
+                                      max_count=3)
+        if len(page) == 0:
+            break
+
+        pages += page
+        start_after = page[-1]
+
+    assert(pages == sorted(account_names))
+
+    index = AccountsIndex(group="indexed")
+
+    for name in account_names:
+        account = accounts.get_account(name, bucket=bucket)
+        assert(index.get(name, bucket=bucket) == account.uid())
+
+    assert(index.get("missing", bucket=bucket) is None)
+
+
+def test_legacy_accounts_index(bucket):
+    accounts = Accounts(group="legacy")
+
+    account = accounts.create_account("legacy account",
+                                      description="Legacy account",
+                                      bucket=bucket)
+
+    # simulate a group that was created before accounts were indexed
+    index = AccountsIndex(group="legacy")
+    ObjectStore.delete_all_objects(bucket, index._root())
+    assert(not index.is_migrated(bucket=bucket))
+
+    assert(accounts.list_accounts(bucket=bucket) == ["legacy account"])
+    assert(index.is_migrated(bucket=bucket))
+    assert(index.get("legacy account", bucket=bucket) == account.uid())
+
+
+def test_legacy_accounts_index_create(bucket):
+    accounts = Accounts(group="legacy create")
+
+    old1 = accounts.create_account("old1", "old", bucket=bucket)
+    old2 = accounts.create_account("old2", "old", bucket=bucket)
+
+    # simulate a group that was created before accounts were indexed
+    index = AccountsIndex(group="legacy create")
+    ObjectStore.delete_all_objects(bucket, index._root())
+
+    # creating a new account must not hide the legacy accounts
+    accounts.create_account("new", "new", bucket=bucket)
+
+    assert(accounts.list_accounts(bucket=bucket) == ["new", "old1", "old2"])
+    assert(index.get("old1", bucket=bucket) == old1.uid())
+    assert(index.get("old2", bucket=bucket) == old2.uid())
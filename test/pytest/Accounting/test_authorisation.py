@@ -3,7 +3,9 @@ from Acquire.Identity import Authorisation
 
 from Acquire.Crypto import PrivateKey, PublicKey
 
+import datetime
 import pytest
+import time
 import uuid
 
 
@@ -39,3 +41,142 @@ def test_authorisation():
 
     with pytest.raises(PermissionError):
         new_auth.verify(resource=wrong_resource, testing_key=key.public_key())
+
+
+def test_authorisation_session_cache(monkeypatch):
+    import Acquire.Identity._authorisation as _authorisation
+
+    key = PrivateKey()
+    lookups = []
+
+    def _lookup_session(identity_url, user_uid, session_uid):
+        lookups.append((identity_url, user_uid, session_uid))
+        return (key.public_key(), None)
+
+    monkeypatch.setattr(_authorisation, "_lookup_session", _lookup_session)
+    Authorisation.invalidate_session()
+
+    resource = uuid.uuid4()
+    data = Authorisation(resource=resource, testing_key=key).to_data()
+
+    # the session is only looked up once, however many authorisations
+    # are verified
+    for i in range(0, 3):
+        Authorisation.from_data(data).verify(resource=resource)
+
+    assert(len(lookups) == 1)
+
+    with pytest.raises(PermissionError):
+        Authorisation.from_data(data).verify(resource=uuid.uuid4())
+
+    assert(len(lookups) == 1)
+
+    # the session must be looked up again after it is invalidated
+    Authorisation.invalidate_session(session_uid="some session uid")
+    Authorisation.from_data(data).verify(resource=resource)
+    assert(len(lookups) == 2)
+
+    Authorisation.from_data(data).verify(resource=resource, force=True)
+    assert(len(lookups) == 3)
+
+    Authorisation.invalidate_session()
+
+
+def test_verify_many(monkeypatch):
+    import Acquire.Identity._authorisation as _authorisation
+
+    key = PrivateKey()
+    lookups = []
+
+    def _lookup_sessions(identity_url, sessions):
+        lookups.append(list(sessions))
+        checked_at = datetime.datetime.now().timestamp()
+
+        for (user_uid, session_uid) in sessions:
+            _authorisation._session_cache[
+                (identity_url, user_uid, session_uid)] = \
+                (key.public_key(), None, checked_at)
+
+    def _lookup_session(identity_url, user_uid, session_uid):
+        raise PermissionError("Should not look up sessions one at a time")
+
+    monkeypatch.setattr(_authorisation, "_lookup_sessions", _lookup_sessions)
+    monkeypatch.setattr(_authorisation, "_lookup_session", _lookup_session)
+    Authorisation.invalidate_session()
+
+    resources = [uuid.uuid4() for i in range(0, 5)]
+    auths = [Authorisation.from_data(
+                Authorisation(resource=resource, testing_key=key).to_data())
+             for resource in resources]
+
+    Authorisation.verify_many(auths, resources)
+
+    # all of the authorisations are for the same session, so it is
+    # only looked up once
+    assert(len(lookups) == 1)
+    assert(len(lookups[0]) == 1)
+
+    wrong = list(resources)
+    wrong[2] = uuid.uuid4()
+
+    results = Authorisation.verify_many(auths, wrong,
+                                        return_exceptions=True)
+
+    assert(results[2] is not None)
+    assert(isinstance(results[2], PermissionError))
+    assert(results.count(None) == 4)
+
+    with pytest.raises(PermissionError):
+        Authorisation.verify_many(auths, wrong)
+
+    assert(len(lookups) == 1)
+
+    Authorisation.invalidate_session()
+
+
+def test_authorisation_logout_seen_by_other_process(monkeypatch):
+    import Acquire.Identity._authorisation as _authorisation
+
+    key = PrivateKey()
+    session = {"logout_timestamp": None}
+    lookups = []
+
+    # this is the identity service, which another process (the one
+    # that calls logout) will update
+    def _lookup_session(identity_url, user_uid, session_uid):
+        lookups.append(session_uid)
+        return (key.public_key(), session["logout_timestamp"])
+
+    monkeypatch.setattr(_authorisation, "_lookup_session", _lookup_session)
+    Authorisation.invalidate_session()
+
+    resource = uuid.uuid4()
+    before = Authorisation(resource=resource, testing_key=key).to_data()
+
+    # this process verifies, and so caches, the open session
+    Authorisation.from_data(before).verify(resource=resource)
+    assert(len(lookups) == 1)
+
+    # the user logs out in another process, which cannot clear
+    # the cache of this process
+    time.sleep(0.01)
+    session["logout_timestamp"] = datetime.datetime.now().timestamp()
+    time.sleep(0.01)
+
+    after = Authorisation(resource=resource, testing_key=key).to_data()
+
+    with pytest.raises(PermissionError):
+        Authorisation.from_data(after).verify(resource=resource)
+
+    assert(len(lookups) == 2)
+
+    # authorisations signed before the logout are still valid, and
+    # the logged out session can now be used from the cache
+    Authorisation.from_data(before).verify(resource=resource)
+
+    with pytest.raises(PermissionError):
+        Authorisation.from_data(after).verify(resource=resource)
+
+    assert(len(lookups) == 2)
+
+    Authorisation.invalidate_session()
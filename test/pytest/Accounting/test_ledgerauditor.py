@@ -0,0 +1,107 @@
+
+import pytest
+import datetime
+
+from Acquire.Accounting import Accounts, Transaction, Ledger, Receipt, \
+                               Refund, LedgerAuditor
+
+from Acquire.Identity import Authorisation
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Service import login_to_service_account
+
+try:
+    from freezegun import freeze_time
+    have_freezetime = True
+except:
+    have_freezetime = False
+
+start_time = datetime.datetime.now() - datetime.timedelta(days=3)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_ledger_auditor(bucket):
+    if not have_freezetime:
+        return
+
+    accounts = Accounts("audit_test")
+
+    with freeze_time(start_time):
+        account1 = accounts.create_account("account1", "Audit account 1",
+                                           overdraft_limit=1000,
+                                           bucket=bucket)
+        account2 = accounts.create_account("account2", "Audit account 2",
+                                           bucket=bucket)
+
+    with freeze_time(start_time + datetime.timedelta(days=1)):
+        Ledger.perform(Transaction(10, "direct"), account1, account2,
+                       Authorisation(), is_provisional=False, bucket=bucket)
+        record = Ledger.perform(Transaction(20, "provisional"), account1,
+                                account2, Authorisation(),
+                                is_provisional=True, bucket=bucket)
+        Ledger.receipt(Receipt(record.credit_note(), Authorisation()),
+                       bucket=bucket)
+
+    with freeze_time(start_time + datetime.timedelta(days=2)):
+        record = Ledger.perform(Transaction(5, "refunded"), account1,
+                                account2, Authorisation(),
+                                is_provisional=False, bucket=bucket)
+        Ledger.refund(Refund(record.credit_note(), Authorisation()),
+                      bucket=bucket)
+
+    # make sure that all of the daily balances have been recorded
+    assert(account1.balance(bucket=bucket) == -30)
+    assert(account2.balance(bucket=bucket) == 30)
+
+    account_uids = list(LedgerAuditor.all_account_uids(bucket=bucket))
+    assert(account1.uid() in account_uids)
+    assert(account2.uid() in account_uids)
+
+    auditor = LedgerAuditor("clean")
+    found = []
+    assert(auditor.run(num_workers=1, callback=found.append,
+                       bucket=bucket) == 0)
+    assert(len(found) == 0)
+    assert(account1.uid() in auditor.completed_accounts(bucket=bucket))
+
+    # now break the ledger by removing the credit of the last transaction
+    # and corrupting a daily balance
+    credit_key = ObjectStore.get_all_object_names(
+                    bucket, "accounts/%s/%s" % (account2.uid(),
+                                                record.credit_note().uid()))
+    ObjectStore.delete_object(bucket, "accounts/%s/%s/%s" % (
+        account2.uid(), record.credit_note().uid(), credit_key[0]))
+
+    balance_key = account1._get_balance_key(
+                        start_time + datetime.timedelta(days=2))
+    data = ObjectStore.get_object_from_json(bucket, balance_key)
+    data["balance"] = "42"
+    ObjectStore.set_object_from_json(bucket, balance_key, data)
+
+    auditor = LedgerAuditor("broken")
+    assert(auditor.run([account1.uid()], num_workers=1, bucket=bucket) > 0)
+    checks = [d["check"] for d in auditor.discrepancies(bucket=bucket)]
+    assert("balance" in checks)
+    assert("line_item" in checks)
+
+    # the audit resumes from the checkpoint, so only account2 is audited
+    found = []
+    assert(auditor.run([account1.uid(), account2.uid()], num_workers=2,
+                       callback=found.append, bucket=bucket) > 0)
+    assert(len(found) > 0)
+    assert(set(d["account_uid"] for d in found) == set([account2.uid()]))
+
+    assert(auditor.run([account1.uid(), account2.uid()], num_workers=1,
+                       bucket=bucket) == 0)
+
+    auditor.reset(bucket=bucket)
+    assert(len(auditor.completed_accounts(bucket=bucket)) == 0)
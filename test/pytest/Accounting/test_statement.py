@@ -0,0 +1,103 @@
+
+import pytest
+import datetime
+
+from Acquire.Accounting import Account, Transaction, Ledger, Statement, \
+                               TransactionRecord, TransactionState, \
+                               create_decimal
+
+from Acquire.Identity import Authorisation
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Service import login_to_service_account
+
+try:
+    from freezegun import freeze_time
+    have_freezetime = True
+except:
+    have_freezetime = False
+
+start_time = datetime.datetime.now() - datetime.timedelta(days=5)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_statement(bucket):
+    if not have_freezetime:
+        return
+
+    with freeze_time(start_time):
+        account1 = Account("Statement Account 1", "Test account",
+                           bucket=bucket)
+        account2 = Account("Statement Account 2", "Test account",
+                           bucket=bucket)
+        account1.set_overdraft_limit(1000, bucket=bucket)
+
+    values = [create_decimal(10), create_decimal(2.5), create_decimal(7)]
+    transaction_day = start_time + datetime.timedelta(days=2)
+
+    for (i, value) in enumerate(values):
+        with freeze_time(transaction_day + datetime.timedelta(minutes=i)):
+            Ledger.perform(Transaction(value, "statement test %d" % i),
+                           account1, account2, Authorisation(),
+                           is_provisional=False, bucket=bucket)
+
+    statement = Statement.daily(account1, transaction_day, bucket=bucket)
+
+    assert(statement.is_closed())
+    assert(statement.account_uid() == account1.uid())
+    assert(statement.opening_balance()[0] == 0)
+    assert(statement.closing_balance()[0] == -sum(values))
+
+    entries = statement.entries()
+    assert(len(entries) == len(values))
+
+    for (i, entry) in enumerate(entries):
+        assert(entry["description"] == "statement test %d" % i)
+        assert(create_decimal(entry["value"]) == values[i])
+        assert(entry["debit_account_uid"] == account1.uid())
+        assert(entry["credit_account_uid"] == account2.uid())
+
+    lines = statement.to_csv().splitlines()
+    assert(len(lines) == len(values) + 1)
+    assert(lines[0].startswith("timestamp,"))
+    assert(len(statement.to_jsonl().splitlines()) == len(values))
+
+    # closed statements are cached, so are returned unchanged
+    assert(ObjectStore.get_object_from_json(bucket, statement._key()))
+    assert(Statement.daily(account1, transaction_day,
+                           bucket=bucket) == statement)
+    assert(Statement.from_data(statement.to_data()) == statement)
+
+    # ...except for the state of each transaction, which can still change
+    transaction_uid = entries[0]["transaction_uid"]
+    assert(entries[0]["state"] == TransactionState.DIRECT.value)
+
+    TransactionRecord.load_test_and_set(transaction_uid,
+                                        TransactionState.DIRECT,
+                                        TransactionState.REFUNDING,
+                                        bucket=bucket)
+
+    cached = Statement.daily(account1, transaction_day, bucket=bucket)
+    assert(cached.entries()[0]["state"] == TransactionState.REFUNDING.value)
+    assert(cached.entries()[1]["state"] == TransactionState.DIRECT.value)
+
+    # the statement for the next day has no entries
+    statement = Statement.daily(account1,
+                                transaction_day + datetime.timedelta(days=1),
+                                bucket=bucket)
+    assert(len(statement.entries()) == 0)
+    assert(statement.opening_balance()[0] == -sum(values))
+    assert(statement.closing_balance()[0] == -sum(values))
+
+    statement = Statement.monthly(account2, bucket=bucket)
+    assert(not statement.is_closed())
+    assert(statement.closing_balance()[0] >= 0)
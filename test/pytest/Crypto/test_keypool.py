@@ -0,0 +1,51 @@
+import pytest
+
+from Acquire.Crypto import get_private_key, set_private_key_pool_options, \
+                           clear_private_key_pool, PrivateKey
+
+
+@pytest.fixture(autouse=True)
+def reset_pool():
+    clear_private_key_pool()
+    yield
+    set_private_key_pool_options(pool_size=2, lifetime=300, max_uses=100)
+    clear_private_key_pool()
+
+
+def test_key_reused():
+    set_private_key_pool_options(max_uses=3)
+
+    key = get_private_key()
+    assert(isinstance(key, PrivateKey))
+
+    assert(get_private_key() is key)
+    assert(get_private_key() is key)
+
+    # the key is rotated after it has been used 'max_uses' times
+    key2 = get_private_key()
+    assert(key2 is not key)
+
+    message = "Hello World"
+    c = key2.public_key().encrypt(message)
+    assert(key2.decrypt(c).decode("utf-8") == message)
+
+
+def test_key_rotated_after_lifetime():
+    set_private_key_pool_options(lifetime=0.1)
+
+    import time
+    key = get_private_key()
+    time.sleep(0.2)
+    assert(get_private_key() is not key)
+
+
+def test_key_pool_options():
+    with pytest.raises(ValueError):
+        set_private_key_pool_options(max_uses=0)
+
+    with pytest.raises(ValueError):
+        set_private_key_pool_options(pool_size=-1)
+
+    set_private_key_pool_options(pool_size=0, max_uses=1)
+    keys = [get_private_key() for i in range(0, 3)]
+    assert(len(set(id(key) for key in keys)) == 3)
@@ -0,0 +1,38 @@
+import pytest
+
+import datetime
+
+from Acquire.Crypto import SymmetricKey, DecryptionError
+
+
+def test_symmetric_key():
+    key = SymmetricKey()
+
+    assert(not key.is_expired())
+    assert(key.is_expired(margin=7200))
+
+    message = "Hello World"
+
+    c = key.encrypt(message)
+    assert(key.decrypt(c).decode("utf-8") == message)
+
+    # each encryption uses a new nonce
+    assert(key.encrypt(message) != c)
+
+    key2 = SymmetricKey.from_data(key.to_data())
+    assert(key2 == key)
+    assert(key2.decrypt(c).decode("utf-8") == message)
+
+    with pytest.raises(DecryptionError):
+        SymmetricKey().decrypt(c)
+
+    tampered = c[0:-1] + bytes([c[-1] ^ 1])
+
+    with pytest.raises(DecryptionError):
+        key.decrypt(tampered)
+
+    expired = SymmetricKey(lifetime=-1)
+    c = expired.encrypt(message)
+
+    with pytest.raises(DecryptionError):
+        expired.decrypt(c)
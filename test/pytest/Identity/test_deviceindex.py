@@ -0,0 +1,46 @@
+import pytest
+
+from Acquire.Identity import DeviceIndex
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Service import login_to_service_account
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_deviceindex(bucket):
+    index = DeviceIndex("test_device_user")
+
+    assert(index.load(bucket=bucket) == {})
+    assert(index.get_secret("device_1", bucket=bucket) is None)
+
+    index.add("device_1", "secret_1", bucket=bucket)
+    index.add("device_2", "secret_2", bucket=bucket)
+
+    devices = index.load(bucket=bucket)
+    assert(devices == {"device_1": "secret_1", "device_2": "secret_2"})
+
+    # the secret can be found from an already-loaded index
+    assert(index.get_secret("device_2", devices=devices,
+                            bucket=bucket) == "secret_2")
+
+    # a device saved before the index existed is moved into the index
+    ObjectStore.set_string_object(bucket, "devices/test_device_user/old",
+                                  "old_secret")
+
+    assert(index.get_secret("old", bucket=bucket) == "old_secret")
+    assert(index.load(bucket=bucket)["old"] == "old_secret")
+    assert(len(ObjectStore.get_all_object_names(
+                bucket, "devices/test_device_user")) == 0)
+
+    index.remove("device_1", bucket=bucket)
+    assert(index.get_secret("device_1", bucket=bucket) is None)
+    assert(sorted(index.load(bucket=bucket).keys()) == ["device_2", "old"])
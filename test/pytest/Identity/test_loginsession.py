@@ -0,0 +1,51 @@
+import pytest
+import json
+
+from Acquire.Identity import LoginSession
+
+from Acquire.Crypto import PrivateKey
+
+
+def test_loginsession_bytes():
+    key = PrivateKey().public_key()
+    cert = PrivateKey().public_key()
+
+    login_session = LoginSession(key, cert, "127.0.0.1", "localhost",
+                                 "hello")
+
+    data = login_session.to_bytes()
+    json_data = json.dumps(login_session.to_data()).encode("utf-8")
+
+    assert(len(data) < len(json_data))
+
+    # both the binary and (old) json formats can be read
+    for d in (data, json_data):
+        s = LoginSession.from_bytes(d)
+
+        assert(s == login_session)
+        assert(s.status() == "unapproved")
+        assert(s.request_source() == "127.0.0.1")
+        assert(s.hostname() == "localhost")
+        assert(s.login_message() == "hello")
+        assert(s.timestamp() == login_session.timestamp())
+        assert(s.to_bytes() == data)
+        assert(s.to_data() == login_session.to_data())
+
+        # the keys are only loaded when they are used
+        assert(isinstance(s._pubkey, bytes))
+        assert(s.public_key() == key)
+        assert(s.public_certificate() == cert)
+
+    login_session.set_approved()
+    login_session.logout()
+
+    s = LoginSession.from_bytes(login_session.to_bytes())
+    assert(s.is_logged_out())
+    assert(s.logout_time() == login_session.logout_time())
+    assert(s.login_time() == login_session.login_time())
+
+    with pytest.raises(Exception):
+        s.public_key()
+
+    with pytest.raises(AttributeError):
+        s.some_attribute = 5
@@ -0,0 +1,60 @@
+import pytest
+import datetime
+
+from Acquire.Identity import OTPIndex
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Service import login_to_service_account
+
+try:
+    from freezegun import freeze_time
+    have_freezetime = True
+except:
+    have_freezetime = False
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_otpindex(bucket):
+    if not have_freezetime:
+        return
+
+    index = OTPIndex("test_otp_user")
+    start = datetime.datetime(2018, 11, 1, 12, 0, 0)
+
+    # a record saved using the old layout
+    ObjectStore.set_string_object(bucket, "otps/test_otp_user/some_session",
+                                  "1234|||123456")
+
+    with freeze_time(start):
+        assert(index.get_session("123456", bucket=bucket) is None)
+        index.record("123456", "session_1", bucket=bucket)
+        assert(index.get_session("123456", bucket=bucket) == "session_1")
+        assert(index.get_session("654321", bucket=bucket) is None)
+
+    # the code cannot be reused for at least 10 minutes
+    for delta in [60, 300, 599]:
+        with freeze_time(start + datetime.timedelta(seconds=delta)):
+            assert(index.get_session("123456", bucket=bucket) == "session_1")
+
+    with freeze_time(start + datetime.timedelta(seconds=1200)):
+        assert(index.get_session("123456", bucket=bucket) is None)
+
+        index.record("654321", "session_2", bucket=bucket)
+        index.prune(bucket=bucket)
+
+        names = ObjectStore.get_all_object_names(bucket, "otps/test_otp_user")
+
+        # only the current and next windows are kept
+        assert(len(names) == 2)
+
+        for name in names:
+            assert(int(name.split("/")[0]) >= OTPIndex._get_window())
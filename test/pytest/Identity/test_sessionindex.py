@@ -0,0 +1,111 @@
+import pytest
+import datetime
+
+from Acquire.Identity import SessionIndex, LoginSession, UserAccount
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Service import login_to_service_account
+
+from Acquire.Crypto import PrivateKey
+
+try:
+    from freezegun import freeze_time
+    have_freezetime = True
+except:
+    have_freezetime = False
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def _save_session(bucket, user, login_session):
+    ObjectStore.set_object_from_json(
+        bucket, "sessions/%s/%s" % (user.sanitised_name(),
+                                    login_session.uuid()),
+        login_session.to_data())
+
+
+def test_sessionindex(bucket):
+    if not have_freezetime:
+        return
+
+    user = UserAccount("test_session_user")
+    index = SessionIndex(user.sanitised_name())
+    key = PrivateKey().public_key()
+    start = datetime.datetime(2018, 11, 1, 12, 0, 0)
+
+    with freeze_time(start):
+        # a session saved before the index existed
+        legacy = LoginSession(key, key)
+        legacy.set_approved()
+        _save_session(bucket, user, legacy)
+
+        assert(not index.is_migrated(bucket=bucket))
+        index.migrate(user, bucket=bucket)
+        assert(index.is_migrated(bucket=bucket))
+
+        requests = []
+
+        for i in range(0, 3):
+            request = LoginSession(key, key)
+            _save_session(bucket, user, request)
+            index.add(request, user.login_request_timeout(), bucket=bucket)
+            ObjectStore.set_string_object(
+                bucket, "requests/%s/%s" % (request.short_uuid(),
+                                            user.sanitised_name()),
+                request.uuid())
+            requests.append(request)
+
+        assert(index.count_open(bucket=bucket) == 4)
+
+        # approving a request extends its expiry
+        requests[0].set_approved()
+        _save_session(bucket, user, requests[0])
+        index.update(requests[0], user.login_timeout(), bucket=bucket)
+
+        assert(index.count_open(bucket=bucket) == 4)
+        assert(index.prune(user, bucket=bucket) == 0)
+
+    # the unapproved requests expire after 30 minutes
+    with freeze_time(start + datetime.timedelta(hours=1)):
+        assert(index.count_open(bucket=bucket) == 2)
+
+        # only a bounded number are pruned in each call
+        assert(index.prune(user, bucket=bucket, max_prune=1) == 1)
+        assert(index.prune(user, bucket=bucket) == 1)
+        assert(index.prune(user, bucket=bucket) == 0)
+
+        names = ObjectStore.get_all_object_names(
+                    bucket, "sessions/%s" % user.sanitised_name())
+
+        assert(sorted(names) == sorted([legacy.uuid(), requests[0].uuid()]))
+
+        # the pointers to the expired requests have also been removed
+        for request in requests[1:]:
+            with pytest.raises(Exception):
+                ObjectStore.get_string_object(
+                    bucket, "requests/%s/%s" % (request.short_uuid(),
+                                                user.sanitised_name()))
+
+    # the approved sessions are auto-logged out after the login timeout
+    with freeze_time(start + datetime.timedelta(hours=1 +
+                                                user.login_timeout())):
+        assert(index.count_open(bucket=bucket) == 0)
+        assert(index.prune(user, bucket=bucket) == 2)
+
+        names = ObjectStore.get_all_object_names(
+                    bucket, "sessions/%s" % user.sanitised_name())
+        assert(len(names) == 0)
+
+        for login_session in (legacy, requests[0]):
+            data = ObjectStore.get_object(
+                        bucket, "expired_sessions/%s/%s" %
+                        (user.sanitised_name(), login_session.uuid()))
+            assert(LoginSession.from_bytes(data).is_logged_out())
@@ -0,0 +1,180 @@
+import pytest
+import pyotp
+
+from Acquire.Identity import UserAccount
+
+from Acquire.Crypto import PrivateKey, OTP
+
+import Acquire.Identity._useraccount as _useraccount
+
+
+def _create_account(username, password):
+    privkey = PrivateKey()
+    pubkey = privkey.public_key()
+    otp = OTP()
+
+    user_account = UserAccount(username)
+    user_account.set_keys(privkey.bytes(password), pubkey.bytes(),
+                          otp.encrypt(pubkey))
+
+    return (user_account, otp)
+
+
+def test_validate_password_cache(monkeypatch):
+    password = "Test_Passw0rd"
+    (user_account, otp) = _create_account("test_cache_user", password)
+
+    calls = []
+    read_bytes = PrivateKey.read_bytes
+
+    def _read_bytes(data, passphrase, mangleFunction=None):
+        calls.append(passphrase)
+        return read_bytes(data, passphrase, mangleFunction)
+
+    monkeypatch.setattr(_useraccount._PrivateKey, "read_bytes",
+                        staticmethod(_read_bytes))
+
+    code = pyotp.totp.TOTP(otp._secret).now()
+
+    user_account.validate_password(password, code)
+    assert(len(calls) == 1)
+
+    # the second validation uses the cached OTP secret
+    user_account.validate_password(password, code)
+    assert(len(calls) == 1)
+
+    # ...but the code must still be correct
+    wrong_code = "%06d" % ((int(code) + 1) % 1000000)
+
+    with pytest.raises(Exception):
+        user_account.validate_password(password, wrong_code)
+
+    # a wrong password cannot read the cached secret
+    with pytest.raises(Exception):
+        user_account.validate_password("Wrong_Passw0rd", code)
+
+    assert(len(calls) == 2)
+
+    # changing the keys (e.g. the password) clears the cache
+    (new_account, new_otp) = _create_account("test_cache_user", password)
+    user_account.set_keys(new_account.private_key(),
+                          new_account.public_key(),
+                          new_account.otp_secret())
+
+    user_account.validate_password(
+                    password, pyotp.totp.TOTP(new_otp._secret).now())
+
+    assert(len(calls) == 3)
+
+
+def test_validate_password_rate(monkeypatch):
+    password = "Test_Passw0rd"
+    (user_account, otp) = _create_account("test_rate_user", password)
+
+    UserAccount._clear_otp_cache()
+
+    code = pyotp.totp.TOTP(otp._secret).now()
+
+    # the real user logs in, so the OTP secret is cached
+    user_account.validate_password(password, code, source="10.0.0.1")
+
+    # someone else guesses passwords until they are locked out
+    for i in range(0, 10):
+        with pytest.raises(Exception):
+            user_account.validate_password("Wrong_Passw0rd", code,
+                                           source="10.0.0.2")
+
+    with pytest.raises(_useraccount.UserValidationError):
+        user_account.validate_password("Wrong_Passw0rd", code,
+                                       source="10.0.0.2")
+
+    # ...the correct password is refused from that source if it
+    # needs the full validation
+    UserAccount._clear_otp_cache("test_rate_user")
+
+    with pytest.raises(_useraccount.UserValidationError):
+        user_account.validate_password(password, code, source="10.0.0.2")
+
+    # but the real user is not locked out
+    user_account.validate_password(password, code, source="10.0.0.1")
+
+    # and a correct password that is in the cache is never refused
+    user_account.validate_password(password, code, source="10.0.0.2")
+
+    # failures whose source is not known are not limited together
+    for i in range(0, 12):
+        with pytest.raises(Exception) as e:
+            user_account.validate_password("Wrong_Passw0rd", code)
+
+        assert(not isinstance(e.value, _useraccount.UserValidationError))
+
+    # successful validations are not counted
+    for i in range(0, 20):
+        UserAccount._clear_otp_cache("test_rate_user")
+        user_account.validate_password(password, code, source="10.0.0.3")
+
+    UserAccount._clear_otp_cache()
+
+
+def test_useraccount_bytes():
+    import json
+
+    (user_account, otp) = _create_account("test@bytes.user",
+                                          "Test_Passw0rd")
+
+    data = user_account.to_bytes()
+    json_data = json.dumps(user_account.to_data()).encode("utf-8")
+
+    assert(len(data) < len(json_data))
+
+    # both the binary and (old) json formats can be read
+    for d in (data, json_data):
+        u = UserAccount.from_bytes(d)
+        assert(u.to_data() == user_account.to_data())
+        assert(u.to_bytes() == data)
+
+
+def test_validate_device_cache(monkeypatch):
+    password = "Test_Passw0rd"
+    (user_account, otp) = _create_account("test_device_cache_user",
+                                          password)
+
+    code = pyotp.totp.TOTP(otp._secret).now()
+
+    (device_secret, uri) = user_account.validate_password(
+                                password, code, remember_device=True)
+
+    device_otp = pyotp.totp.TOTP(pyotp.parse_uri(uri).secret)
+
+    calls = []
+    read_bytes = PrivateKey.read_bytes
+
+    def _read_bytes(data, passphrase, mangleFunction=None):
+        calls.append(passphrase)
+        return read_bytes(data, passphrase, mangleFunction)
+
+    monkeypatch.setattr(_useraccount._PrivateKey, "read_bytes",
+                        staticmethod(_read_bytes))
+
+    for i in range(0, 3):
+        user_account.validate_password(password, device_otp.now(),
+                                       device_secret=device_secret)
+
+    # only the first login with the device decrypts the private key
+    assert(len(calls) == 1)
+
+    # the master OTP cannot be used with the device secret
+    if code != device_otp.now():
+        with pytest.raises(Exception):
+            user_account.validate_password(password, code,
+                                           device_secret=device_secret)
+
+    with pytest.raises(Exception):
+        user_account.validate_password("Wrong_Passw0rd", device_otp.now(),
+                                       device_secret=device_secret)
+
+    UserAccount._clear_otp_cache("test_device_cache_user")
+
+    user_account.validate_password(password, device_otp.now(),
+                                   device_secret=device_secret)
+    assert(len(calls) == 3)
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+
+import pytest
+
+from Acquire.Service import login_to_service_account
+
+from Acquire.ObjectStore import ObjectStore
+
+from Acquire.Identity import LoginSession, UserAccount
+
+from Acquire.Crypto import PrivateKey
+
+import Acquire.Client._user as _user
+
+from Acquire.Client import User
+
+
+_identity_dir = os.path.join(os.path.dirname(__file__),
+                             "..", "..", "..", "identity")
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+@pytest.fixture
+def wait_for_status(bucket, monkeypatch):
+    monkeypatch.syspath_prepend(_identity_dir)
+    import wait_for_status
+
+    monkeypatch.setattr(wait_for_status, "login_to_service_account",
+                        lambda: bucket)
+
+    return wait_for_status
+
+
+def _save_session(bucket, username, login_session):
+    key = "sessions/%s/%s" % (UserAccount(username).sanitised_name(),
+                              login_session.uuid())
+    ObjectStore.set_object(bucket, key, login_session.to_bytes())
+
+
+def test_wait_for_status_timeout(bucket, wait_for_status, monkeypatch):
+    login_session = LoginSession(PrivateKey().public_key(),
+                                 PrivateKey().public_key())
+    _save_session(bucket, "wait_timeout", login_session)
+
+    # the wait is capped, however long the caller asks for
+    monkeypatch.setattr(wait_for_status, "max_timeout", 0.2)
+
+    start = time.monotonic()
+    result = wait_for_status.run({"username": "wait_timeout",
+                                  "session_uid": login_session.uuid(),
+                                  "session_status": "unapproved",
+                                  "timeout": 1000})
+
+    assert(time.monotonic() - start < 5)
+    assert(result["status"] == 0)
+    assert(result["session_status"] == "unapproved")
+
+    # there is no wait if the status has already changed
+    start = time.monotonic()
+    result = wait_for_status.run({"username": "wait_timeout",
+                                  "session_uid": login_session.uuid(),
+                                  "session_status": "approved",
+                                  "timeout": 1000})
+
+    assert(time.monotonic() - start < 0.2)
+    assert(result["session_status"] == "unapproved")
+
+
+def test_wait_for_status_approved(bucket, wait_for_status):
+    login_session = LoginSession(PrivateKey().public_key(),
+                                 PrivateKey().public_key())
+    _save_session(bucket, "wait_approved", login_session)
+
+    def _approve():
+        time.sleep(0.2)
+        login_session.set_approved()
+        _save_session(bucket, "wait_approved", login_session)
+
+    thread = threading.Thread(target=_approve)
+    thread.start()
+
+    start = time.monotonic()
+    result = wait_for_status.run({"username": "wait_approved",
+                                  "session_uid": login_session.uuid(),
+                                  "session_status": "unapproved",
+                                  "timeout": 5})
+    thread.join()
+
+    assert(time.monotonic() - start < 5)
+    assert(result["session_status"] == "approved")
+
+
+@pytest.fixture
+def user():
+    user = User("someone", identity_url="http://example.com/t/identity")
+    user._status = _user._LoginStatus.LOGGING_IN
+    user._session_status = "unapproved"
+    user._session_uid = "some session uid"
+
+    yield user
+
+    # the user has not really logged in, so must not log out
+    user._status = _user._LoginStatus.EMPTY
+
+
+def test_wait_for_login(user, monkeypatch):
+    statuses = ["suspicious", "approved"]
+    calls = []
+
+    def _call_function(url, function, **kwargs):
+        calls.append((function, kwargs["session_status"]))
+        return {"status": 0, "message": "Success",
+                "session_status": statuses.pop(0)}
+
+    monkeypatch.setattr(_user, "_call_function", _call_function)
+
+    assert(user.wait_for_login(timeout=10))
+    assert(user.is_logged_in())
+
+    # each call waits for the status to change from the last status
+    # that was seen, not from the status of a new session
+    assert(calls == [("wait_for_status", "unapproved"),
+                     ("wait_for_status", "suspicious")])
+
+
+def test_wait_for_login_polling(user, monkeypatch):
+    url = user.identity_service_url()
+    calls = []
+
+    def _call_function(url, function, **kwargs):
+        calls.append(function)
+
+        if function == "wait_for_status":
+            return {"status": -1,
+                    "message": "Unknown function 'wait_for_status'"}
+        else:
+            return {"status": 0, "message": "Success",
+                    "session_status": "approved"}
+
+    monkeypatch.setattr(_user, "_call_function", _call_function)
+    monkeypatch.setattr(_user, "_polling_only_services", set())
+
+    assert(user.wait_for_login(timeout=10))
+    assert(calls == ["wait_for_status", "get_status"])
+
+    # an older identity service is only asked to wait once
+    assert(url in _user._polling_only_services)
+    assert(not user._wait_for_session_status(1))
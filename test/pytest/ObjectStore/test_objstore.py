@@ -49,3 +49,50 @@ def test_objstore(bucket):
 
     for name in names:
         assert(name in keys)
+
+
+def test_get_all_prefixes(bucket):
+    ObjectStore.set_string_object(bucket, "test_prefixes/a/1", "1")
+    ObjectStore.set_string_object(bucket, "test_prefixes/a/2/x", "2")
+    ObjectStore.set_string_object(bucket, "test_prefixes/b/1", "3")
+    ObjectStore.set_string_object(bucket, "test_prefixes/c", "4")
+
+    assert(sorted(ObjectStore.get_all_prefixes(bucket, "test_prefixes")) ==
+           ["a", "b"])
+    assert(ObjectStore.get_all_prefixes(bucket, "test_prefixes/a") == ["2"])
+    assert(ObjectStore.get_all_prefixes(bucket, "test_missing") == [])
+
+    ObjectStore.delete_all_objects(bucket, "test_prefixes")
+
+
+def test_wait_for_change(bucket):
+    import threading
+    import time
+
+    key = "test_wait/session"
+    ObjectStore.set_string_object(bucket, key, "unapproved")
+    data = ObjectStore.get_object(bucket, key)
+
+    # nothing changes, so this times out and returns the current value
+    start = time.monotonic()
+    assert(ObjectStore.wait_for_change(bucket, key, data, 0.2) == data)
+    assert(time.monotonic() - start >= 0.2)
+
+    # this returns as soon as the object is changed
+    timer = threading.Timer(0.1, ObjectStore.set_string_object,
+                            (bucket, key, "approved"))
+    timer.start()
+
+    start = time.monotonic()
+    assert(ObjectStore.wait_for_change(bucket, key, data, 10) ==
+           "approved".encode("utf-8"))
+    assert(time.monotonic() - start < 5)
+    timer.join()
+
+    # ...or deleted
+    data = ObjectStore.get_object(bucket, key)
+    timer = threading.Timer(0.1, ObjectStore.delete_object, (bucket, key))
+    timer.start()
+
+    assert(ObjectStore.wait_for_change(bucket, key, data, 10) is None)
+    timer.join()
@@ -0,0 +1,68 @@
+
+import pytest
+import asyncio
+import time
+
+from Acquire.Service import gather_calls, async_gather_calls, \
+                            async_call_function, RemoteFunctionCallError
+
+
+def _sleep_and_return(value, delay=0.2):
+    def _call():
+        time.sleep(delay)
+        return value
+
+    return _call
+
+
+def _raise_error():
+    raise ValueError("this call failed")
+
+
+def test_gather_calls():
+    assert(gather_calls([]) == [])
+    assert(gather_calls([_sleep_and_return(1, 0)]) == [1])
+
+    start = time.time()
+    results = gather_calls([_sleep_and_return(i) for i in range(0, 8)])
+    elapsed = time.time() - start
+
+    assert(results == list(range(0, 8)))
+
+    # the calls should have been made concurrently
+    assert(elapsed < 1.0)
+
+
+def test_gather_calls_errors():
+    with pytest.raises(ValueError):
+        gather_calls([_sleep_and_return(1), _raise_error])
+
+    results = gather_calls([_sleep_and_return(1), _raise_error],
+                           return_exceptions=True)
+
+    assert(results[0] == 1)
+    assert(isinstance(results[1], ValueError))
+
+    with pytest.raises(TypeError):
+        gather_calls(["not a call"])
+
+
+def test_async_gather_calls():
+    results = asyncio.get_event_loop().run_until_complete(
+                async_gather_calls([_sleep_and_return(i, 0.01)
+                                    for i in range(0, 4)]))
+
+    assert(results == list(range(0, 4)))
+
+
+def test_async_call_function():
+    try:
+        import pycurl
+        return
+    except:
+        pass
+
+    # without pycurl, the error from call_function should be raised
+    with pytest.raises(RemoteFunctionCallError):
+        asyncio.get_event_loop().run_until_complete(
+            async_call_function("http://localhost/nothing", "whois"))
@@ -0,0 +1,104 @@
+
+import pytest
+
+from Acquire.Service import run_batch, call_batch_function, \
+                            create_return_value, RemoteFunctionCallError, \
+                            BatchNotSupportedError
+
+import Acquire.Service._batch as _batch
+
+
+def _route_function(function, args):
+    if function == "add":
+        result = create_return_value(0, "Success")
+        result["sum"] = args["a"] + args["b"]
+        return result
+    elif function == "fail":
+        raise ValueError("this function always fails")
+    else:
+        return {"status": -1,
+                "message": "Unknown function '%s'" % function}
+
+
+def test_run_batch():
+    calls = [{"function": "add", "args": {"a": i, "b": 1}}
+             for i in range(0, 10)]
+
+    for concurrent in [False, True]:
+        result = run_batch({"calls": calls, "concurrent": concurrent},
+                           _route_function)
+
+        assert(result["status"] == 0)
+        assert([r["sum"] for r in result["results"]] ==
+               [i+1 for i in range(0, 10)])
+
+    result = run_batch({"calls": [{"function": "fail"},
+                                  {"function": "batch"},
+                                  {"function": "missing"},
+                                  {"function": "add",
+                                   "args": {"a": 1, "b": 2}}]},
+                       _route_function)
+
+    assert(result["status"] == 0)
+    assert([r["status"] for r in result["results"]] == [-1, -1, -1, 0])
+
+    assert(run_batch({}, _route_function)["results"] == [])
+
+    # badly formed calls fail on their own, not the whole batch
+    result = run_batch({"calls": [{"function": "add", "args": [1, 2]},
+                                  {"function": "add",
+                                   "args": {"a": 1, "b": 2}}]},
+                       _route_function)
+
+    assert([r["status"] for r in result["results"]] == [-1, 0])
+
+    with pytest.raises(ValueError):
+        run_batch({"calls": [{"function": "add"}] * 1000}, _route_function)
+
+
+def test_call_batch_function(monkeypatch):
+    def _call_function(service_url, function, args, **kwargs):
+        assert(function == "batch")
+        return run_batch(args, _route_function)
+
+    monkeypatch.setattr(_batch, "_call_function", _call_function)
+
+    results = call_batch_function("http://localhost/service",
+                                  [("add", {"a": 1, "b": 2}),
+                                   {"function": "add",
+                                    "args": {"a": 3, "b": 4}}])
+
+    assert([r["sum"] for r in results] == [3, 7])
+
+    with pytest.raises(RemoteFunctionCallError):
+        call_batch_function("http://localhost/service",
+                            [("add", {"a": 1, "b": 2}), ("fail", None)])
+
+    results = call_batch_function("http://localhost/service",
+                                  [("add", {"a": 1, "b": 2}),
+                                   ("fail", None)],
+                                  return_exceptions=True)
+
+    assert(results[0]["sum"] == 3)
+    assert(isinstance(results[1], RemoteFunctionCallError))
+
+    # the calls fail, but the service could run the batch
+    try:
+        call_batch_function("http://localhost/service", [("fail", None)])
+        assert(False)
+    except BatchNotSupportedError:
+        assert(False)
+    except RemoteFunctionCallError:
+        pass
+
+
+def test_batch_not_supported(monkeypatch):
+    def _call_function(service_url, function, args, **kwargs):
+        return _route_function(function, args)
+
+    monkeypatch.setattr(_batch, "_call_function", _call_function)
+
+    # older services do not know the 'batch' function
+    with pytest.raises(BatchNotSupportedError):
+        call_batch_function("http://localhost/service",
+                            [("add", {"a": 1, "b": 2})])
@@ -0,0 +1,107 @@
+import pytest
+
+from Acquire.Crypto import PrivateKey, SymmetricKey
+from Acquire.Service import pack_arguments, unpack_arguments, \
+                            pack_return_value, unpack_return_value, \
+                            UnpackingError
+
+import json
+
+
+def test_binary_envelope():
+    args = {"message": "hello", "checksums": ["%032d" % i
+                                              for i in range(0, 100)]}
+
+    # unencrypted arguments
+    packed = pack_arguments(dict(args), binary=True)
+    assert(isinstance(packed, bytes))
+
+    with pytest.raises(Exception):
+        json.loads(packed)
+
+    unpacked = unpack_arguments(packed)
+    assert(unpacked.pop("binary_envelope"))
+    assert(unpacked == args)
+
+    # encrypted arguments, with a key to encrypt the response
+    service_key = PrivateKey()
+    response_key = PrivateKey()
+
+    packed = pack_arguments(dict(args), service_key.public_key(),
+                            response_key.public_key(), binary=True)
+
+    # the binary envelope is smaller than the json equivalent
+    json_packed = pack_arguments(dict(args), service_key.public_key(),
+                                 response_key.public_key())
+    assert(len(packed) < len(json_packed))
+
+    unpacked = unpack_arguments(packed, service_key)
+    assert(unpacked["binary_envelope"])
+    assert(unpacked["message"] == "hello")
+
+    # the reply is sent back in a binary envelope
+    reply = pack_return_value({"status": 0, "message": "Success"}, unpacked)
+    assert(isinstance(reply, bytes))
+
+    result = unpack_return_value(reply, response_key)
+    assert(result["status"] == 0)
+
+    # json replies can still be unpacked
+    reply = pack_return_value({"status": 0, "message": "Success"},
+                              {"encryption_public_key":
+                               unpacked["encryption_public_key"]})
+    assert(json.loads(reply)["encrypted"])
+    assert(unpack_return_value(reply, response_key)["status"] == 0)
+
+    # session keys work with binary envelopes
+    session_key = SymmetricKey()
+    packed = pack_arguments({"message": "world"}, session_key, binary=True)
+
+    unpacked = unpack_arguments(packed, session_key)
+    assert(unpacked["message"] == "world")
+    assert(unpacked["session_key_uid"] == session_key.uid())
+
+    # truncated envelopes are rejected
+    with pytest.raises(UnpackingError):
+        unpack_arguments(packed[0:-10], session_key)
+
+
+def test_cannot_unpack_binary():
+    from Acquire.Service._function import _cannot_unpack_binary
+
+    # old services fail within unpack_arguments (the message depends
+    # on the version of python)...
+    assert(_cannot_unpack_binary(
+        {"status": -1,
+         "message": "Cannot unpack arguments: cannot access local "
+                    "variable 'data' where it is not associated with "
+                    "a value"}))
+    assert(_cannot_unpack_binary(
+        {"status": -1,
+         "message": "Cannot unpack arguments: local variable 'data' "
+                    "referenced before assignment"}))
+
+    # ...or fail to decode the envelope as json
+    assert(_cannot_unpack_binary(
+        {"status": -1,
+         "message": "Cannot unpack arguments: Cannot decode json from "
+                    "'b'\\x00AQB\\x01\\x00' : Expecting value"}))
+
+    # failures of the session key, or of the function, do not count
+    assert(not _cannot_unpack_binary(
+        {"status": -1,
+         "message": "Cannot unpack arguments: Unknown session key 'abc'"}))
+    assert(not _cannot_unpack_binary(
+        {"status": -1, "message": "Error: something went wrong"}))
+    assert(not _cannot_unpack_binary({"status": 0, "message": "Success"}))
+
+    # nor does any other failure to unpack the arguments, as this
+    # reply is not signed, so could be sent by anyone
+    assert(not _cannot_unpack_binary(
+        {"status": -1,
+         "message": "Cannot unpack arguments: Unknown error!"}))
+    assert(not _cannot_unpack_binary(
+        {"status": -1,
+         "message": "Cannot unpack arguments: Cannot decode json from "
+                    "'hello' : Expecting value"}))
+
@@ -0,0 +1,147 @@
+
+import pytest
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Acquire.Service import set_connection_timeouts, \
+                            get_connection_timeouts, \
+                            get_connection_stats, reset_connection_stats, \
+                            close_connections
+
+from Acquire.Service._http_client import _http_post
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    """Returns the body of each post, recording the address of the
+       connection it was sent on
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+
+        with self.server.lock:
+            self.server.calls.append((body, self.client_address))
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    pytest.importorskip("pycurl")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+    server.calls = []
+    server.lock = threading.Lock()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_timeouts():
+    (connect_timeout, timeout) = get_connection_timeouts()
+
+    try:
+        set_connection_timeouts(connect_timeout=5)
+        assert(get_connection_timeouts() == (5, timeout))
+
+        set_connection_timeouts(timeout=30)
+        assert(get_connection_timeouts() == (5, 30))
+
+        with pytest.raises(ValueError):
+            set_connection_timeouts(connect_timeout=-1)
+
+        with pytest.raises(ValueError):
+            set_connection_timeouts(timeout=-1)
+
+        assert(get_connection_timeouts() == (5, 30))
+    finally:
+        set_connection_timeouts(connect_timeout, timeout)
+
+
+def test_connection_stats():
+    reset_connection_stats()
+    stats = get_connection_stats()
+
+    assert(stats == {"calls": 0, "new_connections": 0,
+                     "reused_connections": 0})
+
+    # closing when no connections are open is safe
+    close_connections()
+
+
+def _connections(server, body):
+    """Return the addresses of the connections used to send 'body'"""
+    with server.lock:
+        return [c[1] for c in server.calls if c[0] == body]
+
+
+def test_connection_reuse(server):
+    url = "http://127.0.0.1:%d/t/service" % server.server_address[1]
+    errors = []
+
+    def _calls(body):
+        try:
+            for i in range(0, 3):
+                assert(_http_post(url, body) == body)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close_connections()
+
+    reset_connection_stats()
+
+    threads = [threading.Thread(target=_calls,
+                                args=(("thread %d" % i).encode("utf-8"),))
+               for i in range(0, 3)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert(errors == [])
+
+    # each thread makes all of its calls using a single connection
+    addresses = set()
+
+    for i in range(0, 3):
+        connections = _connections(server, ("thread %d" % i).encode("utf-8"))
+        assert(len(connections) == 3)
+        assert(len(set(connections)) == 1)
+        addresses.add(connections[0])
+
+    assert(len(addresses) == 3)
+
+    assert(get_connection_stats() == {"calls": 9, "new_connections": 3,
+                                      "reused_connections": 6})
+
+    # a new connection is made after the connections are closed
+    assert(_http_post(url, b"before") == b"before")
+    assert(_http_post(url, b"before") == b"before")
+    close_connections()
+    assert(_http_post(url, b"after") == b"after")
+    close_connections()
+
+    before = _connections(server, b"before")
+    after = _connections(server, b"after")
+
+    assert(len(set(before)) == 1)
+    assert(after[0] != before[0])
+    assert(after[0] not in addresses)
+
+    assert(get_connection_stats() == {"calls": 12, "new_connections": 5,
+                                      "reused_connections": 7})
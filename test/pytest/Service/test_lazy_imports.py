@@ -0,0 +1,86 @@
+import pytest
+
+import importlib
+import subprocess
+import sys
+
+packages = ["Access", "Accounting", "Client", "Crypto", "Identity",
+            "ObjectStore", "Service"]
+
+
+@pytest.mark.parametrize("package", packages)
+def test_lazy_names(package):
+    p = importlib.import_module("Acquire.%s" % package)
+    errors = importlib.import_module("Acquire.%s._errors" % package)
+
+    # every exported name must be in the lazy table of the package
+    names = set(p._lazy_names)
+
+    for name in names:
+        assert(getattr(p, name) is not None)
+
+    for name in errors.__all__:
+        assert(name in p.__dict__)
+
+    for name in dir(p):
+        if name.startswith("_"):
+            continue
+
+        value = getattr(p, name)
+        module = getattr(value, "__module__", None)
+
+        if module is not None and module.startswith("Acquire.%s." % package):
+            m = importlib.import_module(module)
+            assert(name in m.__all__)
+
+    with pytest.raises(AttributeError):
+        getattr(p, "NoSuchName")
+
+
+def test_import_is_lazy():
+    code = "import sys, Acquire.Service; " \
+           "print('cryptography' in sys.modules, " \
+           "'Acquire.Service._function' in sys.modules)"
+
+    output = subprocess.check_output([sys.executable, "-c", code],
+                                     universal_newlines=True)
+
+    assert(output.strip() == "False False")
+
+
+class _Formatter:
+    def __init__(self):
+        self.types = []
+
+    def for_type(self, typ, func):
+        self.types.append(typ)
+
+
+class _IPython:
+    def __init__(self):
+        self.formatter = _Formatter()
+        self.display_formatter = self
+        self.formatters = {"text/plain": self.formatter}
+
+
+def test_ipython_printer(monkeypatch):
+    import builtins
+
+    p = importlib.import_module("Acquire.Crypto")
+    ipython = _IPython()
+    monkeypatch.setattr(builtins, "get_ipython", lambda: ipython,
+                        raising=False)
+
+    # make the package load the class again
+    p.SymmetricKey
+    monkeypatch.delitem(p.__dict__, "SymmetricKey")
+
+    # classes are set to print using __str__ when they are loaded...
+    value = p.SymmetricKey
+    assert(ipython.formatter.types == [value])
+
+    # ...but other values are not
+    p.get_private_key
+    monkeypatch.delitem(p.__dict__, "get_private_key")
+    p.get_private_key
+    assert(ipython.formatter.types == [value])
@@ -0,0 +1,110 @@
+import pytest
+
+from Acquire.Service import RateLimiter, MemoryRateStore, \
+                            ObjectStoreRateStore, get_source_address, \
+                            RateLimitError, login_to_service_account
+
+import Acquire.Service._rate_limiter as _rate_limiter
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def _test_limiter(store, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(_rate_limiter._time, "time", clock.time)
+
+    limiter = RateLimiter(rate=1, burst=3, store=store)
+
+    # the burst is allowed, and then calls are refused
+    for i in range(0, 3):
+        assert(limiter.allow("1.2.3.4"))
+
+    assert(not limiter.allow("1.2.3.4"))
+
+    with pytest.raises(RateLimitError):
+        limiter.check("1.2.3.4")
+
+    # other keys have their own bucket
+    assert(limiter.tokens("5.6.7.8") == 3)
+    assert(limiter.allow("5.6.7.8"))
+    assert(limiter.tokens("5.6.7.8") == 2)
+    assert(limiter.tokens("5.6.7.8") == 2)
+
+    # tokens are refilled at 'rate' per second
+    clock.now += 1.5
+    assert(limiter.allow("1.2.3.4"))
+    assert(not limiter.allow("1.2.3.4"))
+
+    # ...up to the size of the burst
+    clock.now += 100
+    for i in range(0, 3):
+        limiter.check("1.2.3.4")
+
+    assert(not limiter.allow("1.2.3.4"))
+
+
+def test_memory_rate_limiter(monkeypatch):
+    _test_limiter(MemoryRateStore(), monkeypatch)
+
+
+def test_objstore_rate_limiter(bucket, monkeypatch):
+    _test_limiter(ObjectStoreRateStore("test", bucket=bucket), monkeypatch)
+
+
+def test_get_source_address():
+    class _Context:
+        def __init__(self, headers):
+            self._headers = headers
+
+        def Headers(self):
+            return self._headers
+
+    assert(get_source_address(None) is None)
+    assert(get_source_address(_Context({})) is None)
+
+    # the client can add anything to the start of the header, so
+    # only the entry appended by the gateway is used
+    assert(get_source_address(_Context(
+            {"Fn-Http-H-X-Forwarded-For": "1.2.3.4, 10.0.0.1"})) ==
+           "10.0.0.1")
+    assert(get_source_address(_Context(
+            {"x-forwarded-for": ["1.2.3.4", "5.6.7.8"]})) == "5.6.7.8")
+    assert(get_source_address(_Context(
+            {"X-Forwarded-For": "1.2.3.4, 5.6.7.8, 10.0.0.1"}),
+            trusted_proxies=2) == "5.6.7.8")
+
+    # the client can set X-Real-Ip itself, so this is not used
+    assert(get_source_address(_Context({"x-real-ip": "5.6.7.8"})) is None)
+
+
+def test_unknown_source(monkeypatch, capsys):
+    clock = _Clock()
+    monkeypatch.setattr(_rate_limiter._time, "time", clock.time)
+
+    limiter = RateLimiter(rate=1, burst=2)
+
+    # calls from unknown sources are logged, but not limited, so that
+    # a missing header cannot block everyone
+    for i in range(0, 5):
+        assert(limiter.allow(None))
+
+    assert("unknown key" in capsys.readouterr().err)
+
+    assert(limiter.allow("1.2.3.4"))
+    assert(limiter.allow("1.2.3.4"))
+    assert(not limiter.allow("1.2.3.4"))
\ No newline at end of file
@@ -0,0 +1,56 @@
+import pytest
+
+from Acquire.Service import login_to_service_account, Service, \
+                            get_service_info, get_service_private_key, \
+                            get_service_private_certificate
+
+from Acquire.ObjectStore import ObjectStore
+
+import Acquire.Service._service_account as _service_account
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def _set_service_info(bucket, service, password):
+    ObjectStore.set_object_from_json(bucket, "_service_info",
+                                     service.to_data(password))
+    _service_account._cache.clear()
+
+
+def test_private_service_cached(bucket, monkeypatch):
+    password = "Service_Passw0rd"
+    monkeypatch.setenv("SERVICE_PASSWORD", password)
+
+    service = Service("identity", "http://example.com/t/identity")
+    service.set_admin_password("Admin_Passw0rd")
+
+    try:
+        _set_service_info(bucket, service, password)
+
+        key = get_service_private_key()
+        assert(key.public_key().bytes() == service.public_key().bytes())
+
+        # the decrypted service is reused, rather than decrypted again
+        _service_account._cache.clear()
+        assert(get_service_private_key() is key)
+        assert(get_service_private_certificate() is
+               get_service_info(True).private_certificate())
+
+        # the service is decrypted again if the stored info changes
+        service2 = Service("identity", "http://example.com/t/identity")
+        service2.set_admin_password("Admin_Passw0rd")
+        _set_service_info(bucket, service2, password)
+
+        key2 = get_service_private_key()
+        assert(key2 is not key)
+        assert(key2.public_key().bytes() == service2.public_key().bytes())
+    finally:
+        ObjectStore.delete_object(bucket, "_service_info")
+        _service_account._cache.clear()
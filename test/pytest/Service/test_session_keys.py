@@ -0,0 +1,179 @@
+
+import pytest
+
+from Acquire.Crypto import PrivateKey, SymmetricKey
+from Acquire.Service import pack_arguments, unpack_arguments, \
+                            pack_return_value, unpack_return_value, \
+                            get_session_key, register_session_key, \
+                            UnpackingError, login_to_service_account
+from Acquire.ObjectStore import ObjectStore
+
+import Acquire.Service._session_keys as _session_keys
+
+import datetime
+import json
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_session_keys():
+    service_key = PrivateKey()
+    client_key = PrivateKey()
+    session_key = SymmetricKey()
+
+    # the client sends the session key with a normal encrypted call
+    packed = pack_arguments({"message": "hello",
+                             "session_key": session_key.to_data()},
+                            service_key.public_key(),
+                            client_key.public_key())
+
+    args = unpack_arguments(packed, service_key)
+
+    assert(args["message"] == "hello")
+    assert("session_key" not in args)
+    assert(get_session_key(session_key.uid()) == session_key)
+
+    # later calls are encrypted using the session key
+    packed = pack_arguments({"message": "world"}, session_key)
+    assert(json.loads(packed)["session_key_uid"] == session_key.uid())
+
+    args = unpack_arguments(packed, service_key)
+    assert(args["message"] == "world")
+    assert(args["session_key_uid"] == session_key.uid())
+
+    # the reply is encrypted using the session key, and is not signed
+    reply = pack_return_value({"status": 0, "message": "Success"}, args)
+    data = json.loads(reply)
+
+    assert(data["session_key_uid"] == session_key.uid())
+    assert("signature" not in data)
+
+    result = unpack_return_value(reply, session_key)
+    assert(result["status"] == 0)
+
+    # a client cannot claim a session key in an asymmetric call
+    packed = pack_arguments({"session_key_uid": session_key.uid()},
+                            service_key.public_key())
+    assert(unpack_arguments(packed, service_key) == {})
+
+    # the service cannot decrypt using an unknown session key
+    packed = pack_arguments({"message": "hello"}, SymmetricKey())
+
+    with pytest.raises(UnpackingError):
+        unpack_arguments(packed, service_key)
+
+
+def test_session_key_registration(bucket):
+    service_key = PrivateKey()
+    client_key = PrivateKey()
+    session_key = SymmetricKey()
+
+    # a session key can only be registered by a client that identifies
+    # itself with a public key for the response
+    packed = pack_arguments({"session_key": session_key.to_data()},
+                            service_key.public_key())
+
+    with pytest.raises(UnpackingError):
+        unpack_arguments(packed, service_key)
+
+    assert(get_session_key(session_key.uid()) is None)
+
+    register_session_key(session_key, client_key.public_key())
+    assert(get_session_key(session_key.uid()) == session_key)
+
+    # the same client can register the same key again...
+    register_session_key(session_key, client_key.public_key())
+
+    # ...but another client cannot reuse the UID
+    with pytest.raises(UnpackingError):
+        register_session_key(session_key, PrivateKey().public_key())
+
+    stolen = SymmetricKey().to_data()
+    stolen["uid"] = session_key.uid()
+    stolen = SymmetricKey.from_data(stolen)
+
+    with pytest.raises(UnpackingError):
+        register_session_key(stolen, client_key.public_key())
+
+    assert(get_session_key(session_key.uid()) == session_key)
+
+    # keys are only registered for the maximum lifetime
+    long_key = SymmetricKey(lifetime=100 * 3600)
+    register_session_key(long_key, client_key.public_key())
+
+    max_expiry = datetime.datetime.now() + datetime.timedelta(
+                    seconds=_session_keys._max_session_key_lifetime)
+
+    assert(get_session_key(long_key.uid()).expiry() <= max_expiry)
+
+
+def test_prune_session_keys(bucket):
+    now = int(datetime.datetime.now().timestamp())
+
+    ObjectStore.set_string_object(bucket, "session_keys/old", "old")
+    ObjectStore.set_string_object(bucket, "session_key_index/%d/old" %
+                                  (now - 10), "old")
+    ObjectStore.set_string_object(bucket, "session_keys/new", "new")
+    ObjectStore.set_string_object(bucket, "session_key_index/%d/new" %
+                                  (now + 3600), "new")
+
+    _session_keys._prune_session_keys(bucket)
+
+    names = ObjectStore.get_all_object_names(bucket, "session_keys")
+    assert("old" not in names)
+    assert("new" in names)
+
+    names = ObjectStore.get_all_object_names(bucket, "session_key_index")
+    assert(names == ["%d/new" % (now + 3600)])
+
+
+def test_forged_session_key_request():
+    service_key = PrivateKey()
+    victim_key = SymmetricKey()
+    register_session_key(victim_key, PrivateKey().public_key())
+
+    # anyone who has seen the UID of the victim's session key could
+    # send it in an unencrypted request...
+    forged = json.dumps({"message": "hello",
+                         "session_key_uid": victim_key.uid(),
+                         "session_key_request": "forged",
+                         "binary_envelope": True})
+
+    args = unpack_arguments(forged, service_key)
+    assert(args == {"message": "hello"})
+
+    # ...but the reply is not encrypted using the victim's key
+    reply = pack_return_value({"status": 0, "message": "Success"}, args)
+    assert("session_key_uid" not in json.loads(reply))
+    assert(json.loads(reply)["status"] == 0)
+
+
+def test_session_key_reply_bound_to_request():
+    service_key = PrivateKey()
+    session_key = SymmetricKey()
+    register_session_key(session_key, PrivateKey().public_key())
+
+    packed = pack_arguments({"message": "hello",
+                             "session_key_request": "request 1"},
+                            session_key)
+    args = unpack_arguments(packed, service_key)
+    assert(args["session_key_request"] == "request 1")
+
+    reply = pack_return_value({"status": 0, "message": "Success"}, args)
+
+    result = unpack_return_value(reply, session_key, request_id="request 1")
+    assert(result["status"] == 0)
+
+    # the reply cannot be used as the reply to another request
+    with pytest.raises(Exception):
+        unpack_return_value(reply, session_key, request_id="request 2")
+
+    with pytest.raises(Exception):
+        unpack_return_value(reply, session_key)
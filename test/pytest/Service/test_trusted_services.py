@@ -0,0 +1,97 @@
+import pytest
+import json
+import os
+
+from Acquire.Service import login_to_service_account, Service, \
+                            set_trusted_service_info, \
+                            get_trusted_service_info, \
+                            remove_trusted_service_info, \
+                            ServiceAccountError
+
+from Acquire.ObjectStore import ObjectStore
+
+import Acquire.Service._get_services as _get_services
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_trusted_services(bucket):
+    _get_services._clear_trusted_cache()
+
+    url = "http://example.com/t/identity"
+    service = Service("identity", url)
+
+    set_trusted_service_info(url, service)
+
+    trusted = get_trusted_service_info(url)
+    assert(trusted.uuid() == service.uuid())
+    assert(trusted.public_key().bytes() == service.public_key().bytes())
+
+    # the parsed service is memoised by this process
+    assert(get_trusted_service_info(url) is trusted)
+
+    # the blob of all trusted services is saved for other instances
+    version = ObjectStore.get_string_object(bucket, "services/_version")
+    blob = ObjectStore.get_object_from_json(bucket, "services/_all")
+    assert(json.loads(blob["payload"])["version"] == version)
+    assert(url in json.loads(blob["payload"])["services"])
+
+    # a new process can load the services from the blob
+    _get_services._clear_trusted_cache()
+
+    local_file = _get_services._get_local_file()
+
+    if local_file is not None and os.path.exists(local_file):
+        os.unlink(local_file)
+
+    trusted2 = get_trusted_service_info(url)
+    assert(trusted2 is not trusted)
+    assert(trusted2.uuid() == service.uuid())
+
+    # adding a service changes the version
+    url2 = "http://example.com/t/accounting"
+    service2 = Service("accounting", url2)
+    set_trusted_service_info(url2, service2)
+
+    assert(ObjectStore.get_string_object(bucket,
+                                         "services/_version") != version)
+    assert(get_trusted_service_info(url2).uuid() == service2.uuid())
+    assert(get_trusted_service_info(url).uuid() == service.uuid())
+
+    remove_trusted_service_info(url)
+
+    with pytest.raises(ServiceAccountError):
+        get_trusted_service_info(url)
+
+    assert(get_trusted_service_info(url2).uuid() == service2.uuid())
+
+
+def test_trusted_services_signature(monkeypatch):
+    from Acquire.Crypto import PrivateKey
+
+    cert = PrivateKey()
+    monkeypatch.setattr(_get_services, "_get_service_certificate",
+                        lambda: cert.public_key())
+
+    payload = json.dumps({"version": "1", "services": {"a": {}}})
+    signature = cert.sign(payload.encode("utf-8"))
+
+    blob = {"payload": payload, "signature": None}
+
+    # an unsigned blob cannot be used by a service with a certificate
+    assert(_get_services._read_blob(blob, "1") is None)
+
+    blob["signature"] = _get_services._bytes_to_string(
+                            PrivateKey().sign(payload.encode("utf-8")))
+    assert(_get_services._read_blob(blob, "1") is None)
+
+    blob["signature"] = _get_services._bytes_to_string(signature)
+    assert(_get_services._read_blob(blob, "1") == {"a": {}})
+    assert(_get_services._read_blob(blob, "2") is None)
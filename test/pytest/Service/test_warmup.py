@@ -0,0 +1,37 @@
+import pytest
+
+from Acquire.Service import login_to_service_account, warmup_service, \
+                            get_warmup_status
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    try:
+        return login_to_service_account()
+    except:
+        d = tmpdir_factory.mktemp("objstore")
+        return login_to_service_account(str(d))
+
+
+def test_warmup(bucket, capsys):
+    status = warmup_service(["json", "no_such_handler_module"])
+
+    for stage in ["login", "service_info", "service_keys",
+                  "trusted_services", "response_key", "handlers"]:
+        assert(stage in status["timings"])
+        assert(status["timings"][stage] >= 0)
+
+    assert(status["total"] >= 0)
+
+    # there is no service account in the testing object store,
+    # and the handler doesn't exist
+    assert(not status["ready"])
+    assert("login" not in status["errors"])
+    assert("trusted_services" not in status["errors"])
+    assert("service_info" in status["errors"])
+    assert("handlers" in status["errors"])
+
+    assert(get_warmup_status() == status)
+
+    # the details are written to the log
+    assert("service_info" in capsys.readouterr().err)